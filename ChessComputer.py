@@ -0,0 +1,222 @@
+# UCI front end, so the engine can play inside any chess GUI or match runner without the pygame window.
+# Run it with: python ChessComputer.py, then talk UCI over stdin/stdout.
+# The search runs in a SearchWorker thread, this thread keeps reading commands so stop and isready get answered while it
+# thinks.
+import os
+import sys
+import threading
+from Engine import ChessEngine, SearchWorker, OpeningBook, Bitbases, ParallelSearch
+
+ENGINE_NAME = "PythonEngine 1.0"
+ENGINE_AUTHOR = "Ashton Steed"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+MAX_THREADS = os.cpu_count() or 1
+
+
+class UCIEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() #info lines come from the search thread, everything else from this one
+        self.hashSizeMB = DEFAULT_HASH_MB
+        self.threads = 1
+        self.searchPool = None
+        self.ownBook = True
+        self.openingBook = None
+        self.bitbases = None
+        self.gs = ChessEngine.GameState(hashSizeMB=self.hashSizeMB)
+        self.worker = SearchWorker.SearchWorker()
+        self.infinite = False
+        self.stopped = threading.Event() #set by stop, a go infinite only answers after it
+        self.reporter = None
+        self.loadTables()
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Opens the opening book and the bitbases if their files are there, the engine plays fine without them
+    '''
+    def loadTables(self):
+        if os.path.exists(OpeningBook.DEFAULT_BOOK):
+            self.openingBook = OpeningBook.OpeningBook()
+        if os.path.isdir(Bitbases.BITBASE_FOLDER):
+            self.bitbases = Bitbases.Bitbases()
+        self.gs.bitbases = self.bitbases
+
+    '''
+    Handles one line from the GUI, returns False on quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default " + str(DEFAULT_HASH_MB) + " min 1 max " + str(MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max " + str(MAX_THREADS))
+            self.send("option name OwnBook type check default true")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.setOption(tokens)
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.gs = ChessEngine.GameState(hashSizeMB=self.hashSizeMB)
+            self.gs.bitbases = self.bitbases
+            self.gs.searchPool = self.searchPool
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(tokens)
+        elif command == 'go':
+            self.go(tokens)
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'quit':
+            self.stopSearch()
+            self.close()
+            return False
+        return True
+
+    '''
+    setoption name <name> value <value>, names can have spaces in them
+    '''
+    def setOption(self, tokens):
+        if 'name' not in tokens:
+            return
+        nameEnd = tokens.index('value') if 'value' in tokens else len(tokens)
+        name = " ".join(tokens[tokens.index('name') + 1:nameEnd]).lower()
+        value = " ".join(tokens[nameEnd + 1:])
+        self.stopSearch()
+        if name == 'hash':
+            self.hashSizeMB = max(1, min(MAX_HASH_MB, int(value)))
+            self.gs.transpositionTable.resize(self.hashSizeMB)
+        elif name == 'threads':
+            self.threads = max(1, min(MAX_THREADS, int(value)))
+            if self.searchPool is not None:
+                self.searchPool.close()
+                self.searchPool = None
+            if self.threads > 1:
+                self.searchPool = ParallelSearch.ParallelSearch(self.threads, self.hashSizeMB)
+            self.gs.searchPool = self.searchPool
+        elif name == 'ownbook':
+            self.ownBook = value.lower() == 'true'
+
+    '''
+    position startpos [moves ...] or position fen <fen> [moves ...]. Moves are in coordinate notation, e7e8q for promotions
+    '''
+    def setPosition(self, tokens):
+        movesAt = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == 'fen':
+            fen = " ".join(tokens[2:movesAt])
+        else:
+            fen = ChessEngine.START_FEN
+        self.gs.loadFEN(fen)
+        for notation in tokens[movesAt + 1:]:
+            move = self.findMove(notation)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            self.gs.makeMove(move)
+
+    def findMove(self, notation):
+        for move in self.gs.getValidMoves():
+            if ChessEngine.moveNotation(move) == notation:
+                return move
+        return None
+
+    '''
+    go [depth N] [movetime ms] [wtime ms btime ms winc ms binc ms] [infinite]. Without any limit it thinks until stop
+    '''
+    def go(self, tokens):
+        self.stopSearch()
+        limits = {}
+        for name in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc'):
+            if name in tokens and tokens.index(name) + 1 < len(tokens):
+                limits[name] = int(tokens[tokens.index(name) + 1])
+        self.infinite = 'infinite' in tokens or not limits
+        self.stopped.clear()
+        if self.ownBook and self.openingBook is not None and not self.infinite:
+            self.gs.openingBook = self.openingBook
+            move = self.gs.bookMove()
+            self.gs.openingBook = None
+            if move is not None:
+                self.send("bestmove " + ChessEngine.moveNotation(move))
+                return
+        clock = 'wtime' if self.gs.whiteToMove else 'btime'
+        increment = 'winc' if self.gs.whiteToMove else 'binc'
+        self.rootPly = len(self.gs.moveLog)
+        self.worker.start(self.gs, depth=limits.get('depth'), time_ms=limits.get(clock), increment_ms=limits.get(increment, 0),
+                          onProgress=self.sendInfo, movetime_ms=limits.get('movetime'))
+        self.reporter = threading.Thread(target=self.reportBestMove, daemon=True)
+        self.reporter.start()
+
+    '''
+    Runs in the search thread after every finished iteration
+    '''
+    def sendInfo(self, info):
+        seconds = max(info['seconds'], 1e-6)
+        self.send("info depth " + str(info['depth']) + " score " + self.scoreText(info['score']) + " nodes " +
+                  str(info['nodes']) + " nps " + str(int(info['nodes'] / seconds)) + " time " + str(int(seconds * 1000)) +
+                  " pv " + " ".join(ChessEngine.moveNotation(move) for move in info['pv'] or [info['move']]))
+
+    '''
+    UCI scores are from the side to move, in centipawns or in moves to mate. The engine scores from white's side and
+    counts mates from the start of the game
+    '''
+    def scoreText(self, score):
+        if not self.gs.whiteToMove:
+            score = -score
+        if abs(score) > ChessEngine.MATE_BOUND:
+            plies = ChessEngine.MATE_SCORE - abs(score) - self.rootPly
+            moves = (plies + 1) // 2
+            return "mate " + str(moves if score > 0 else -moves)
+        return "cp " + str(score)
+
+    '''
+    Waits for the search to end and sends its move. A go infinite search that ends on its own still waits for stop
+    '''
+    def reportBestMove(self):
+        self.worker.join()
+        if self.infinite:
+            self.stopped.wait()
+        move = self.worker.poll()
+        if move is None:
+            moves = self.gs.getValidMoves()
+            self.send("bestmove " + (ChessEngine.moveNotation(moves[0]) if moves else "0000"))
+        else:
+            self.send("bestmove " + ChessEngine.moveNotation(move))
+
+    '''
+    Stops a running search, its bestmove gets sent before this returns
+    '''
+    def stopSearch(self):
+        self.worker.stop()
+        self.stopped.set()
+        if self.reporter is not None:
+            self.reporter.join()
+            self.reporter = None
+
+    def close(self):
+        if self.searchPool is not None:
+            self.searchPool.close()
+        if self.openingBook is not None:
+            self.openingBook.close()
+        if self.bitbases is not None:
+            self.bitbases.close()
+
+
+def main():
+    engine = UCIEngine(sys.stdout)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,24 @@
 # This is the main driver file, Will do user input and display GameState object
 
 import pygame as p
-from Engine import ChessEngine
+import os
+import time
+from Engine import ChessEngine, BitboardEngine, SearchWorker, ParallelSearch, OpeningBook, Bitbases
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8 #number of boards, chess is 8x8
 SQ_Size = HEIGHT // DIMENSION #Size of the chess squares
 MAX_FPS = 15
 IMAGES = {}
+BITBOARDS = False #play on the bitboard backend instead of the 2d list one, both give the same moves
+SEARCH_PROCESSES = 1 #more than 1 splits the computer's search over that many processes, for machines with the cores
+BOOK_FILE = OpeningBook.DEFAULT_BOOK #opening book the computer plays from, None to always search
+BITBASE_FOLDER = Bitbases.BITBASE_FOLDER #KQK, KRK and KPK tables for the search, None to search those endings normally
+PONDER = True #after its move the computer keeps thinking on the player's time, about the reply it expects
+FRAME_STATS = False #print the average frame time and the CPU use every FRAME_STATS_SECONDS
+FRAME_STATS_SECONDS = 5
+HIGHLIGHT_COLOR = (80, 160, 255, 110) #selected square, drawn over it with this alpha
+DOT_COLOR = (60, 60, 60) #dots on the squares the selected piece can move to
  #3 fits in a 3 minute game, 4 in 10, 5 in an hour. more efficient engine and ai would make depth be able to go higher
 
 
@@ -19,6 +30,9 @@ def loadImages():
     for piece in pieces:
         IMAGES[piece] = p.transform.scale(p.image.load("Chess/" + piece + ".png"), (SQ_Size, SQ_Size))
     #Note: Image can be accessed by saying 'IMAGES['wp']' or equivalent
+    highlight = p.Surface((SQ_Size, SQ_Size), p.SRCALPHA)
+    highlight.fill(HIGHLIGHT_COLOR)
+    IMAGES['selected'] = highlight
 
 
 '''
@@ -29,20 +43,44 @@ def main():
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
-    screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
-    validMoves = gs.getValidMoves()
+    gs = BitboardEngine.BitboardGameState() if BITBOARDS else ChessEngine.GameState()
+    if SEARCH_PROCESSES > 1:
+        gs.searchPool = ParallelSearch.ParallelSearch(SEARCH_PROCESSES)
+    if BOOK_FILE is not None and os.path.exists(BOOK_FILE):
+        gs.openingBook = OpeningBook.OpeningBook(BOOK_FILE)
+    if BITBASE_FOLDER is not None and os.path.isdir(BITBASE_FOLDER):
+        gs.bitbases = Bitbases.Bitbases(BITBASE_FOLDER)
+    validMoves = legalMoves(gs)
     moveMade = False #flag variable for when a move is made
     loadImages() #One time thing, before the while loop
+    boardSurface = renderBoard() #the empty board, squares get redrawn from it
+    shown = [None] * (DIMENSION * DIMENSION) #what each square shows on screen, None redraws it on the next frame
+    frameStats = FrameStats() if FRAME_STATS else None
     running = True
     sqSelected = () #initally, no sqaare selected, keeps track of last click,(row, col)
     playerClicks = [] #keep track of player clicks (two tuples: [(6,4), (4,4)]
+    worker = SearchWorker.SearchWorker() #computer thinks in the background so the window keeps drawing
+    shownProgress = None
+    ponderMove = None #the reply the computer is pondering on, while the player hasnt moved yet
+    ponderHit = False #the player made that reply, the ponder search is now the search for the computer's next move
     while running:
         for e in p.event.get():
             if e.type == p.QUIT:
+                worker.cancel()
+                worker.join()
+                if gs.searchPool is not None:
+                    gs.searchPool.close()
+                if gs.openingBook is not None:
+                    gs.openingBook.close()
+                if gs.bitbases is not None:
+                    gs.bitbases.close()
                 running = False
+            elif e.type == p.VIDEOEXPOSE: #the window got covered up and shown again, draw all of it
+                shown = [None] * (DIMENSION * DIMENSION)
             #mouse stuff
             elif e.type == p.MOUSEBUTTONDOWN:
+                if worker.isRunning() and not worker.pondering: #board is locked while the computer is thinking
+                    continue
                 location = p.mouse.get_pos() #(X Y) location of mouse
                 col = location[0]//SQ_Size
                 row = location[1]//SQ_Size
@@ -58,6 +96,14 @@ def main():
                         if move == validMoves[i]:
                             gs.makeMove(validMoves[i])
                             moveMade = True
+                            if worker.pondering:
+                                if validMoves[i].code == ponderMove: #ponder hit, the search already has a head start
+                                    ponderHit = True
+                                else: #a different reply, the search is no use now but its hash entries stay in the table
+                                    worker.cancel()
+                                    worker.join()
+                                    ponderHit = False
+                                ponderMove = None
                             sqSelected = () #reset the clicks
                             playerClicks = []
                             print(move.getChessNotation())
@@ -67,13 +113,32 @@ def main():
                 #key stuff
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z: #undo when z is pressed
+                    if worker.isRunning(): #undo cancels the computer's search
+                        worker.cancel()
+                        worker.join()
+                    ponderMove = None
+                    ponderHit = False
                     gs.undoMove()
                     moveMade = True
                 elif e.key == p.K_c: #eval and move when key pressed
-                    move = gs.computerMove(DEPTH)
-                    gs.makeMove(move)
-                    moveMade = True
-                    print(move.getChessNotation())
+                    if ponderHit: #carry on with the ponder search, it stops as soon as it has been to DEPTH
+                        worker.ponderhit(DEPTH)
+                        ponderHit = False
+                    else:
+                        if worker.pondering: #the computer moves for the player instead, the guessed reply doesnt matter
+                            worker.cancel()
+                            worker.join()
+                            ponderMove = None
+                        if not worker.isRunning() and validMoves != []:
+                            bookMove = gs.bookMove()
+                            if bookMove is not None: #book moves are instant, no need for a thread
+                                gs.makeMove(bookMove)
+                                moveMade = True
+                                print(ChessEngine.moveNotation(bookMove))
+                            else:
+                                worker.start(gs, depth=DEPTH)
+                elif e.key == p.K_s: #stop thinking and play the best move found so far
+                    worker.stop()
                 elif e.key == p.K_KP0:
                     DEPTH = 0
                 elif e.key == p.K_KP1:
@@ -87,19 +152,107 @@ def main():
                 elif e.key == p.K_KP5:
                     DEPTH = 5
 
+        if worker.progress is not shownProgress: #window calls stay on this thread, so the search thread just leaves its progress for us
+            shownProgress = worker.progress
+            if shownProgress is not None:
+                showProgress(shownProgress, worker.pondering)
+        move = worker.poll() #computer's move as a move code, once its search is done
+        if move is not None:
+            for i in range(len(validMoves)): #use our own copy of the move, the search had its own board
+                if validMoves[i].code == move:
+                    gs.makeMove(validMoves[i])
+                    moveMade = True
+                    print(validMoves[i].getChessNotation())
+                    print(worker.state.lastSearchScore)
+                    print(gs.transpositionTable.report()) #the search shares the game's table
+                    if PONDER:
+                        ponderMove = startPondering(gs, worker, move)
+                    break
         if moveMade:
-            validMoves = gs.getValidMoves()
+            validMoves = legalMoves(gs)
             moveMade = False
-        drawGameState(screen, gs)
+        start = time.perf_counter()
+        dirty = drawGameState(screen, gs, boardSurface, shown, squareMarks(gs, validMoves, sqSelected))
+        if dirty:
+            p.display.update(dirty)
+        if frameStats is not None:
+            frameStats.frameDrawn(time.perf_counter() - start, len(dirty), worker.isRunning())
         clock.tick(MAX_FPS)
-        p.display.flip()
 '''
-Responsible for all graphics in gamestate
+The legal moves as Move objects, the engine hands out move codes and the window needs the squares and pieces
+'''
+def legalMoves(gs):
+    return [ChessEngine.Move.fromCode(code, gs.board) for code in gs.getValidMoves()]
+
+'''
+Starts a ponder search on the position after the player's reply the computer expects, the second move of the principal
+variation of the search that just played move. The search shares the game's hash, killer and history tables, so even
+if the player plays something else its work isnt lost. Returns the expected reply, None if there isnt one
+'''
+def startPondering(gs, worker, move):
+    pv = worker.progress['pv'] if worker.progress is not None else []
+    if len(pv) < 2 or pv[0] != move or pv[1] not in gs.getValidMoves():
+        return None
+    ponderState = gs.clone()
+    ponderState.makeMove(pv[1])
+    worker.start(ponderState, depth=None, ponder=True)
+    return pv[1]
+
+'''
+Shows the search progress (depth, best move so far, eval) in the window title
+'''
+def showProgress(info, pondering=False):
+    p.display.set_caption(("Pondering" if pondering else "Thinking") + ": depth " + str(info['depth']) + ", best " + ChessEngine.moveNotation(info['move']) +
+                          ", eval " + str(info['score']) + ", " + str(info['nodes']) + " nodes")
+
+'''
+Marks for drawGameState: the selected square, and the squares its piece can move to (none unless it is a piece of the
+side to move)
+'''
+def squareMarks(gs, validMoves, sqSelected):
+    marks = {}
+    if sqSelected != ():
+        marks[sqSelected] = 'selected'
+        for move in validMoves:
+            if (move.startRow, move.startCol) == sqSelected:
+                marks[(move.endRow, move.endCol)] = 'target'
+    return marks
+
+'''
+Responsible for all graphics in gamestate. Only redraws the squares that look different from the last frame, shown
+holds what every square showed (piece and mark) and gets updated. Returns the rects it drew, for display.update
 '''
-def drawGameState(screen, gs):
-    drawBoard(screen) #draw squares on the board
-    #add in piece highlighting/move suggestions later
-    drawPieces(screen, gs.board) #draw pieces on top of squares
+def drawGameState(screen, gs, boardSurface, shown, marks):
+    dirty = []
+    for r in range(DIMENSION):
+        for c in range(DIMENSION):
+            square = (gs.board[r][c], marks.get((r, c)))
+            if shown[r * DIMENSION + c] != square:
+                shown[r * DIMENSION + c] = square
+                rect = p.Rect(c*SQ_Size, r*SQ_Size, SQ_Size, SQ_Size)
+                drawSquare(screen, boardSurface, rect, *square)
+                dirty.append(rect)
+    return dirty
+
+'''
+One square: the empty square from the cached board, then the highlight, the piece and the move dot
+'''
+def drawSquare(screen, boardSurface, rect, piece, mark):
+    screen.blit(boardSurface, rect, rect)
+    if mark == 'selected':
+        screen.blit(IMAGES['selected'], rect)
+    if piece != "--": #not an empty square
+        screen.blit(IMAGES[piece], rect)
+    if mark == 'target':
+        p.draw.circle(screen, DOT_COLOR, rect.center, SQ_Size // 8)
+
+'''
+The board without pieces, drawn once and kept, a square gets redrawn by blitting its part of this
+'''
+def renderBoard():
+    surface = p.Surface((WIDTH, HEIGHT))
+    drawBoard(surface)
+    return surface
 
 ''' Draw the squares on the board, top left is always light'''
 def drawBoard(screen):
@@ -109,13 +262,37 @@ def drawBoard(screen):
             color = colors[(r+c) % 2]
             p.draw.rect(screen, color, p.Rect(c*SQ_Size, r*SQ_Size, SQ_Size, SQ_Size))
 
-'''draws the pieces using the gamestate'''
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != "--": #not an empty square
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_Size, r*SQ_Size, SQ_Size, SQ_Size))
+'''
+Frame time and CPU use, printed every FRAME_STATS_SECONDS. Frame time is the drawing only (the rest of the frame is
+clock.tick waiting), CPU use is the whole process (the search thread too) against the wall clock, labelled idle when
+the computer wasnt thinking for any of it
+'''
+class FrameStats():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start = time.perf_counter()
+        self.cpuStart = time.process_time()
+        self.frames = 0
+        self.drawTime = 0.0
+        self.slowest = 0.0
+        self.squares = 0
+        self.searching = False
+
+    def frameDrawn(self, seconds, squares, searching):
+        self.frames += 1
+        self.drawTime += seconds
+        self.slowest = max(self.slowest, seconds)
+        self.squares += squares
+        self.searching = self.searching or searching
+        wall = time.perf_counter() - self.start
+        if wall >= FRAME_STATS_SECONDS:
+            cpu = time.process_time() - self.cpuStart
+            print("{} frames, {:.2f} ms average, {:.2f} ms slowest, {:.1f} squares redrawn a frame, cpu {:.1f}% ({})".format(
+                self.frames, 1000 * self.drawTime / self.frames, 1000 * self.slowest, self.squares / self.frames,
+                100 * cpu / wall, "searching" if self.searching else "idle"))
+            self.reset()
 
 if __name__ == "__main__":
     main()
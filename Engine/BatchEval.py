@@ -0,0 +1,147 @@
+# Batched static evaluation with NumPy, for scoring a lot of positions at once: offline analysis over big sets of
+# positions, or all the children of a node in one go. A position is packed into 64 int8s, one per square in the
+# engine's square order (a8 is 0, h1 is 63): 0 for an empty square, 1 to 6 for a white pawn, knight, bishop, rook, queen
+# and king, and the same negated for black. evaluateBatch scores an int8[N, 64] array with the material and piece
+# square terms of GameState.evaluatePosition, the castling bonus and the pawn structure are left to the caller
+# (evaluateChildren adds them).
+# Scoring the positions costs about a fiftieth of the Python loop from a few dozen positions up (python -m Engine.Benchmark
+# batch), packing them is about as slow as that loop, so a big job should pack once and keep the arrays. The search uses
+# evaluateChildren for futility pruning when it is set as gs.childEvaluator, but there the incremental scores win,
+# GameState.childScore is faster than a batch for the children of one node.
+# NumPy is optional, the engine runs without it. HAVE_NUMPY says whether it is there, the functions here raise
+# ImportError without it. Install it with: pip install numpy
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from Engine.ChessEngine import MATERIAL, POSITION_VALUES, CASTLE_VALUE, ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG, FLAG_MASK
+
+HAVE_NUMPY = numpy is not None
+
+PIECE_TYPES = ('p', 'N', 'B', 'R', 'Q', 'K')
+PIECE_CODES = {'--': 0}
+for code, pieceType in enumerate(PIECE_TYPES, 1):
+    PIECE_CODES['w' + pieceType] = code
+    PIECE_CODES['b' + pieceType] = -code
+FEN_CODES = {'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6, 'p': -1, 'n': -2, 'b': -3, 'r': -4, 'q': -5, 'k': -6}
+PROMOTION_CODES = (5, 4, 3, 2) #codes of PROMOTION_PIECES, queen rook bishop knight
+CHUNK_ROWS = 4096 #positions scored at a time, the temporary arrays of a chunk stay in the cache (about 3 times faster than 32k)
+
+
+def requireNumpy():
+    if numpy is None:
+        raise ImportError("batch evaluation needs NumPy, install it with: pip install numpy")
+
+
+'''
+Material plus piece square value of every piece code (offset by 6, so the codes start at 0) on every square, flattened
+so a board's scores are one gather at (code + 6) * 64 + square. Every value fits in an int16 (a king is 10000 and a bit),
+half the memory traffic of int32
+'''
+def buildScoreTable():
+    table = numpy.zeros((13, 64), dtype=numpy.int16)
+    for piece, code in PIECE_CODES.items():
+        if piece != '--':
+            for square in range(64):
+                table[code + 6, square] = MATERIAL[piece] + POSITION_VALUES[piece][square >> 3][square & 7]
+    return table.ravel()
+
+
+SCORE_TABLE = buildScoreTable() if HAVE_NUMPY else None
+SQUARE_OFFSETS = numpy.arange(6 * 64, 7 * 64, dtype=numpy.int16) if HAVE_NUMPY else None
+
+
+'''
+One board (the engine's 8x8 list of 'wp' style strings) as an int8[64] array
+'''
+def packBoard(board):
+    requireNumpy()
+    return numpy.array([PIECE_CODES[square] for row in board for square in row], dtype=numpy.int8)
+
+
+'''
+The piece placement of a FEN (or EPD) string as an int8[64] array, straight from the text without setting up a game
+'''
+def packFEN(fen):
+    requireNumpy()
+    packed = numpy.zeros(64, dtype=numpy.int8)
+    square = 0
+    for char in fen.split()[0]:
+        if char.isdigit():
+            square += int(char)
+        elif char != '/':
+            packed[square] = FEN_CODES[char]
+            square += 1
+    return packed
+
+
+'''
+A list of boards as an int8[N, 64] array
+'''
+def packBoards(boards):
+    requireNumpy()
+    return numpy.array([[PIECE_CODES[square] for row in board for square in row] for board in boards],
+                       dtype=numpy.int8).reshape(-1, 64)
+
+
+'''
+Material plus piece square score from white's side of every position in an int8[N, 64] array (a single int8[64] board
+works too), as an int32[N] array. Huge batches are done CHUNK_ROWS positions at a time
+'''
+def evaluateBatch(boards):
+    requireNumpy()
+    boards = numpy.asarray(boards, dtype=numpy.int8).reshape(-1, 64)
+    scores = numpy.empty(len(boards), dtype=numpy.int32)
+    for start in range(0, len(boards), CHUNK_ROWS):
+        chunk = boards[start:start + CHUNK_ROWS]
+        index = chunk.astype(numpy.int16)
+        index *= 64
+        index += SQUARE_OFFSETS
+        scores[start:start + CHUNK_ROWS] = numpy.take(SCORE_TABLE, index).sum(axis=1, dtype=numpy.int32)
+    return scores
+
+
+'''
+The packed boards after each of moves (move codes, legal in the position packed) as an int8[len(moves), 64] array.
+The start and end squares of every move are set in two array operations, only en passant and castling (a second
+square to change) go one at a time
+'''
+def childBoards(packed, moves):
+    requireNumpy()
+    codes = numpy.asarray(moves, dtype=numpy.int64)
+    rows = numpy.arange(len(codes))
+    starts = codes & 63
+    ends = codes >> 6 & 63
+    flags = codes & FLAG_MASK
+    children = numpy.repeat(packed.reshape(1, 64), len(codes), axis=0)
+    pieces = packed[starts]
+    promotions = numpy.nonzero(flags & PROMOTION_FLAG)[0]
+    if len(promotions):
+        pieces[promotions] = numpy.sign(pieces[promotions]) * numpy.take(PROMOTION_CODES, codes[promotions] >> 12 & 3)
+    children[rows, starts] = 0
+    children[rows, ends] = pieces
+    for i in numpy.nonzero((flags == ENPASSANT_FLAG) | (flags == CASTLE_FLAG))[0]:
+        start = int(starts[i])
+        end = int(ends[i])
+        if flags[i] == ENPASSANT_FLAG:
+            children[i, (start & 56) | (end & 7)] = 0 #the captured pawn sits beside the capturing one
+        else:
+            rookFrom, rookTo = (end + 1, end - 1) if end > start else (end - 2, end + 1)
+            children[i, rookTo] = children[i, rookFrom]
+            children[i, rookFrom] = 0
+    return children
+
+
+'''
+GameState.evaluatePosition of the position after each of moves (legal moves of gs), without making any of them: the
+children are built and scored as one batch, the pawn structure comes from gs (its pawn table) one move at a time.
+Static scores only, a child that is mate or stalemate isnt recognised
+'''
+def evaluateChildren(gs, moves):
+    scores = evaluateBatch(childBoards(packBoard(gs.board), moves))
+    scores += numpy.array([gs.childPawnScore(move) for move in moves], dtype=numpy.int32)
+    castled = CASTLE_VALUE * gs.whiteKingCastle - CASTLE_VALUE * gs.blackKingCastle
+    scores += castled
+    codes = numpy.asarray(moves, dtype=numpy.int64)
+    scores[(codes & FLAG_MASK) == CASTLE_FLAG] += CASTLE_VALUE if gs.whiteToMove else -CASTLE_VALUE
+    return scores
@@ -0,0 +1,853 @@
+# Benchmarks for the engine, run from the project folder: python -m Engine.Benchmark <name> [--json]
+# Each benchmark compares the current code against the way it used to be done, so the speedups can be checked on any machine.
+import argparse
+import copy
+import json
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from Engine import BatchEval, ChessEngine
+from Engine.Bitbases import Bitbases
+from Engine.ParallelSearch import ParallelSearch
+from Engine.Perft import POSITIONS
+from Engine.SearchStats import SearchStats
+
+'''
+The middlegame-ish positions from the perft suite, used as a fixed set of positions to benchmark on
+'''
+BENCH_FENS = [fen for name, fen, counts in POSITIONS[:7]]
+
+
+def loadState(fen, cls=ChessEngine.GameState, hashSizeMB=0):
+    gs = cls(hashSizeMB=hashSizeMB)
+    gs.loadFEN(fen)
+    return gs
+
+
+'''
+The evaluation as it was before it was made incremental: a material scan of all 64 squares plus mobility from two full
+move generations (one for each side)
+'''
+def legacyEvaluate(gs):
+    materialEvals = {'wK': 10000, 'wQ': 1000, 'wR': 525, 'wB': 350, 'wN': 350, 'wp': 100,
+                     'bK': -10000, 'bQ': -1000, 'bR': -525, 'bB': -350, 'bN': -350, 'bp': -100,
+                     '--': 0}
+    value = 0
+    mobilityValue = 5
+    castleValue = 85
+    if gs.staleMate or gs.whiteMate or gs.blackMate:
+        return 10000*(gs.blackMate) -10000*(gs.whiteMate)
+    for r in range(0, 8):
+        for c in range(0, 8):
+            value = value + materialEvals[gs.board[r][c]]
+    sign = 1 if gs.whiteToMove else -1
+    value = value + sign * len(gs.getValidMoves()) * mobilityValue
+    gs.whiteToMove = not gs.whiteToMove
+    value = value - sign * len(gs.getValidMoves()) * mobilityValue
+    gs.whiteToMove = not gs.whiteToMove
+    return value + castleValue * (gs.whiteKingCastle) - castleValue * (gs.blackKingCastle)
+
+
+class LegacyEvalGameState(ChessEngine.GameState):
+    def evaluatePosition(self):
+        return legacyEvaluate(self)
+
+
+'''
+The search as it was before the quiescence search, depth 0 is scored straight away even in the middle of an exchange
+'''
+class NoQuiescenceGameState(ChessEngine.GameState):
+    def quiesce(self, alpha, beta):
+        return self.evaluatePosition() if self.whiteToMove else -self.evaluatePosition()
+
+
+'''
+Move generation in the search as it was before the staged move picker: every node generates all its legal moves and
+sorts them before it searches the first one
+'''
+class EagerMovesGameState(ChessEngine.GameState):
+    def pickMoves(self, hashMove=None, inCheck=False, childScores=None):
+        moves = self.orderMoves(self.getValidMoves(), hashMove)
+        if childScores is not None and moves:
+            childScores.update(zip(moves, self.evaluateChildren(moves)))
+        return iter(moves)
+
+
+'''
+Move ordering as it was before killers and history: a fixed value for the piece moved, 4 more for any capture, and the
+hash move in front
+'''
+STATIC_MOVE_VALUES = {'p': 7, 'N': 5, 'B': 5, 'Q': 6, 'R': 4, 'K': 6}
+
+
+class StaticOrderingGameState(EagerMovesGameState):
+    def orderMoves(self, moves, hashMove=None):
+        board = self.board
+        def value(move):
+            start = move & 63
+            end = move >> 6 & 63
+            return STATIC_MOVE_VALUES[board[start >> 3][start & 7][1]] + 4 * (board[end >> 3][end & 7] != '--')
+        moves = sorted(moves, key=value, reverse=True)
+        if hashMove is not None:
+            for i in range(len(moves)):
+                if moves[i] == hashMove:
+                    moves.insert(0, moves.pop(i))
+                    break
+        return moves
+
+
+'''
+The search as it was before principal variation search: plain alpha beta with every move on the full window, no null
+moves or reductions, and a root that searches each of its moves on the full window too
+'''
+class PlainAlphaBetaGameState(ChessEngine.GameState):
+    def negamax(self, depth, alpha, beta, nullAllowed=True):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and self.searchStopped():
+            raise ChessEngine.SearchTimeout()
+        if self.repetitionCount():
+            return ChessEngine.DRAW_SCORE
+        sign = 1 if self.whiteToMove else -1
+        if depth <= 0:
+            return self.quiesce(alpha, beta)
+        key = self.zobristKey
+        hashMove = None
+        entry = self.transpositionTable.probe(key)
+        if entry is not None:
+            hashMove = entry[4]
+            if entry[1] >= depth:
+                if entry[3] == ChessEngine.EXACT:
+                    return entry[2]
+                elif entry[3] == ChessEngine.LOWERBOUND:
+                    alpha = max(alpha, entry[2])
+                else:
+                    beta = min(beta, entry[2])
+                if beta <= alpha:
+                    return entry[2]
+        alphaStart = alpha
+        betaStart = beta
+        moves = self.orderMoves(self.getValidMoves(), hashMove)
+        if moves == []:
+            Value = sign * self.evaluatePosition()
+            self.whiteMate = False
+            self.blackMate = False
+            self.staleMate = False
+            return Value
+        bestMove = moves[0]
+        bestScore = -ChessEngine.INFINITE_SCORE
+        for i in range(len(moves)):
+            self.makeMove(moves[i])
+            score = -self.negamax(depth - 1, -beta, -alpha)
+            self.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = moves[i]
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.recordCutoff(moves[i], depth, i)
+                break
+        bound = ChessEngine.UPPERBOUND if bestScore <= alphaStart else ChessEngine.LOWERBOUND if bestScore >= betaStart else ChessEngine.EXACT
+        self.transpositionTable.store(key, depth, bestScore, bound, bestMove)
+        return bestScore
+
+    def searchRoot(self, depth, firstMove=None):
+        sign = 1 if self.whiteToMove else -1
+        entry = self.transpositionTable.probe(self.zobristKey)
+        moves = self.orderMoves(self.getValidMoves(), entry[4] if entry is not None else None)
+        if firstMove is not None and firstMove in moves:
+            moves.remove(firstMove)
+            moves.insert(0, firstMove)
+        bestScore = -ChessEngine.INFINITE_SCORE
+        bestMove = moves[0]
+        for move in moves:
+            self.makeMove(move)
+            score = -self.negamax(depth - 1, -ChessEngine.INFINITE_SCORE, ChessEngine.INFINITE_SCORE)
+            self.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+        self.transpositionTable.store(self.zobristKey, depth, bestScore, ChessEngine.EXACT, bestMove)
+        self.lastSearchScore = sign * bestScore
+        return bestMove
+
+
+'''
+Pawn structure without the pawn table, the way it would be without the incremental pawn key: every evaluation scans
+the board for the pawns and scores them from scratch. Evaluations of a child from childScore get the child's masks
+'''
+class ScanPawnsGameState(ChessEngine.GameState):
+    def pawnEntry(self, pawnKey, whitePawns, blackPawns):
+        if pawnKey == self.pawnKey:
+            key, whitePawns, blackPawns = self.computePawns()
+        return ChessEngine.pawnStructure(whitePawns, blackPawns)
+
+
+'''
+(name, FEN, 'bm' or 'am', move). Short tactics where scoring in the middle of a capture sequence picks the wrong move
+'''
+TACTICS = [
+    ("queen takes a defended pawn", "3k4/8/2p5/3p4/8/8/8/3QK3 w - - 0 1", 'am', "d1d5"),
+    ("bishop wins the queen", "rnb1kbnr/pppp1ppp/8/4p1q1/3P4/2N5/PPP1PPPP/R1BQKBNR w KQkq - 0 1", 'bm', "c1g5"),
+    ("back rank mate", "6k1/5ppp/8/8/8/8/q4PPP/3R2K1 w - - 0 1", 'bm', "d1d8"),
+    ("rook takes a pawn defended twice", "3rk3/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1", 'am', "d2d5"),
+    ("knight takes a defended pawn", "4k3/8/4p3/3p4/8/2N5/8/4K3 w - - 0 1", 'am', "c3d5"),
+]
+
+
+'''
+The Move class as it was before moves became ints: a plain object with a __dict__, which worked out its pieces, static
+move value and id from the board when it was made. Every generated move used to be one of these
+'''
+class LegacyMove():
+    moveEvals = {'p': 7, 'N': 5, 'B': 5, 'Q': 6, 'R': 4, 'K': 6, '-': 0}
+    promotionIDs = {'Q': 0, 'R': 1, 'B': 2, 'N': 3}
+    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False, promotionChoice='Q'):
+        self.startRow = startSq[0]
+        self.startCol = startSq[1]
+        self.endRow = endSq[0]
+        self.endCol = endSq[1]
+        self.pieceMoved = board[self.startRow][self.startCol]
+        self.pieceCaptured = board[self.endRow][self.endCol]
+        self.moveValue = self.moveEvals[self.pieceMoved[1]] + 4*(self.pieceCaptured != '--')
+        self.isPawnPromotion = ((self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7))
+        self.promotionChoice = promotionChoice
+        self.isEnpassantMove = isEnpassantMove
+        if self.isEnpassantMove:
+            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+        self.isCastleMove = isCastleMove
+        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        if self.isPawnPromotion:
+            self.moveID += self.promotionIDs[promotionChoice] * 10000
+
+
+def legacyMoves(gs):
+    board = gs.board
+    moves = []
+    for code in gs.getValidMoves():
+        start = code & 63
+        end = code >> 6 & 63
+        flags = code & ChessEngine.FLAG_MASK
+        moves.append(LegacyMove((start >> 3, start & 7), (end >> 3, end & 7), board, flags == ChessEngine.ENPASSANT_FLAG,
+                                flags == ChessEngine.CASTLE_FLAG, ChessEngine.PROMOTION_PIECES[code >> 12 & 3]))
+    return moves
+
+
+def slotMoves(gs):
+    return [ChessEngine.Move.fromCode(code, gs.board) for code in gs.getValidMoves()]
+
+
+'''
+Bytes held by the list function returns, counted with tracemalloc
+'''
+def allocatedBytes(function):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def timePerCall(function, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+'''
+Cost of one leaf evaluation, old full scan against the incremental scores, and the time of a fixed depth search with each
+'''
+def benchEval(repeat=2000, depth=3):
+    results = []
+    for fen in BENCH_FENS:
+        gs = loadState(fen)
+        gs.evalCache = None #the same position over and over would be nothing but eval cache hits
+        legacy = timePerCall(lambda: legacyEvaluate(gs), max(1, repeat // 20))
+        incremental = timePerCall(gs.evaluatePosition, repeat)
+        results.append({'fen': fen, 'legacyMicroseconds': legacy * 1e6, 'incrementalMicroseconds': incremental * 1e6,
+                        'speedup': legacy / incremental if incremental > 0 else 0.0})
+    searches = {}
+    for name, cls in (('legacy', LegacyEvalGameState), ('incremental', ChessEngine.GameState)):
+        start = time.perf_counter()
+        for fen in BENCH_FENS:
+            gs = loadState(fen, cls)
+            gs.negamax(depth, -ChessEngine.INFINITE_SCORE, ChessEngine.INFINITE_SCORE)
+        searches[name] = time.perf_counter() - start
+    return {'positions': results, 'searchDepth': depth, 'searchSeconds': searches}
+
+
+def printEval(result):
+    for r in result['positions']:
+        print("{:<70} legacy {:>9.1f} us  incremental {:>6.2f} us  x{:.0f}".format(
+            r['fen'], r['legacyMicroseconds'], r['incrementalMicroseconds'], r['speedup']))
+    print("depth", result['searchDepth'], "search over all positions:",
+          ", ".join(name + " " + str(round(seconds, 2)) + "s" for name, seconds in result['searchSeconds'].items()))
+
+
+'''
+Scaling of the root parallel search: a fixed depth search over the bench positions, serial and with 1, 2, 4 and 8 worker
+processes. The pools are started before the clock starts, so only the search itself gets timed
+'''
+def benchParallel(depth=4, workerCounts=(1, 2, 4, 8)):
+    def searchAll(pool):
+        moves = []
+        nodes = 0
+        start = time.perf_counter()
+        for fen in BENCH_FENS:
+            gs = loadState(fen, hashSizeMB=16)
+            gs.searchPool = pool
+            moves.append(ChessEngine.moveNotation(gs.generateMove(depth)))
+            nodes += gs.nodes
+        return {'seconds': time.perf_counter() - start, 'nodes': nodes, 'moves': moves}
+
+    serial = searchAll(None)
+    runs = []
+    for workers in workerCounts:
+        with ParallelSearch(workers) as pool:
+            warmUp = loadState(BENCH_FENS[0])
+            warmUp.searchPool = pool
+            warmUp.generateMove(1) #gets every worker process started
+            run = searchAll(pool)
+        run['workers'] = workers
+        run['speedup'] = serial['seconds'] / run['seconds'] if run['seconds'] > 0 else 0.0
+        run['sameMoves'] = run['moves'] == serial['moves']
+        runs.append(run)
+    return {'depth': depth, 'cpus': os.cpu_count(), 'serial': serial, 'parallel': runs}
+
+
+def printParallel(result):
+    print("depth", result['depth'], "over", len(BENCH_FENS), "positions,", result['cpus'], "cpus")
+    print("serial     {:>7.2f}s {:>9} nodes".format(result['serial']['seconds'], result['serial']['nodes']))
+    for run in result['parallel']:
+        print("{} workers  {:>7.2f}s {:>9} nodes  x{:.2f}{}".format(
+            run['workers'], run['seconds'], run['nodes'], run['speedup'], '' if run['sameMoves'] else '  (different moves)'))
+
+
+'''
+Quiescence search against one more full ply without it: nodes and time over the bench positions, and which of the
+tactics each one gets right
+'''
+def benchQuiescence(depth=2):
+    runs = []
+    for name, cls, searchDepth in (('quiescence', ChessEngine.GameState, depth),
+                                   ('no quiescence', NoQuiescenceGameState, depth),
+                                   ('no quiescence +1 ply', NoQuiescenceGameState, depth + 1)):
+        nodes = 0
+        start = time.perf_counter()
+        for fen in BENCH_FENS:
+            gs = loadState(fen, cls, hashSizeMB=16)
+            gs.generateMove(searchDepth)
+            nodes += gs.nodes
+        seconds = time.perf_counter() - start
+        solved = []
+        for tacticName, fen, op, answer in TACTICS:
+            gs = loadState(fen, cls, hashSizeMB=16)
+            move = ChessEngine.moveNotation(gs.generateMove(searchDepth))
+            solved.append({'name': tacticName, 'move': move, 'solved': (move == answer) == (op == 'bm')})
+        runs.append({'name': name, 'depth': searchDepth, 'nodes': nodes, 'seconds': seconds, 'tactics': solved})
+    return {'depth': depth, 'runs': runs}
+
+
+def printQuiescence(result):
+    for run in result['runs']:
+        print("{:<22} depth {} {:>9} nodes {:>7.2f}s  tactics {}/{}".format(
+            run['name'], run['depth'], run['nodes'], run['seconds'],
+            sum(t['solved'] for t in run['tactics']), len(run['tactics'])))
+        for t in run['tactics']:
+            print("    {:<34} {}  {}".format(t['name'], t['move'], 'ok' if t['solved'] else 'missed'))
+
+
+'''
+Static move ordering against hash move, MVV-LVA, killers and history: an iterative deepening search of the bench positions
+with each, counting nodes and how often the cutoff came from the first move searched
+'''
+def benchOrdering(depth=3):
+    runs = []
+    for name, cls in (('static', StaticOrderingGameState), ('dynamic', ChessEngine.GameState)):
+        nodes = 0
+        cutoffs = 0
+        firstMoveCutoffs = 0
+        positions = []
+        start = time.perf_counter()
+        for fen in BENCH_FENS:
+            gs = loadState(fen, cls, hashSizeMB=16)
+            move = gs.iterativeSearch(depth)
+            positions.append({'fen': fen, 'move': ChessEngine.moveNotation(move), 'nodes': gs.nodes})
+            nodes += gs.nodes
+            cutoffs += gs.cutoffs
+            firstMoveCutoffs += gs.firstMoveCutoffs
+        runs.append({'name': name, 'nodes': nodes, 'seconds': time.perf_counter() - start, 'cutoffs': cutoffs,
+                     'firstMoveCutoffRate': firstMoveCutoffs / cutoffs if cutoffs else 0.0, 'positions': positions})
+    return {'depth': depth, 'runs': runs}
+
+
+def printOrdering(result):
+    print("iterative deepening to depth", result['depth'], "over", len(BENCH_FENS), "positions")
+    for run in result['runs']:
+        print("{:<8} {:>9} nodes {:>7.2f}s  {:>7} cutoffs, {:.1f}% on the first move".format(
+            run['name'], run['nodes'], run['seconds'], run['cutoffs'], 100 * run['firstMoveCutoffRate']))
+        for position in run['positions']:
+            print("    {:<70} {:<6} {:>8} nodes".format(position['fen'], position['move'], position['nodes']))
+
+
+'''
+Cost of getValidMoves with int move codes, against the same moves wrapped in the old Move class (the way generation used
+to work) and in the slotted Move that ChessMain uses. Time per call (best of 5 runs) and memory held per move
+'''
+def benchMoves(repeat=100):
+    kinds = (('int codes', lambda gs: gs.getValidMoves()), ('old Move objects', legacyMoves), ('slotted Move', slotMoves))
+    results = []
+    for fen in BENCH_FENS:
+        gs = loadState(fen)
+        count = len(gs.getValidMoves())
+        row = {'fen': fen, 'moves': count}
+        for name, generate in kinds:
+            row[name] = {'microseconds': min(timePerCall(lambda: generate(gs), repeat) for i in range(5)) * 1e6,
+                         'bytesPerMove': allocatedBytes(lambda: generate(gs)) / count}
+        results.append(row)
+    totals = {name: {'microseconds': sum(r[name]['microseconds'] for r in results),
+                     'bytesPerMove': sum(r[name]['bytesPerMove'] for r in results) / len(results)} for name, generate in kinds}
+    return {'positions': results, 'totals': totals}
+
+
+def printMoves(result):
+    names = list(result['totals'])
+    for r in result['positions']:
+        print("{:<72} {:>3} moves  ".format(r['fen'], r['moves']) +
+              "  ".join("{} {:.0f} us".format(name, r[name]['microseconds']) for name in names))
+    for name in names:
+        total = result['totals'][name]
+        print("{:<18} {:>8.0f} us over all positions, {:>5.0f} bytes per move".format(name, total['microseconds'], total['bytesPerMove']))
+
+
+'''
+King and piece against king endings, four wins and two draws. The computer plays both sides until the game ends
+'''
+ENDGAMES = ["8/8/8/4k3/8/8/8/R3K3 w - - 0 1", "8/8/8/3k4/8/8/8/3QK3 w - - 0 1", "4k3/8/4K3/4P3/8/8/8/8 w - - 0 1",
+            "8/8/8/8/8/k7/7P/7K w - - 0 1", "8/8/8/8/8/3k4/4P3/4K3 b - - 0 1", "8/8/4k3/8/8/8/4PK2/8 w - - 0 1"]
+
+
+'''
+Plays out the ENDGAMES with a fixed depth search, with and without the bitbases, and reports how each game ended
+(at most maxPlies half moves), the nodes searched and the time
+'''
+def benchEndgames(depth=3, maxPlies=120):
+    runs = []
+    for name in ('search', 'bitbases'):
+        games = []
+        start = time.perf_counter()
+        for fen in ENDGAMES:
+            gs = loadState(fen, hashSizeMB=16)
+            if name == 'bitbases':
+                gs.bitbases = Bitbases()
+            while len(gs.moveLog) < maxPlies and gs.getValidMoves() != [] and not gs.isDraw():
+                gs.makeMove(gs.iterativeSearch(depth))
+            moves = gs.getValidMoves()
+            result = 'mate' if moves == [] and gs.inCheck else 'draw' if moves == [] or gs.isDraw() else 'unfinished'
+            games.append({'fen': fen, 'result': result, 'plies': len(gs.moveLog), 'nodes': gs.nodes})
+        runs.append({'name': name, 'seconds': time.perf_counter() - start, 'games': games})
+    return {'depth': depth, 'runs': runs}
+
+
+def printEndgames(result):
+    print("depth", result['depth'], "search playing both sides")
+    for run in result['runs']:
+        mates = sum(game['result'] == 'mate' for game in run['games'])
+        print("{:<9} {} mates, {:>7} nodes, {:.1f}s".format(run['name'], mates, sum(game['nodes'] for game in run['games']),
+                                                       run['seconds']))
+        for game in run['games']:
+            print("    {:<34} {:<10} after {:>3} plies {:>7} nodes".format(game['fen'], game['result'], game['plies'],
+                                                                        game['nodes']))
+
+
+'''
+Search statistics of an iterative deepening search of each bench position, and what measuring costs: the same
+searches timed without stats, with them, and with them switched off again (gs.searchStats = None)
+'''
+def benchStats(depth=3):
+    positions = []
+    totals = {'off': 0.0, 'on': 0.0, 'off again': 0.0}
+    for fen in BENCH_FENS:
+        for name in ('off', 'on', 'off again'):
+            gs = loadState(fen, hashSizeMB=16)
+            gs.searchStats = SearchStats()
+            if name != 'on':
+                gs.searchStats = None
+            start = time.perf_counter()
+            gs.iterativeSearch(depth)
+            totals[name] += time.perf_counter() - start
+            if name == 'on':
+                report = gs.searchStats.lastReport
+                report['fen'] = fen
+                positions.append(report)
+    return {'depth': depth, 'seconds': totals, 'positions': positions}
+
+
+def printStats(result):
+    seconds = result['seconds']
+    print("iterative deepening to depth", result['depth'], "over", len(result['positions']), "positions:",
+          " ".join("{} {:.2f}s".format(name, seconds[name]) for name in seconds),
+          " ({:+.1f}% measured)".format(100 * (seconds['on'] / seconds['off'] - 1)))
+    for report in result['positions']:
+        times = report['times']
+        total = sum(times.values())
+        print("    {:<70}".format(report['fen']))
+        print("        {:>7} nodes {:>7} evals {:>6.0f} nps  ebf {:.1f}  first move cutoffs {:.1f}%  cutoffs by ply {}".format(
+            report['nodes'], report['evaluations'], report['nps'], report['branchingFactor'],
+            100 * report['firstMoveCutoffRate'], report['cutoffsByPly']))
+        print("        time: " + ", ".join("{} {:.0f}%".format(part, 100 * times[part] / total) for part in times))
+
+
+'''
+Plain alpha beta against principal variation search with null moves and late move reductions: the time and nodes of an
+iterative deepening search to depth over the bench positions with each, then how deep the new search gets in the time
+the plain one needed, position by position
+'''
+def benchSearch(depth=4):
+    positions = []
+    for fen in BENCH_FENS:
+        position = {'fen': fen}
+        for name, cls in (('plain', PlainAlphaBetaGameState), ('pvs', ChessEngine.GameState)):
+            gs = loadState(fen, cls, hashSizeMB=16)
+            start = time.perf_counter()
+            move = gs.iterativeSearch(depth)
+            position[name] = {'move': ChessEngine.moveNotation(move), 'nodes': gs.nodes, 'seconds': time.perf_counter() - start}
+        gs = loadState(fen, hashSizeMB=16)
+        gs.iterativeSearch(64, None, position['plain']['seconds'])
+        position['sameTimeDepth'] = gs.lastSearchDepth
+        positions.append(position)
+    return {'depth': depth, 'positions': positions}
+
+
+def printSearch(result):
+    positions = result['positions']
+    print("iterative deepening to depth", result['depth'])
+    for name in ('plain', 'pvs'):
+        print("{:<6} {:>9} nodes {:>7.2f}s".format(name, sum(p[name]['nodes'] for p in positions),
+                                                   sum(p[name]['seconds'] for p in positions)))
+    for p in positions:
+        print("    {:<70} {:<6} {:<6} pvs reaches depth {} in the same time".format(
+            p['fen'], p['plain']['move'], p['pvs']['move'], p['sameTimeDepth']))
+
+
+'''
+The staged move picker against generating and sorting every move up front: an iterative deepening search of the bench
+positions with each, timed, then again with SearchStats to count the full move generations (getValidMoves) and the
+legality checks of single moves (isLegalMove) the searches needed
+'''
+def benchPicker(depth=5):
+    runs = []
+    for name, cls in (('eager', EagerMovesGameState), ('staged', ChessEngine.GameState)):
+        run = {'name': name, 'nodes': 0, 'seconds': 0.0, 'generations': 0, 'captureGenerations': 0, 'legalityChecks': 0,
+               'moves': []}
+        for fen in BENCH_FENS:
+            gs = loadState(fen, cls, hashSizeMB=16)
+            start = time.perf_counter()
+            move = gs.iterativeSearch(depth)
+            run['seconds'] += time.perf_counter() - start
+            run['nodes'] += gs.nodes
+            run['moves'].append(ChessEngine.moveNotation(move))
+            gs = loadState(fen, cls, hashSizeMB=16)
+            gs.searchStats = SearchStats()
+            gs.iterativeSearch(depth)
+            calls = gs.searchStats.lastReport['calls']
+            run['generations'] += calls['getValidMoves']
+            run['captureGenerations'] += calls['getCaptureMoves']
+            run['legalityChecks'] += calls['isLegalMove']
+        runs.append(run)
+    return {'depth': depth, 'runs': runs}
+
+
+def printPicker(result):
+    print("iterative deepening to depth", result['depth'], "over", len(BENCH_FENS), "positions")
+    for run in result['runs']:
+        print("{:<7} {:>8} nodes {:>6.2f}s  {:>7} full generations {:>7} capture generations {:>7} single move checks".format(
+            run['name'], run['nodes'], run['seconds'], run['generations'], run['captureGenerations'], run['legalityChecks']))
+        print("        " + " ".join(run['moves']))
+
+
+'''
+Pawn structure and eval cache: the same search with the pawns scanned from the board at every evaluation, with the pawn
+table, and with the pawn table and the eval cache. Node counts and moves should be the same, the table hit rates show
+how much work each one saves
+'''
+def benchEvalCache(depth=5):
+    runs = []
+    for name, cls, evalCache in (('scan', ScanPawnsGameState, False), ('pawns', ChessEngine.GameState, False),
+                                 ('cached', ChessEngine.GameState, True)):
+        run = {'name': name, 'nodes': 0, 'seconds': 0.0, 'pawnProbes': 0, 'pawnHits': 0, 'evalProbes': 0, 'evalHits': 0,
+               'moves': []}
+        for fen in BENCH_FENS:
+            gs = loadState(fen, cls, hashSizeMB=16)
+            if not evalCache:
+                gs.evalCache = None
+            start = time.perf_counter()
+            move = gs.iterativeSearch(depth)
+            run['seconds'] += time.perf_counter() - start
+            run['nodes'] += gs.nodes
+            run['moves'].append(ChessEngine.moveNotation(move))
+            run['pawnProbes'] += gs.pawnTable.probes
+            run['pawnHits'] += gs.pawnTable.hits
+            if evalCache:
+                run['evalProbes'] += gs.evalCache.probes
+                run['evalHits'] += gs.evalCache.hits
+        runs.append(run)
+    return {'depth': depth, 'runs': runs}
+
+
+def printEvalCache(result):
+    print("iterative deepening to depth", result['depth'], "over", len(BENCH_FENS), "positions")
+    for run in result['runs']:
+        line = "{:<7} {:>8} nodes {:>6.2f}s".format(run['name'], run['nodes'], run['seconds'])
+        if run['pawnProbes']:
+            line += "  pawn table {:>5.1%} of {} probes".format(run['pawnHits'] / run['pawnProbes'], run['pawnProbes'])
+        if run['evalProbes']:
+            line += "  eval cache {:>5.1%} of {} probes".format(run['evalHits'] / run['evalProbes'], run['evalProbes'])
+        print(line)
+        print("        " + " ".join(run['moves']))
+
+
+'''
+Games played out from the bench positions with seeded random moves, so they have some history behind them
+'''
+def sampleGames(plies=30, seed=1, hashSizeMB=16):
+    rng = random.Random(seed)
+    games = []
+    for fen in BENCH_FENS:
+        gs = loadState(fen, hashSizeMB=hashSizeMB)
+        for ply in range(plies):
+            moves = gs.getValidMoves()
+            if moves == []:
+                break
+            gs.makeMove(rng.choice(moves))
+        gs.getValidMoves()
+        games.append(gs)
+    return games
+
+
+'''
+Size of a position and the time to copy one: snapshots against pickles of the whole GameState, a deep copy, clone, and
+copy.copy the way clone used to copy (through __getstate__, so it built new tables every time)
+'''
+def benchSnapshot(repeat=200):
+    games = sampleGames()
+    spare = ChessEngine.GameState(0)
+    snapshots = [gs.snapshot() for gs in games]
+    pickles = [pickle.dumps(gs, pickle.HIGHEST_PROTOCOL) for gs in games]
+    sizes = {'snapshot': sum(len(data) for data in snapshots) / len(games),
+             'pickle': sum(len(data) for data in pickles) / len(games),
+             'fen': sum(len(gs.toFEN()) for gs in games) / len(games)}
+    copies = [('snapshot', lambda gs: gs.snapshot()),
+              ('+loadSnapshot', lambda gs: spare.loadSnapshot(gs.snapshot())),
+              ('+fromSnapshot', lambda gs: ChessEngine.GameState.fromSnapshot(gs.snapshot(), 0)),
+              ('clone', lambda gs: gs.clone()),
+              ('copy.copy', lambda gs: copy.copy(gs)),
+              ('pickle', lambda gs: pickle.loads(pickle.dumps(gs, pickle.HIGHEST_PROTOCOL))),
+              ('deepcopy', lambda gs: copy.deepcopy(gs))]
+    times = {}
+    for name, function in copies:
+        times[name] = sum(timePerCall(lambda: function(gs), repeat if name in ('snapshot', '+loadSnapshot', 'clone') else repeat // 10)
+                          for gs in games) / len(games)
+    return {'positions': len(games), 'bytes': sizes, 'microseconds': {name: t * 1e6 for name, t in times.items()}}
+
+
+def printSnapshot(result):
+    print(result['positions'], "positions, 30 random plies into the bench positions, 16 MB tables")
+    print("bytes per position: snapshot {snapshot:.0f}, pickle {pickle:.0f}, FEN {fen:.0f}".format(**result['bytes']))
+    print("time per copy (+ is a snapshot loaded into a GameState that is already there, or into a new one):")
+    for name, microseconds in result['microseconds'].items():
+        print("{:<13} {:>10.1f} us".format(name, microseconds))
+
+
+'''
+Random positions played out from the bench positions, as copies of their boards, seeded so every run gets the same ones
+'''
+def samplePositions(count, seed=1):
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        gs = loadState(BENCH_FENS[len(boards) % len(BENCH_FENS)])
+        for ply in range(40):
+            moves = gs.getValidMoves()
+            if moves == [] or len(boards) >= count:
+                break
+            gs.makeMove(rng.choice(moves))
+            boards.append([row[:] for row in gs.board])
+    return boards
+
+
+'''
+Material plus piece square scores of many unrelated positions, one at a time in Python (the 64 square loop a position
+needs when there are no incremental scores to go on) against BatchEval on int8[N, 64] arrays, for N of 1, 64, 4096 and
+about a million. The scalar loop costs the same per position whatever N is, so it gets timed on between poolSize and
+scalarLimit positions.
+Also the scores of all the children of a search node, GameState.evaluateChildren against BatchEval.evaluateChildren
+'''
+def benchBatch(sizes=(1, 64, 4096, 1 << 20), poolSize=4096, scalarLimit=1 << 16):
+    if not BatchEval.HAVE_NUMPY:
+        return {'numpy': False}
+    import numpy
+    pool = samplePositions(poolSize)
+    gs = ChessEngine.GameState(hashSizeMB=0)
+
+    def scalar(board):
+        gs.board = board
+        material, position = gs.computeScores()
+        return material + position
+
+    start = time.perf_counter()
+    packedPool = BatchEval.packBoards(pool)
+    packMicroseconds = (time.perf_counter() - start) / len(pool) * 1e6
+    agree = BatchEval.evaluateBatch(packedPool).tolist() == [scalar(board) for board in pool]
+    results = []
+    for size in sizes:
+        boards = [pool[i % len(pool)] for i in range(min(max(size, poolSize), scalarLimit))]
+        start = time.perf_counter()
+        for board in boards:
+            scalar(board)
+        scalarSeconds = (time.perf_counter() - start) / len(boards)
+        packed = numpy.resize(packedPool, (size, 64))
+        BatchEval.evaluateBatch(packed[:poolSize]) #first call warms up
+        batchSeconds = timePerCall(lambda: BatchEval.evaluateBatch(packed), max(3, 8192 // size)) / size
+        results.append({'positions': size, 'scalarMicroseconds': scalarSeconds * 1e6, 'batchMicroseconds': batchSeconds * 1e6,
+                        'speedup': scalarSeconds / batchSeconds if batchSeconds > 0 else 0.0})
+    children = []
+    for fen in BENCH_FENS:
+        gs = loadState(fen)
+        moves = gs.getValidMoves()
+        children.append({'fen': fen, 'moves': len(moves),
+                         'scalarMicroseconds': timePerCall(lambda: gs.evaluateChildren(moves), 500) * 1e6,
+                         'batchMicroseconds': timePerCall(lambda: BatchEval.evaluateChildren(gs, moves), 500) * 1e6})
+    return {'numpy': True, 'agree': agree, 'packMicroseconds': packMicroseconds, 'sizes': results, 'children': children}
+
+
+def printBatch(result):
+    if not result['numpy']:
+        print("NumPy isnt installed, nothing to compare (pip install numpy)")
+        return
+    print("batch scores match the scalar ones:", result['agree'], "  packing a board costs {:.2f} us".format(result['packMicroseconds']))
+    for r in result['sizes']:
+        print("{:>8} positions  scalar {:>6.2f} us  batch {:>7.3f} us per position  x{:.1f}".format(
+            r['positions'], r['scalarMicroseconds'], r['batchMicroseconds'], r['speedup']))
+    print("all the children of a node:")
+    for r in result['children']:
+        print("    {:<70} {:>3} moves  incremental {:>6.1f} us  batch {:>6.1f} us".format(
+            r['fen'], r['moves'], r['scalarMicroseconds'], r['batchMicroseconds']))
+
+
+'''
+The window drawing as it was before the board got cached: every square a draw.rect and every piece blitted again on
+every frame, then a flip of the whole window
+'''
+def legacyDraw(screen, board):
+    import pygame
+    import ChessMain
+    colors = [pygame.Color("white"), pygame.Color("gray")]
+    for r in range(ChessMain.DIMENSION):
+        for c in range(ChessMain.DIMENSION):
+            rect = pygame.Rect(c * ChessMain.SQ_Size, r * ChessMain.SQ_Size, ChessMain.SQ_Size, ChessMain.SQ_Size)
+            pygame.draw.rect(screen, colors[(r + c) % 2], rect)
+            if board[r][c] != "--":
+                screen.blit(ChessMain.IMAGES[board[r][c]], rect)
+    pygame.display.flip()
+
+
+'''
+Frame time of the window, full redraws against the cached board and dirty squares: frames where nothing changes, and
+frames that each follow a move or its undo. Then the CPU use of idleSeconds of an idle window at MAX_FPS with each.
+Needs pygame, without a display set it draws to SDL's dummy driver, so copying to the screen costs next to nothing
+and the gain on a real window is bigger than shown
+'''
+def benchRendering(frames=300, idleSeconds=3.0):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1') #its banner would end up in the --json output
+    try:
+        import pygame
+    except ImportError:
+        return {'pygame': False}
+    import ChessMain
+    pygame.init()
+    screen = pygame.display.set_mode((ChessMain.WIDTH, ChessMain.HEIGHT))
+    ChessMain.loadImages()
+    boardSurface = ChessMain.renderBoard()
+    gs = loadState(BENCH_FENS[6])
+    moves = gs.getValidMoves()
+    shown = [None] * 64
+
+    def dirtyFrame():
+        dirty = ChessMain.drawGameState(screen, gs, boardSurface, shown, {})
+        if dirty:
+            pygame.display.update(dirty)
+
+    def timeFrames(draw, moving):
+        start = time.perf_counter()
+        for i in range(frames):
+            if moving:
+                if i % 2 == 0:
+                    gs.makeMove(moves[i // 2 % len(moves)])
+                else:
+                    gs.undoMove()
+            draw()
+        if moving and frames % 2 == 1:
+            gs.undoMove()
+        return (time.perf_counter() - start) / frames * 1000
+
+    def idleCPU(draw):
+        clock = pygame.time.Clock()
+        start = time.perf_counter()
+        cpuStart = time.process_time()
+        while time.perf_counter() - start < idleSeconds:
+            pygame.event.pump()
+            draw()
+            clock.tick(ChessMain.MAX_FPS)
+        return 100 * (time.process_time() - cpuStart) / (time.perf_counter() - start)
+
+    result = {'pygame': True, 'frames': frames, 'fps': ChessMain.MAX_FPS}
+    for name, draw in (('full', lambda: legacyDraw(screen, gs.board)), ('dirty', dirtyFrame)):
+        draw()
+        result[name] = {'idleMilliseconds': timeFrames(draw, False), 'moveMilliseconds': timeFrames(draw, True),
+                        'idleCPU': idleCPU(draw)}
+    pygame.quit()
+    return result
+
+
+def printRendering(result):
+    if not result['pygame']:
+        print("pygame isnt installed, nothing to draw")
+        return
+    print(result['frames'], "frames each, idle CPU at", result['fps'], "fps")
+    for name in ('full', 'dirty'):
+        r = result[name]
+        print("{:<6} nothing changed {:>6.3f} ms  after a move {:>6.3f} ms  idle CPU {:>5.1f}%".format(
+            name, r['idleMilliseconds'], r['moveMilliseconds'], r['idleCPU']))
+
+
+BENCHMARKS = {'eval': (benchEval, printEval), 'parallel': (benchParallel, printParallel),
+              'quiescence': (benchQuiescence, printQuiescence), 'ordering': (benchOrdering, printOrdering),
+              'moves': (benchMoves, printMoves), 'endgame': (benchEndgames, printEndgames),
+              'stats': (benchStats, printStats), 'search': (benchSearch, printSearch), 'batch': (benchBatch, printBatch),
+              'rendering': (benchRendering, printRendering), 'picker': (benchPicker, printPicker),
+              'evalcache': (benchEvalCache, printEvalCache), 'snapshot': (benchSnapshot, printSnapshot)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    run, show = BENCHMARKS[args.benchmark]
+    result = run()
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        show(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# Endgame bitbases for king and one piece against a bare king (KQK, KRK, KPK). One bit per position says whether the side
+# with the piece wins, anything else is a draw (the bare king can never win). They are built offline by retrograde
+# analysis over the engine's own move generator and stored bit packed, 64 KB a table, then memory mapped for probing.
+# Give a GameState the tables with gs.bitbases = Bitbases() and the search scores these endings exactly as soon as it reaches them.
+# Rebuild the files with: python -m Engine.Bitbases build
+import argparse
+import mmap
+import os
+import time
+from array import array
+from Engine.ChessEngine import GameState, CastleRights, PROMOTION_FLAG, PROMOTION_PIECES
+
+'''
+Tables in the order they get built (KPK needs the other two for its promotions) and the piece type each one is for
+'''
+SIGNATURES = {'KQK': 'Q', 'KRK': 'R', 'KPK': 'p'}
+BITBASE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+
+'''
+Positions are always seen from the strong side (the one with the piece) as white, a table index is
+strong side to move (0) or not (1), then the strong king, weak king and piece squares, 6 bits each
+'''
+TABLE_SIZE = 2 * 64 * 64 * 64
+TABLE_BYTES = TABLE_SIZE // 8
+
+
+def tableIndex(strongToMove, strongKing, weakKing, piece):
+    return (0 if strongToMove else 1) << 18 | strongKing << 12 | weakKing << 6 | piece
+
+
+class Bitbases():
+    def __init__(self, folder=BITBASE_FOLDER, signatures=SIGNATURES):
+        self.folder = folder
+        self.files = []
+        self.tables = {} #piece type ('Q', 'R', 'p') to its mapped file
+        for signature in signatures:
+            path = os.path.join(folder, signature + '.bin')
+            if not os.path.exists(path):
+                continue
+            f = open(path, 'rb')
+            if os.fstat(f.fileno()).st_size != TABLE_BYTES:
+                f.close()
+                raise ValueError(path + " is not a " + str(TABLE_BYTES) + " byte bitbase")
+            self.files.append(f)
+            self.tables[SIGNATURES[signature]] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    '''
+    Pickle support, a worker process opens the same files again instead of getting a copy of the maps
+    '''
+    def __getstate__(self):
+        return {'folder': self.folder, 'signatures': [signature for signature in SIGNATURES if SIGNATURES[signature] in self.tables]}
+
+    def __setstate__(self, state):
+        self.__init__(state['folder'], state['signatures'])
+
+    '''
+    True if the strong side wins, False for a draw, None if the ending isnt covered. Squares are seen from the strong side
+    '''
+    def probeTable(self, piece, strongToMove, strongKing, weakKing, pieceSq):
+        table = self.tables.get(piece)
+        if table is None:
+            return None
+        index = tableIndex(strongToMove, strongKing, weakKing, pieceSq)
+        return table[index >> 3] >> (index & 7) & 1 == 1
+
+    '''
+    Looks up a position with both kings and one other piece, returns (strong color, win, piece, its square) or None when
+    the table for that piece isnt loaded. A lone bishop or knight is always a draw
+    '''
+    def probe(self, board, whiteToMove):
+        kings = {}
+        piece = None
+        for r in range(8):
+            row = board[r]
+            for c in range(8):
+                square = row[c]
+                if square != "--":
+                    if square[1] == 'K':
+                        kings[square[0]] = r * 8 + c
+                    else:
+                        piece = square
+                        pieceSq = r * 8 + c
+        if piece is None or len(kings) != 2:
+            return None
+        color = piece[0]
+        if piece[1] in 'BN':
+            return color, False, piece, pieceSq
+        flip = 0 if color == 'w' else 56 #black pieces get mirrored top to bottom so the strong side plays up the board
+        win = self.probeTable(piece[1], whiteToMove == (color == 'w'), kings[color] ^ flip,
+                              kings['b' if color == 'w' else 'w'] ^ flip, pieceSq ^ flip)
+        return None if win is None else (color, win, piece, pieceSq)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self.files:
+            f.close()
+        self.tables = {}
+        self.files = []
+
+
+'''
+Builds one table by retrograde analysis and returns it as a bytearray. Every legal position gets its moves from the
+engine's move generator once, then the wins spread backwards from the mates: a position with the weak side to move is
+lost once all of its moves lead to wins, a position with the strong side to move is won once any move does.
+Promotions look up the finished KQK and KRK tables (wins), under promotions to a bishop or knight are draws
+'''
+def buildTable(piece, finished=None):
+    finished = finished or {}
+    gs = GameState(hashSizeMB=0)
+    gs.board = [["--"] * 8 for r in range(8)]
+    gs.currentCastlingRight = CastleRights(False, False, False, False)
+    gs.enpassantPossible = ()
+    board = gs.board
+    won = bytearray(TABLE_SIZE) #1 for a win for the strong side
+    remaining = bytearray(TABLE_SIZE) #weak side to move, moves not yet known to lose
+    edgeFrom = array('I')
+    edgeTo = array('I')
+    queue = []
+    for strongToMove in (True, False):
+        gs.whiteToMove = strongToMove
+        for strongKing in range(64):
+            kr, kc = strongKing >> 3, strongKing & 7
+            for weakKing in range(64):
+                wr, wc = weakKing >> 3, weakKing & 7
+                if abs(kr - wr) <= 1 and abs(kc - wc) <= 1: #kings touching, or on the same square
+                    continue
+                for pieceSq in range(64):
+                    pr, pc = pieceSq >> 3, pieceSq & 7
+                    if pieceSq == strongKing or pieceSq == weakKing or (piece == 'p' and pr in (0, 7)):
+                        continue
+                    board[kr][kc] = 'wK'
+                    board[wr][wc] = 'bK'
+                    board[pr][pc] = 'w' + piece
+                    gs.whiteKingLocation = (kr, kc)
+                    gs.blackKingLocation = (wr, wc)
+                    index = tableIndex(strongToMove, strongKing, weakKing, pieceSq)
+                    gs.whiteToMove = not strongToMove #the side that just moved cant be in check
+                    legal = not (gs.SquareUnderAttack(wr, wc) if strongToMove else gs.SquareUnderAttack(kr, kc))
+                    gs.whiteToMove = strongToMove
+                    if legal:
+                        moves = gs.getValidMoves()
+                        if strongToMove:
+                            for move in moves:
+                                start = move & 63
+                                end = move >> 6 & 63
+                                if move & PROMOTION_FLAG:
+                                    promoted = finished.get(PROMOTION_PIECES[move >> 12 & 3])
+                                    child = tableIndex(False, strongKing, weakKing, end)
+                                    if promoted is not None and promoted[child >> 3] >> (child & 7) & 1 and not won[index]:
+                                        won[index] = 1
+                                        queue.append(index)
+                                elif start == strongKing:
+                                    edgeFrom.append(index)
+                                    edgeTo.append(tableIndex(False, end, weakKing, pieceSq))
+                                else:
+                                    edgeFrom.append(index)
+                                    edgeTo.append(tableIndex(False, strongKing, weakKing, end))
+                        else:
+                            if moves == [] and gs.inCheck: #mated
+                                won[index] = 1
+                                queue.append(index)
+                            remaining[index] = len(moves)
+                            for move in moves:
+                                end = move >> 6 & 63
+                                if end != pieceSq: #taking the piece is a draw, that move never counts down
+                                    edgeFrom.append(index)
+                                    edgeTo.append(tableIndex(True, strongKing, end, pieceSq))
+                    board[kr][kc] = "--"
+                    board[wr][wc] = "--"
+                    board[pr][pc] = "--"
+    #group the edges by the position they lead to, so each result can find the positions that reach it
+    starts = array('I', bytes(4 * (TABLE_SIZE + 1)))
+    for child in edgeTo:
+        starts[child + 1] += 1
+    for i in range(TABLE_SIZE):
+        starts[i + 1] += starts[i]
+    fill = array('I', starts)
+    parents = array('I', bytes(4 * len(edgeTo)))
+    for i in range(len(edgeTo)):
+        child = edgeTo[i]
+        parents[fill[child]] = edgeFrom[i]
+        fill[child] += 1
+    while queue:
+        child = queue.pop()
+        weakLost = child >> 18 == 1
+        for i in range(starts[child], starts[child + 1]):
+            parent = parents[i]
+            if won[parent]:
+                continue
+            if weakLost: #the strong side moves into a lost position for the weak side
+                won[parent] = 1
+                queue.append(parent)
+            else:
+                remaining[parent] -= 1
+                if remaining[parent] == 0: #every weak move loses
+                    won[parent] = 1
+                    queue.append(parent)
+    bits = bytearray(TABLE_BYTES)
+    for index in range(TABLE_SIZE):
+        if won[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+'''
+Builds the tables and writes them to folder, prints how long each took and how many positions are wins
+'''
+def buildBitbases(folder=BITBASE_FOLDER, signatures=SIGNATURES):
+    os.makedirs(folder, exist_ok=True)
+    finished = {}
+    for signature in signatures:
+        start = time.perf_counter()
+        bits = buildTable(SIGNATURES[signature], finished)
+        finished[SIGNATURES[signature]] = bits
+        with open(os.path.join(folder, signature + '.bin'), 'wb') as f:
+            f.write(bits)
+        wins = sum(bin(byte).count('1') for byte in bits)
+        print(signature + ": " + str(wins) + " won positions, " + str(round(time.perf_counter() - start, 1)) + "s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe the KQK, KRK and KPK bitbases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="generate the tables")
+    build.add_argument('--folder', default=BITBASE_FOLDER)
+    probe = commands.add_parser('probe', help="look up a position")
+    probe.add_argument('fen')
+    probe.add_argument('--folder', default=BITBASE_FOLDER)
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        buildBitbases(args.folder)
+    else:
+        gs = GameState(hashSizeMB=0)
+        gs.loadFEN(args.fen)
+        bitbases = Bitbases(args.folder)
+        result = bitbases.probe(gs.board, gs.whiteToMove)
+        if result is None:
+            print("not covered")
+        else:
+            print(("white" if result[0] == 'w' else "black") + (" wins" if result[1] else " draws"))
+        bitbases.close()
+
+
+if __name__ == '__main__':
+    main()
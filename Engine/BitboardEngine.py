@@ -0,0 +1,385 @@
+# Bitboard version of the GameState. The pieces are kept as 12 64 bit python ints (one per piece type and color) and moves are
+# generated with precomputed attack tables instead of walking the 2d board. Square numbers match the board layout,
+# square = row * 8 + col, so a8 is 0 and h1 is 63.
+# The 2d board is still kept up to date by the normal GameState code, so ChessMain and the search work the same on either one.
+from Engine.ChessEngine import GameState, ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG, FLAG_MASK, moveNotation
+
+PIECES = ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')
+FULL = (1 << 64) - 1
+
+
+def onBoard(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+
+'''
+Attacks of a piece that jumps by the given steps, one bitboard per square
+'''
+def buildStepAttacks(steps):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for dr, dc in steps:
+            if onBoard(r + dr, c + dc):
+                attacks |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = buildStepAttacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, 2), (1, -2), (2, -1), (2, 1)))
+KING_ATTACKS = buildStepAttacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+PAWN_ATTACKS = {'w': buildStepAttacks(((-1, -1), (-1, 1))), 'b': buildStepAttacks(((1, -1), (1, 1)))} #squares a pawn of that color attacks
+
+
+'''
+Squares reached sliding from sq in each direction until the first blocker (blocker included)
+'''
+def slide(sq, directions, occupied):
+    r, c = divmod(sq, 8)
+    attacks = 0
+    for dr, dc in directions:
+        endRow, endCol = r + dr, c + dc
+        while onBoard(endRow, endCol):
+            attacks |= 1 << (endRow * 8 + endCol)
+            if occupied >> (endRow * 8 + endCol) & 1:
+                break
+            endRow += dr
+            endCol += dc
+    return attacks
+
+
+'''
+Sliding attack lookup tables. Each line through a square (rank, file, and the two diagonals) gets a mask of the squares
+that can block it, leaving off the edge squares since a piece there never changes the attack. Every subset of a mask is
+looked up once here, so during the search the attacks along a line are just table[sq][occupied & mask[sq]].
+'''
+LINES = {'rank': ((0, -1), (0, 1)), 'file': ((-1, 0), (1, 0)), 'diag': ((-1, -1), (1, 1)), 'antiDiag': ((-1, 1), (1, -1))}
+
+
+def buildLineTables(directions):
+    masks = []
+    tables = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        mask = 0
+        for dr, dc in directions:
+            endRow, endCol = r + dr, c + dc
+            while onBoard(endRow + dr, endCol + dc): #stop one short of the edge
+                mask |= 1 << (endRow * 8 + endCol)
+                endRow += dr
+                endCol += dc
+        table = {}
+        subset = 0
+        while True: #walks through every subset of the mask
+            table[subset] = slide(sq, directions, subset)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_MASKS, RANK_ATTACKS = buildLineTables(LINES['rank'])
+FILE_MASKS, FILE_ATTACKS = buildLineTables(LINES['file'])
+DIAG_MASKS, DIAG_ATTACKS = buildLineTables(LINES['diag'])
+ANTI_DIAG_MASKS, ANTI_DIAG_ATTACKS = buildLineTables(LINES['antiDiag'])
+
+
+def rookAttacks(sq, occupied):
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+
+def bishopAttacks(sq, occupied):
+    return DIAG_ATTACKS[sq][occupied & DIAG_MASKS[sq]] | ANTI_DIAG_ATTACKS[sq][occupied & ANTI_DIAG_MASKS[sq]]
+
+
+'''
+BETWEEN[a][b] is the squares strictly between two squares on a shared line, 0 if they dont share one
+'''
+def buildBetween():
+    table = [[0] * 64 for sq in range(64)]
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)):
+            between = 0
+            endRow, endCol = r + dr, c + dc
+            while onBoard(endRow, endCol):
+                table[sq][endRow * 8 + endCol] = between
+                between |= 1 << (endRow * 8 + endCol)
+                endRow += dr
+                endCol += dc
+    return table
+
+
+BETWEEN = buildBetween()
+
+
+def squares(bitboard): #yields the square of every set bit
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardGameState(GameState):
+    def __init__(self, hashSizeMB=16):
+        GameState.__init__(self, hashSizeMB)
+        self.loadBitboards()
+
+    '''
+    Builds the bitboards from the 2d board
+    '''
+    def loadBitboards(self):
+        self.pieceBitboards = {piece: 0 for piece in PIECES}
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    self.pieceBitboards[self.board[r][c]] |= 1 << (r * 8 + c)
+
+    def loadFEN(self, fen):
+        GameState.loadFEN(self, fen)
+        self.loadBitboards()
+
+    def loadSnapshot(self, data):
+        GameState.loadSnapshot(self, data)
+        self.loadBitboards()
+
+    def clone(self):
+        other = GameState.clone(self)
+        other.pieceBitboards = dict(self.pieceBitboards)
+        return other
+
+    def makeMove(self, move):
+        GameState.makeMove(self, move)
+        move = self.moveLog[-1]
+        end = move >> 6 & 63
+        self.toggleMoveBits(move, self.board[end >> 3][end & 7], self.capturedLog[-1])
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            end = move >> 6 & 63
+            piecePlaced = self.board[end >> 3][end & 7]
+            pieceCaptured = self.capturedLog[-1]
+            GameState.undoMove(self)
+            self.toggleMoveBits(move, piecePlaced, pieceCaptured)
+
+    '''
+    Flips the bits a move changes. Xor undoes itself, so the same function is used for make and undo.
+    piecePlaced is the piece that ends up on the end square, the promoted piece for a promotion
+    '''
+    def toggleMoveBits(self, move, piecePlaced, pieceCaptured):
+        bitboards = self.pieceBitboards
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move & FLAG_MASK
+        if flags & PROMOTION_FLAG:
+            bitboards[piecePlaced[0] + 'p'] ^= 1 << start
+            bitboards[piecePlaced] ^= 1 << end
+        else:
+            bitboards[piecePlaced] ^= (1 << start) | (1 << end)
+        if flags == ENPASSANT_FLAG:
+            bitboards[pieceCaptured] ^= 1 << (start & 56 | end & 7)
+        elif pieceCaptured != "--":
+            bitboards[pieceCaptured] ^= 1 << end
+        if flags == CASTLE_FLAG:
+            rook = piecePlaced[0] + 'R'
+            if end - start == 2: #kingside
+                bitboards[rook] ^= (1 << (end + 1)) | (1 << (end - 1))
+            else: #queenside
+                bitboards[rook] ^= (1 << (end - 2)) | (1 << (end + 1))
+
+    def colorBitboard(self, color):
+        bitboards = self.pieceBitboards
+        return bitboards[color + 'p'] | bitboards[color + 'R'] | bitboards[color + 'N'] | bitboards[color + 'B'] | \
+               bitboards[color + 'Q'] | bitboards[color + 'K']
+
+    '''
+    Bitboard of the pieces of a color that attack sq, with the given occupancy for the sliders
+    '''
+    def attackersOf(self, sq, color, occupied):
+        bitboards = self.pieceBitboards
+        enemy = 'b' if color == 'w' else 'w'
+        queens = bitboards[color + 'Q']
+        return (KNIGHT_ATTACKS[sq] & bitboards[color + 'N']) | (KING_ATTACKS[sq] & bitboards[color + 'K']) | \
+               (PAWN_ATTACKS[enemy][sq] & bitboards[color + 'p']) | \
+               (rookAttacks(sq, occupied) & (bitboards[color + 'R'] | queens)) | \
+               (bishopAttacks(sq, occupied) & (bitboards[color + 'B'] | queens))
+
+    def SquareUnderAttack(self, r, c, throughKing=False):
+        allyColor, enemyColor = ("w", "b") if self.whiteToMove else ("b", "w")
+        occupied = self.colorBitboard('w') | self.colorBitboard('b')
+        if throughKing: #take the king off so sliders see through it
+            occupied ^= self.pieceBitboards[allyColor + 'K']
+        return self.attackersOf(r * 8 + c, enemyColor, occupied) != 0
+
+    '''
+    All legal moves, generated straight from the bitboards
+    '''
+    def getValidMoves(self):
+        return self.generateMoves(False)
+
+    '''
+    Captures and queen promotions for the quiescence search, or every evasion when in check, same as the 2d board version
+    '''
+    def getCaptureMoves(self):
+        return self.generateMoves(True)
+
+    '''
+    True if move is legal here, generating only the moves of the piece on its start square
+    '''
+    def isLegalMove(self, move):
+        return move in self.generateMoves(False, 1 << (move & 63))
+
+    '''
+    Legal moves of the pieces on the squares in fromSquares (all of them by default), with capturesOnly just the captures
+    and queen promotions unless in check
+    '''
+    def generateMoves(self, capturesOnly, fromSquares=FULL):
+        bitboards = self.pieceBitboards
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        allies = self.colorBitboard(allyColor)
+        enemies = self.colorBitboard(enemyColor)
+        occupied = allies | enemies
+        kingBit = bitboards[allyColor + 'K']
+        kingSq = kingBit.bit_length() - 1
+        checkers = self.attackersOf(kingSq, enemyColor, occupied)
+        self.inCheck = checkers != 0
+        if self.inCheck:
+            capturesOnly = False
+        moves = []
+        reachable = enemies if capturesOnly else ~allies
+
+        #king moves, the king is taken off the board so it cant hide behind itself from a slider
+        for sq in squares(KING_ATTACKS[kingSq] & reachable if kingBit & fromSquares else 0):
+            if not self.attackersOf(sq, enemyColor, occupied ^ kingBit):
+                moves.append(kingSq | sq << 6)
+
+        if checkers & (checkers - 1) == 0: #not in double check, other pieces can move
+            #squares that get out of check, anywhere if there is no check
+            if checkers:
+                checkSq = checkers.bit_length() - 1
+                targets = checkers | BETWEEN[kingSq][checkSq]
+            else:
+                targets = FULL
+            #pinned pieces, each one can only move along the line between the king and the pinning piece
+            pinRays = {}
+            enemyQueens = bitboards[enemyColor + 'Q']
+            sliders = (rookAttacks(kingSq, enemies) & (bitboards[enemyColor + 'R'] | enemyQueens)) | \
+                      (bishopAttacks(kingSq, enemies) & (bitboards[enemyColor + 'B'] | enemyQueens))
+            for sq in squares(sliders):
+                blockers = BETWEEN[kingSq][sq] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & allies:
+                    pinRays[blockers.bit_length() - 1] = BETWEEN[kingSq][sq] | (1 << sq)
+
+            self.getBitboardPawnMoves(allyColor, enemyColor, enemies, occupied, targets, pinRays, kingSq, moves, capturesOnly,
+                                      fromSquares)
+            for piece, attacks in (('N', None), ('B', bishopAttacks), ('R', rookAttacks), ('Q', None)):
+                for sq in squares(bitboards[allyColor + piece] & fromSquares):
+                    if piece == 'N':
+                        if sq in pinRays: #a pinned knight can never move
+                            continue
+                        reach = KNIGHT_ATTACKS[sq]
+                    elif piece == 'Q':
+                        reach = rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+                    else:
+                        reach = attacks(sq, occupied)
+                    reach &= reachable & targets & pinRays.get(sq, FULL)
+                    for endSq in squares(reach):
+                        moves.append(sq | endSq << 6)
+
+            if not checkers and not capturesOnly and kingBit & fromSquares:
+                self.getBitboardCastleMoves(allyColor, enemyColor, occupied, kingSq, moves)
+
+        if moves == [] and not capturesOnly and fromSquares == FULL: #same game end flags as the 2d board version
+            if self.inCheck:
+                if self.whiteToMove:
+                    self.whiteMate = True
+                else:
+                    self.blackMate = True
+            else:
+                self.staleMate = True
+        return moves
+
+    '''
+    Pawn moves, with capturesOnly just the captures and the pushes to the last rank, promoting to a queen
+    '''
+    def getBitboardPawnMoves(self, allyColor, enemyColor, enemies, occupied, targets, pinRays, kingSq, moves, capturesOnly=False,
+                             fromSquares=FULL):
+        pawns = self.pieceBitboards[allyColor + 'p'] & fromSquares
+        forward, startRow = (-8, 6) if allyColor == 'w' else (8, 1)
+        lastRank = 0xFF if allyColor == 'w' else 0xFF << 56
+        if self.enpassantPossible != ():
+            enpassantSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+        else:
+            enpassantSq = -1
+        for sq in squares(pawns):
+            allowed = targets & pinRays.get(sq, FULL)
+            oneStep = sq + forward
+            if capturesOnly:
+                if not occupied >> oneStep & 1 and (allowed & lastRank) >> oneStep & 1:
+                    moves.append(sq | oneStep << 6 | PROMOTION_FLAG)
+                for endSq in squares(PAWN_ATTACKS[allyColor][sq] & enemies & allowed):
+                    moves.append(sq | endSq << 6 | (PROMOTION_FLAG if lastRank >> endSq & 1 else 0))
+            else:
+                if not occupied >> oneStep & 1:
+                    if allowed >> oneStep & 1:
+                        self.addPawnMove(sq, oneStep, moves)
+                    twoStep = oneStep + forward
+                    if sq >> 3 == startRow and not occupied >> twoStep & 1 and allowed >> twoStep & 1:
+                        moves.append(sq | twoStep << 6)
+                for endSq in squares(PAWN_ATTACKS[allyColor][sq] & enemies & allowed):
+                    self.addPawnMove(sq, endSq, moves)
+            if enpassantSq >= 0 and PAWN_ATTACKS[allyColor][sq] >> enpassantSq & 1:
+                if self.enpassantIsLegal(sq, enpassantSq, allyColor, enemyColor, occupied, kingSq):
+                    moves.append(sq | enpassantSq << 6 | ENPASSANT_FLAG)
+
+    '''
+    En passant takes two pawns off the same rank at once, so the simple pin and check masks dont cover it.
+    The capture is tried out on the occupancy and the king is checked for attacks directly.
+    '''
+    def enpassantIsLegal(self, sq, enpassantSq, allyColor, enemyColor, occupied, kingSq):
+        bitboards = self.pieceBitboards
+        capturedBit = 1 << (enpassantSq - 8 if allyColor == 'b' else enpassantSq + 8)
+        occupied = (occupied ^ (1 << sq) ^ capturedBit) | (1 << enpassantSq)
+        enemyQueens = bitboards[enemyColor + 'Q']
+        return not ((KNIGHT_ATTACKS[kingSq] & bitboards[enemyColor + 'N']) |
+                    (PAWN_ATTACKS[allyColor][kingSq] & bitboards[enemyColor + 'p'] & ~capturedBit) |
+                    (rookAttacks(kingSq, occupied) & (bitboards[enemyColor + 'R'] | enemyQueens)) |
+                    (bishopAttacks(kingSq, occupied) & (bitboards[enemyColor + 'B'] | enemyQueens)))
+
+    def getBitboardCastleMoves(self, allyColor, enemyColor, occupied, kingSq, moves):
+        rights = self.currentCastlingRight
+        if (rights.wks if allyColor == 'w' else rights.bks):
+            if not occupied & ((1 << (kingSq + 1)) | (1 << (kingSq + 2))) and \
+                    not self.attackersOf(kingSq + 1, enemyColor, occupied) and not self.attackersOf(kingSq + 2, enemyColor, occupied):
+                moves.append(kingSq | (kingSq + 2) << 6 | CASTLE_FLAG)
+        if (rights.wqs if allyColor == 'w' else rights.bqs):
+            if not occupied & ((1 << (kingSq - 1)) | (1 << (kingSq - 2)) | (1 << (kingSq - 3))) and \
+                    not self.attackersOf(kingSq - 1, enemyColor, occupied) and not self.attackersOf(kingSq - 2, enemyColor, occupied):
+                moves.append(kingSq | (kingSq - 2) << 6 | CASTLE_FLAG)
+
+
+'''
+Walks the game tree from the current position of both states and returns the first position where the two backends
+disagree on the legal moves, as (move path, moves only on the 2d board, moves only on the bitboards). None if they match
+'''
+def compareMoveLists(mailboxState, bitboardState, depth, path=()):
+    mailboxMoves = mailboxState.getValidMoves()
+    bitboardMoves = bitboardState.getValidMoves()
+    mailboxNames = sorted(moveNotation(m) + ('e' if m & FLAG_MASK == ENPASSANT_FLAG else '') for m in mailboxMoves)
+    bitboardNames = sorted(moveNotation(m) + ('e' if m & FLAG_MASK == ENPASSANT_FLAG else '') for m in bitboardMoves)
+    if mailboxNames != bitboardNames:
+        return (path, sorted(set(mailboxNames) - set(bitboardNames)), sorted(set(bitboardNames) - set(mailboxNames)))
+    if depth > 1:
+        for move in mailboxMoves:
+            mailboxState.makeMove(move)
+            bitboardState.makeMove(move)
+            difference = compareMoveLists(mailboxState, bitboardState, depth - 1, path + (moveNotation(move),))
+            mailboxState.undoMove()
+            bitboardState.undoMove()
+            if difference is not None:
+                return difference
+    return None
@@ -1,8 +1,334 @@
 # This class is responsible for storing all the info about the current state of a chess game. It will also handle determining valid moves and keep a move log.
-import operator
 import random
+import re
+import struct
+import time
+from Engine.TranspositionTable import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from Engine.EvalCache import EvalCache
+
+'''
+Zobrist keys, one random 64 bit number for every piece on every square, plus side to move, castling rights and en passant file.
+The generator is seeded so the keys come out the same every run
+'''
+zobristRandom = random.Random(1729)
+ZOBRIST_PIECES = {piece: [[zobristRandom.getrandbits(64) for c in range(8)] for r in range(8)]
+                  for piece in ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for i in range(16)] #indexed by CastleRights.index()
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for c in range(8)] #indexed by the file of the en passant square
+ZOBRIST_CASTLED = (zobristRandom.getrandbits(64), zobristRandom.getrandbits(64)) #white, black has castled, only for the eval cache key
+
+'''
+Evaluation tables. Material is positive for white and negative for black, the piece square tables are bonuses
+from white's side of the board (row 0 is the 8th rank) and get flipped for black
+'''
+PIECE_VALUES = {'K': 10000, 'Q': 1000, 'R': 525, 'B': 350, 'N': 350, 'p': 100}
+PIECE_SQUARE_TABLES = {
+    'p': [[0, 0, 0, 0, 0, 0, 0, 0],
+          [50, 50, 50, 50, 50, 50, 50, 50],
+          [10, 10, 20, 30, 30, 20, 10, 10],
+          [5, 5, 10, 25, 25, 10, 5, 5],
+          [0, 0, 0, 20, 20, 0, 0, 0],
+          [5, -5, -10, 0, 0, -10, -5, 5],
+          [5, 10, 10, -20, -20, 10, 10, 5],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    'N': [[-50, -40, -30, -30, -30, -30, -40, -50],
+          [-40, -20, 0, 0, 0, 0, -20, -40],
+          [-30, 0, 10, 15, 15, 10, 0, -30],
+          [-30, 5, 15, 20, 20, 15, 5, -30],
+          [-30, 0, 15, 20, 20, 15, 0, -30],
+          [-30, 5, 10, 15, 15, 10, 5, -30],
+          [-40, -20, 0, 5, 5, 0, -20, -40],
+          [-50, -40, -30, -30, -30, -30, -40, -50]],
+    'B': [[-20, -10, -10, -10, -10, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 10, 10, 5, 0, -10],
+          [-10, 5, 5, 10, 10, 5, 5, -10],
+          [-10, 0, 10, 10, 10, 10, 0, -10],
+          [-10, 10, 10, 10, 10, 10, 10, -10],
+          [-10, 5, 0, 0, 0, 0, 5, -10],
+          [-20, -10, -10, -10, -10, -10, -10, -20]],
+    'R': [[0, 0, 0, 0, 0, 0, 0, 0],
+          [5, 10, 10, 10, 10, 10, 10, 5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [0, 0, 0, 5, 5, 0, 0, 0]],
+    'Q': [[-20, -10, -10, -5, -5, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 5, 5, 5, 0, -10],
+          [-5, 0, 5, 5, 5, 5, 0, -5],
+          [0, 0, 5, 5, 5, 5, 0, -5],
+          [-10, 5, 5, 5, 5, 5, 0, -10],
+          [-10, 0, 5, 0, 0, 0, 0, -10],
+          [-20, -10, -10, -5, -5, -10, -10, -20]],
+    'K': [[-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-20, -30, -30, -40, -40, -30, -30, -20],
+          [-10, -20, -20, -20, -20, -20, -20, -10],
+          [20, 20, 0, 0, 0, 0, 20, 20],
+          [20, 30, 10, 0, 0, 10, 30, 20]]}
+MATERIAL = {'--': 0}
+POSITION_VALUES = {}
+for pieceType in PIECE_VALUES:
+    MATERIAL['w' + pieceType] = PIECE_VALUES[pieceType]
+    MATERIAL['b' + pieceType] = -PIECE_VALUES[pieceType]
+    POSITION_VALUES['w' + pieceType] = [row[:] for row in PIECE_SQUARE_TABLES[pieceType]]
+    POSITION_VALUES['b' + pieceType] = [[-value for value in row] for row in reversed(PIECE_SQUARE_TABLES[pieceType])]
+CASTLE_VALUE = 85 #bonus for having castled
+
+'''
+Pawn structure, from white's side like the rest: a penalty for every pawn past the first on a file and for every pawn
+with no pawns of its own on the files next to it, a bonus for a passed pawn (no enemy pawn in front of it on its own
+or the next files) by how many ranks it has come up. Pawns are kept as 64 bit masks, bit = row * 8 + col
+'''
+DOUBLED_PAWN = 15
+ISOLATED_PAWN = 15
+PASSED_PAWN = (0, 5, 10, 20, 35, 60, 100, 0)
+FILE_MASKS = [sum(1 << (r * 8 + c) for r in range(8)) for c in range(8)]
+ADJACENT_FILE_MASKS = [(FILE_MASKS[c - 1] if c > 0 else 0) | (FILE_MASKS[c + 1] if c < 7 else 0) for c in range(8)]
+PASSED_MASKS = {'w': [sum(FILE_MASKS[f] & ((1 << (sq >> 3) * 8) - 1) for f in range(max(0, (sq & 7) - 1), min(8, (sq & 7) + 2)))
+                      for sq in range(64)],
+                'b': [sum(FILE_MASKS[f] & ~((1 << ((sq >> 3) + 1) * 8) - 1) for f in range(max(0, (sq & 7) - 1), min(8, (sq & 7) + 2)))
+                      for sq in range(64)]} #squares in front of a pawn on its own and the next files, rows go down for white
+PAWN_TABLE_MB = 1
+EVAL_CACHE_MB = 4
+
+
+def bitCount(mask):
+    return bin(mask).count('1')
+
+
+'''
+Pawn structure score of the two pawn masks, with the masks of the passed pawns: (score, white passed, black passed)
+'''
+def pawnStructure(whitePawns, blackPawns):
+    score = 0
+    for c in range(8):
+        white = bitCount(whitePawns & FILE_MASKS[c])
+        black = bitCount(blackPawns & FILE_MASKS[c])
+        if white > 1:
+            score -= DOUBLED_PAWN * (white - 1)
+        if black > 1:
+            score += DOUBLED_PAWN * (black - 1)
+        if white and not whitePawns & ADJACENT_FILE_MASKS[c]:
+            score -= ISOLATED_PAWN * white
+        if black and not blackPawns & ADJACENT_FILE_MASKS[c]:
+            score += ISOLATED_PAWN * black
+    passed = {'w': 0, 'b': 0}
+    for color, pawns, enemies in (('w', whitePawns, blackPawns), ('b', blackPawns, whitePawns)):
+        masks = PASSED_MASKS[color]
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            if not enemies & masks[sq]:
+                passed[color] |= bit
+                score += PASSED_PAWN[7 - (sq >> 3)] if color == 'w' else -PASSED_PAWN[sq >> 3]
+    return score, passed['w'], passed['b']
+
+'''
+Moves inside the engine are plain ints: bits 0-5 are the start square, bits 6-11 the end square (square = row * 8 + col,
+so a8 is 0 and h1 is 63) and bits 12-15 the flags below. They cost next to nothing to make and compare, the Move class
+is only built from them where a person sees the move (ChessMain, notation)
+'''
+ENPASSANT_FLAG = 1 << 12
+CASTLE_FLAG = 2 << 12
+PROMOTION_FLAG = 4 << 12 #the two bits under it pick the piece from PROMOTION_PIECES
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+PROMOTION_FLAGS = tuple(PROMOTION_FLAG | i << 12 for i in range(4))
+FLAG_MASK = 15 << 12
+SQUARE_NAMES = [file + rank for rank in "87654321" for file in "abcdefgh"]
+
+
+def moveNotation(move):
+    notation = SQUARE_NAMES[move & 63] + SQUARE_NAMES[move >> 6 & 63]
+    if move & PROMOTION_FLAG:
+        notation += PROMOTION_PIECES[move >> 12 & 3].lower()
+    return notation
+
+
+'''
+Finds the legal move a SAN (Nbd7, exd6, O-O, e8=Q+) or coordinate (e2e4, e7e8q) token stands for, out of moves (the
+legal moves of gs). None if it doesnt match exactly one
+'''
+def parseMove(gs, token, moves):
+    token = token.rstrip('+#!?')
+    for move in moves:
+        if moveNotation(move) == token:
+            return move
+    if token in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        kingside = len(token) == 3
+        for move in moves:
+            if move & FLAG_MASK == CASTLE_FLAG and (move >> 6 & 7) == (6 if kingside else 2):
+                return move
+        return None
+    match = re.fullmatch(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?', token)
+    if match is None:
+        return None
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    piece = piece or 'p'
+    found = None
+    for move in moves:
+        notation = moveNotation(move)
+        start = move & 63
+        if notation[2:4] != target or gs.board[start >> 3][start & 7][1] != piece:
+            continue
+        if (fromFile is not None and notation[0] != fromFile) or (fromRank is not None and notation[1] != fromRank):
+            continue
+        if move & PROMOTION_FLAG:
+            if PROMOTION_PIECES[move >> 12 & 3] != (promotion or 'Q'):
+                continue
+        elif promotion is not None:
+            continue
+        if found is not None: #ambiguous
+            return None
+        found = move
+    return found
+
+
+'''
+The old 4 digit move number (start row, start col, end row, end col, the promotion piece in the ten thousands) of a
+move code, the same as Move.moveID. Move.__eq__ compares a Move with a code by it, so the castle and en passant flags
+dont have to match
+'''
+def legacyMoveID(move):
+    start = move & 63
+    end = move >> 6 & 63
+    moveID = (start >> 3) * 1000 + (start & 7) * 100 + (end >> 3) * 10 + (end & 7)
+    if move & PROMOTION_FLAG:
+        moveID += (move >> 12 & 3) * 10000
+    return moveID
+
+
+'''
+Move tables for the 2d board, built once at import. For every (row, col): RAYS has the squares out to the edge of the board
+in each of the 8 DIRECTIONS, nearest first, and KNIGHT_TARGETS and KING_TARGETS the squares a knight or a king there
+can reach. The first 4 directions are the straight lines, the last 4 the diagonals
+'''
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def buildTargets(r, c, steps):
+    return tuple((r + dr, c + dc) for dr, dc in steps if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+
+
+def buildRay(r, c, d):
+    return tuple((r + d[0] * i, c + d[1] * i) for i in range(1, 8) if 0 <= r + d[0] * i < 8 and 0 <= c + d[1] * i < 8)
+
+
+RAYS = [[tuple(buildRay(r, c, d) for d in DIRECTIONS) for c in range(8)] for r in range(8)]
+KNIGHT_TARGETS = [[buildTargets(r, c, ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, 2), (1, -2), (2, -1), (2, 1)))
+                   for c in range(8)] for r in range(8)]
+KING_TARGETS = [[buildTargets(r, c, DIRECTIONS) for c in range(8)] for r in range(8)]
+
+'''
+Piece types that attack a square along each direction: the sliders from any distance, and the king and pawns only from
+the square next to it. A white pawn attacks upwards, so it hits a square from below (directions 6 and 7), a black pawn
+from above (4 and 5). ADJACENT_ATTACKERS is indexed by the color of the attacking pieces
+'''
+SLIDING_ATTACKERS = ('RQ',) * 4 + ('BQ',) * 4
+ADJACENT_ATTACKERS = {color: tuple(SLIDING_ATTACKERS[j] + 'K' + ('p' if j in pawnDirections else '') for j in range(8))
+                      for color, pawnDirections in (('w', (6, 7)), ('b', (4, 5)))}
+
+'''
+Margin the quiescence search allows on top of the material a capture wins before it prunes the capture as hopeless
+'''
+DELTA_MARGIN = 200
+
+'''
+Move ordering scores for the main search. The hash move goes first, then captures and queen promotions by captureOrder,
+then the two killer moves of the ply, then the quiet moves by their history score
+'''
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = (1 << 27, (1 << 27) - 1)
+HISTORY_LIMIT = 1 << 20 #when a history score gets this big they all get halved, so old cutoffs fade out
+
+'''
+Drawn positions score 0. In the search a position counts as drawn the first time it repeats, playing into it again
+cant be better for either side. 100 half moves without a capture or pawn move is the 50 move rule
+'''
+DRAW_SCORE = 0
+FIFTY_MOVE_PLIES = 100
+
+'''
+Mate scores MATE_SCORE less the length of the game, a bitbase win sits well under it so a mate the search can see is
+still better. Anything past MATE_BOUND is a mate
+'''
+MATE_SCORE = 10000
+MATE_BOUND = MATE_SCORE - 1000
+BITBASE_WIN = 5000
+
+'''
+Mate scores in the transposition table count from the position stored instead of from the start of the game, so an
+entry is right at whatever ply the position comes up again, and in a worker process that counts plies from a snapshot.
+ply is the length of the move log where the score is stored or found
+'''
+def scoreToTable(score, ply):
+    if MATE_BOUND < score <= MATE_SCORE:
+        return score + ply
+    if -MATE_SCORE <= score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if MATE_BOUND < score <= MATE_SCORE:
+        return score - ply
+    if -MATE_SCORE <= score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+'''
+Search window bounds, further out than any score
+'''
+INFINITE_SCORE = 100000
+
+'''
+Pruning in the main search. Null move: the side to move passes and the position gets searched NULL_MOVE_REDUCTION plies
+shallower, if it still fails high a real move would too. Never in check (passing is illegal there), with only king and
+pawns left (zugzwang is common in pawn endings, passing is exactly what the side cant do) or twice in a row.
+Late move reductions: quiet moves ordered after the first LMR_FIRST_MOVE get searched a ply shallower, two plies from
+LMR_DEEP_MOVE on, and only get the full depth if the shallow search says they beat alpha.
+Futility pruning: one ply from the leaves, a quiet move whose static score is still FUTILITY_MARGIN short of alpha
+doesnt get searched, childScore gives the static score without making the move
+'''
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_FIRST_MOVE = 3
+LMR_DEEP_MOVE = 8
+FUTILITY_MARGIN = 150
+NULL_MOVE = 0 #what a null move logs in the move log, a8a8 is never a real move
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+'''
+Snapshot layout (see GameState.snapshot): one byte per square with the index of its piece in SNAPSHOT_PIECES, a flags
+byte (bit 0 white to move, bits 1-4 CastleRights.index(), bit 5 white has castled, bit 6 black has castled), the en
+passant square (255 for none), the halfmove clock, the fullmove number and how many zobrist keys follow. The keys are
+the positions since the last capture or pawn move, all that repetitionCount can look back at, the last one is the
+current position. Little endian, so a snapshot written to disk reads back on any machine
+'''
+SNAPSHOT_PIECES = ('--', 'wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK')
+SNAPSHOT_CODES = {piece: code for code, piece in enumerate(SNAPSHOT_PIECES)}
+SNAPSHOT_HEADER = struct.Struct('<64sBBHHH')
+SNAPSHOT_NO_ENPASSANT = 255
+
+'''
+Raised inside the search when a timed search runs past its deadline
+'''
+class SearchTimeout(Exception):
+    pass
+
 class GameState():
-    def __init__(self):
+    def __init__(self, hashSizeMB=16):
         #board is 8x8 2d list, each element has 2 characters.
         #The first character is the color, b or w,
         #The second character represents the type, k q r b n or p
@@ -16,12 +342,12 @@ class GameState():
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        self.boardBackup = []
         self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
                               'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
 
         self.whiteToMove = True
-        self.moveLog = []
+        self.moveLog = [] #move codes
+        self.capturedLog = [] #piece taken by each move in the log, "--" if none
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
         self.inCheck = False
@@ -31,129 +357,565 @@ class GameState():
         self.blackMate = False
         self.staleMate = False
         self.enpassantPossible = () #coordinates for the square where an en passant can capture
+        self.enpassantPossibleLog = [self.enpassantPossible]
         self.currentCastlingRight = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
                                              self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
         self.whiteKingCastle = False
         self.blackKingCastle = False
+        self.zobristLog = [self.computeZobristKey()] #key of every position in the game so far, last one is the current position
+        self.halfmoveLog = [0] #moves since the last capture or pawn move for every position in zobristLog, for the 50 move rule
+        self.fullmoveStart = 1 #move number of the position the move log starts from
+        self.materialScore, self.positionScore = self.computeScores() #evaluation terms, updated by makeMove and undoMove
+        self.pawnKey, self.whitePawns, self.blackPawns = self.computePawns() #same, the zobrist key of the pawns alone and their masks
+        self.scoreLog = []
+        self.transpositionTable = TranspositionTable(hashSizeMB)
+        self.pawnTable = EvalCache(PAWN_TABLE_MB) #pawn key to pawnStructure's (score, white passed, black passed)
+        self.evalCache = EvalCache(EVAL_CACHE_MB) #evaluation key to static eval, None to evaluate every time
+        self.nodes = 0 #positions searched, counts up forever
+        self.searchDeadline = None #perf_counter time a timed search has to stop at
+        self.stopSearch = False #set from another thread to stop a running search
+        self.lastSearchScore = 0
+        self.lastSearchDepth = 0
+        self.openingBook = None #an OpeningBook, when set computerMove plays from it while the position is in the book
+        self.bitbases = None #Bitbases, when set the search scores king and piece against king endings exactly
+        self.pieceCount = 32 #pieces on the board, kings included
+        self.stopEvent = None #multiprocessing event that stops the search, set in the worker processes of a ParallelSearch
+        self.searchPool = None #a ParallelSearch, when set generateMove splits the root moves over its processes
+        self.searchStats = None #a SearchStats, when set every search gets measured
+        self.childEvaluator = None #BatchEval.evaluateChildren (needs NumPy) or the like, when set evaluateChildren and futility pruning score children with it
+        self.killers = {} #ply (length of the move log) to the ids of the last two quiet moves that caused a cutoff there
+        self.history = {piece: [[0] * 8 for c in range(8)] for piece in ZOBRIST_PIECES} #cutoff scores by piece and target square
+        self.cutoffs = 0 #beta cutoffs in the search, counts up forever like nodes
+        self.firstMoveCutoffs = 0 #cutoffs on the first move searched, a good move ordering gets most of them here
+
+    '''
+    Pickle support, so the game can be sent to another process. The transposition table, the pawn table and eval cache,
+    the search pool and the bound move functions stay behind, the copy gets empty tables of the same sizes
+    '''
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['transpositionTable'] = self.transpositionTable.sizeMB
+        state['pawnTable'] = self.pawnTable.sizeMB
+        state['evalCache'] = self.evalCache.sizeMB if self.evalCache is not None else None
+        del state['moveFunctions']
+        state['stopEvent'] = None
+        state['searchPool'] = None
+        state['openingBook'] = None
+        state['searchStats'] = None
+        state['stopSearch'] = False
+        for name in [name for name in state if hasattr(type(self), name)]: #wrappers a measured search puts on methods
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.transpositionTable = TranspositionTable(state['transpositionTable'])
+        self.pawnTable = EvalCache(state['pawnTable'])
+        self.evalCache = EvalCache(state['evalCache']) if state['evalCache'] is not None else None
+        self.bindMoveFunctions()
+
+    def bindMoveFunctions(self):
+        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
+                              'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+
+    '''
+    Zobrist key of the current position, kept up to date by makeMove and undoMove
+    '''
+    @property
+    def zobristKey(self):
+        return self.zobristLog[-1]
 
+    @property
+    def halfmoveClock(self):
+        return self.halfmoveLog[-1]
 
+    '''
+    How many times the current position came up before. Only positions with the same side to move since the last
+    capture or pawn move can match, a repeat cant reach back past one of those
+    '''
+    def repetitionCount(self):
+        keys = self.zobristLog
+        key = keys[-1]
+        count = 0
+        oldest = max(len(keys) - 1 - self.halfmoveLog[-1], 0) #a FEN clock can reach back before the game log starts
+        for i in range(len(keys) - 3, oldest - 1, -2):
+            if keys[i] == key:
+                count += 1
+        return count
 
-    ''' Takes a move as a parameter and executes, doesnt work for castling, en passant, or promotion'''
+    '''
+    Draw by threefold repetition or the 50 move rule, checkmate and stalemate come from getValidMoves
+    '''
+    def isDraw(self):
+        return self.halfmoveLog[-1] >= FIFTY_MOVE_PLIES or self.repetitionCount() >= 2
+
+    '''
+    Builds the zobrist key from scratch, only needed for a new position or to double check the incremental key
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r][c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.currentCastlingRight.index()]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    '''
+    Adds up material and piece square values over the whole board. Only needed for a new position, after that
+    makeMove and undoMove keep the scores up to date
+    '''
+    def computeScores(self):
+        material = 0
+        position = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    material += MATERIAL[piece]
+                    position += POSITION_VALUES[piece][r][c]
+        return material, position
+
+    '''
+    Zobrist key of the pawns alone (the same numbers as in the full key) and the masks of the white and black pawns,
+    from scratch like computeScores
+    '''
+    def computePawns(self):
+        key = 0
+        pawns = {'wp': 0, 'bp': 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece in pawns:
+                    key ^= ZOBRIST_PIECES[piece][r][c]
+                    pawns[piece] |= 1 << (r * 8 + c)
+        return key, pawns['wp'], pawns['bp']
+
+    '''
+    Adds or takes away the pawn on r, c in the pawn key and masks, for makeMove
+    '''
+    def togglePawn(self, pawn, r, c):
+        self.pawnKey ^= ZOBRIST_PIECES[pawn][r][c]
+        if pawn[0] == 'w':
+            self.whitePawns ^= 1 << (r * 8 + c)
+        else:
+            self.blackPawns ^= 1 << (r * 8 + c)
+
+    '''
+    Sets the game up from a FEN string, the move log starts over from that position.
+    The move counters at the end of the FEN are optional
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        pieceNames = {'p': 'p', 'r': 'R', 'n': 'N', 'b': 'B', 'q': 'Q', 'k': 'K'}
+        self.board = []
+        for rank in fields[0].split('/'):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    color = 'w' if char.isupper() else 'b'
+                    row.append(color + pieceNames[char.lower()])
+                    if char == 'K':
+                        self.whiteKingLocation = (len(self.board), len(row) - 1)
+                    elif char == 'k':
+                        self.blackKingLocation = (len(self.board), len(row) - 1)
+            self.board.append(row)
+        if len(self.board) != 8 or any(len(row) != 8 for row in self.board):
+            raise ValueError("bad FEN board: " + fields[0])
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.currentCastlingRight = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        if len(fields) > 3 and fields[3] != '-':
+            self.enpassantPossible = (Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]])
+        else:
+            self.enpassantPossible = ()
+        self.whiteKingCastle = False
+        self.blackKingCastle = False
+        self.resetLogs()
+        self.zobristLog = [self.computeZobristKey()]
+        self.halfmoveLog = [int(fields[4]) if len(fields) > 4 else 0]
+        self.fullmoveStart = int(fields[5]) if len(fields) > 5 else 1
+
+    '''
+    Starts the logs over from the position on the board, for loadFEN and loadSnapshot once they have set up the board,
+    side to move, castling rights and en passant square. The incremental evaluation terms get worked out from scratch,
+    the zobrist and halfmove logs are left to the caller
+    '''
+    def resetLogs(self):
+        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
+                                             self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.moveLog = []
+        self.capturedLog = []
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.whiteMate = False
+        self.blackMate = False
+        self.staleMate = False
+        self.pieceCount = sum(square != "--" for row in self.board for square in row)
+        self.materialScore, self.positionScore = self.computeScores()
+        self.pawnKey, self.whitePawns, self.blackPawns = self.computePawns()
+        self.scoreLog = []
+
+    '''
+    The position as a short bytes string, SNAPSHOT_HEADER.size bytes plus 8 for every position since the last capture or
+    pawn move (see SNAPSHOT_PIECES for the layout). Holds everything the search needs, the moves that led here and the
+    tables dont go in, so it is a few dozen times smaller than a pickle of the GameState and quicker to make and load
+    '''
+    def snapshot(self):
+        keys = self.zobristLog[-1 - min(self.halfmoveLog[-1], len(self.zobristLog) - 1):]
+        flags = self.whiteToMove | self.currentCastlingRight.index() << 1 | self.whiteKingCastle << 5 | self.blackKingCastle << 6
+        enpassant = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else SNAPSHOT_NO_ENPASSANT
+        board = bytes([SNAPSHOT_CODES[square] for row in self.board for square in row])
+        return (SNAPSHOT_HEADER.pack(board, flags, enpassant, self.halfmoveLog[-1], self.fullmoveNumber(), len(keys)) +
+                struct.pack('<%dQ' % len(keys), *keys))
+
+    '''
+    Sets the game up from a snapshot, like loadFEN the move log starts over from that position. The tables are kept,
+    so a worker can load one snapshot after another into the same GameState
+    '''
+    def loadSnapshot(self, data):
+        board, flags, enpassant, halfmoveClock, fullmoveNumber, keyCount = SNAPSHOT_HEADER.unpack_from(data)
+        self.board = [[SNAPSHOT_PIECES[code] for code in board[r * 8:r * 8 + 8]] for r in range(8)]
+        whiteKing = board.find(SNAPSHOT_CODES['wK'])
+        if whiteKing >= 0:
+            self.whiteKingLocation = (whiteKing >> 3, whiteKing & 7)
+        blackKing = board.find(SNAPSHOT_CODES['bK'])
+        if blackKing >= 0:
+            self.blackKingLocation = (blackKing >> 3, blackKing & 7)
+        self.whiteToMove = bool(flags & 1)
+        self.currentCastlingRight = CastleRights(bool(flags & 2), bool(flags & 4), bool(flags & 8), bool(flags & 16))
+        self.enpassantPossible = (enpassant >> 3, enpassant & 7) if enpassant != SNAPSHOT_NO_ENPASSANT else ()
+        self.whiteKingCastle = bool(flags & 32)
+        self.blackKingCastle = bool(flags & 64)
+        self.resetLogs()
+        self.zobristLog = list(struct.unpack_from('<%dQ' % keyCount, data, SNAPSHOT_HEADER.size))
+        self.halfmoveLog = [halfmoveClock - keyCount + 1 + i for i in range(keyCount)] #only the last one counts for anything
+        self.fullmoveStart = fullmoveNumber
+
+    '''
+    A new game set up from a snapshot, with tables of hashSizeMB
+    '''
+    @classmethod
+    def fromSnapshot(cls, data, hashSizeMB=16):
+        gs = cls(hashSizeMB)
+        gs.loadSnapshot(data)
+        return gs
+
+    '''
+    The current position as a FEN string. The en passant square is given after every two square pawn move, the same
+    way loadFEN takes it
+    '''
+    def toFEN(self):
+        return self.toEPD() + " " + str(self.halfmoveLog[-1]) + " " + str(self.fullmoveNumber())
+
+    '''
+    Move number of the current position, it goes up after every black move
+    '''
+    def fullmoveNumber(self):
+        startedWithBlack = self.whiteToMove == (len(self.moveLog) % 2 == 1)
+        return self.fullmoveStart + (len(self.moveLog) + startedWithBlack) // 2
+
+    '''
+    The first four FEN fields, plus EPD operations from a dict of opcode to a list of operands (or a single string)
+    '''
+    def toEPD(self, operations=None):
+        pieceNames = {'p': 'p', 'R': 'r', 'N': 'n', 'B': 'b', 'Q': 'q', 'K': 'k'}
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                name = pieceNames[square[1]]
+                rank += name.upper() if square[0] == 'w' else name
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.currentCastlingRight
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        enpassant = SQUARE_NAMES[self.enpassantPossible[0] * 8 + self.enpassantPossible[1]] if self.enpassantPossible != () else "-"
+        epd = "/".join(ranks) + (" w " if self.whiteToMove else " b ") + (castling or "-") + " " + enpassant
+        for opcode, operands in (operations or {}).items():
+            if isinstance(operands, str):
+                operands = [operands]
+            epd += " " + " ".join([opcode] + [operand if re.fullmatch(r'[^\s;"]+', operand) else '"' + operand + '"'
+                                              for operand in operands]) + ";"
+        return epd
+
+    '''
+    Sets the game up from an EPD line and returns its operations as a dict of opcode to a list of operands, for example
+    {'bm': ['Qd1+'], 'id': ['WAC.001']}. The hmvc and fmvn operations set the move counters
+    '''
+    def loadEPD(self, epd):
+        fields = epd.split(None, 4)
+        if len(fields) < 4:
+            raise ValueError("bad EPD: " + epd)
+        operations = {}
+        for operation in re.findall(r'((?:[^;"]|"[^"]*")+);', fields[4] if len(fields) > 4 else ""):
+            tokens = re.findall(r'"([^"]*)"|(\S+)', operation)
+            tokens = [quoted or plain for quoted, plain in tokens]
+            if tokens:
+                operations[tokens[0]] = tokens[1:]
+        counters = [operations.get('hmvc', ['0'])[0], operations.get('fmvn', ['1'])[0]]
+        self.loadFEN(" ".join(fields[:4] + counters))
+        return operations
+
+    '''
+    Counts the leaf nodes of the legal move tree to the given depth, used to check the move generator against known numbers
+    '''
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.getValidMoves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.makeMove(move)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    '''
+    Perft split up by the first move, returns a dict of move notation to node count. Handy for finding which move is wrong
+    '''
+    def divide(self, depth):
+        counts = {}
+        for move in self.getValidMoves():
+            self.makeMove(move)
+            counts[moveNotation(move)] = self.perft(depth - 1)
+            self.undoMove()
+        return counts
+
+
+    '''
+    Makes a move, given as a move code (or a Move, which gets turned into its code)
+    '''
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        if move.__class__ is not int:
+            move = move.code
+        board = self.board
+        startRow = move >> 3 & 7
+        startCol = move & 7
+        endRow = move >> 9 & 7
+        endCol = move >> 6 & 7
+        flags = move & FLAG_MASK
+        isEnpassantMove = flags == ENPASSANT_FLAG
+        pieceMoved = board[startRow][startCol]
+        pieceCaptured = board[startRow][endCol] if isEnpassantMove else board[endRow][endCol]
+        #the key is xored with everything that changes, so undoMove just has to pop it
+        key = self.zobristLog[-1] ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[pieceMoved][startRow][startCol]
+        if pieceCaptured != "--" and not isEnpassantMove:
+            key ^= ZOBRIST_PIECES[pieceCaptured][endRow][endCol]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        key ^= ZOBRIST_CASTLING[self.currentCastlingRight.index()]
+        #evaluation terms get the same treatment, the old scores are logged for undoMove
+        self.scoreLog.append((self.materialScore, self.positionScore, self.pawnKey, self.whitePawns, self.blackPawns))
+        material = self.materialScore - MATERIAL[pieceCaptured]
+        position = self.positionScore - POSITION_VALUES[pieceMoved][startRow][startCol]
+        if pieceCaptured != "--":
+            captureRow = startRow if isEnpassantMove else endRow
+            position -= POSITION_VALUES[pieceCaptured][captureRow][endCol]
+        board[startRow][startCol] = "--"
+        board[endRow][endCol] = pieceMoved
         self.whiteToMove = not self.whiteToMove #swap players
         #update kings location
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if pieceMoved == 'wK':
+            self.whiteKingLocation = (endRow, endCol)
+        elif pieceMoved == 'bK':
+            self.blackKingLocation = (endRow, endCol)
         #pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+        if flags & PROMOTION_FLAG:
+            board[endRow][endCol] = pieceMoved[0] + PROMOTION_PIECES[flags >> 12 & 3]
+        piecePlaced = board[endRow][endCol]
+        key ^= ZOBRIST_PIECES[piecePlaced][endRow][endCol]
+        material += MATERIAL[piecePlaced] - MATERIAL[pieceMoved]
+        position += POSITION_VALUES[piecePlaced][endRow][endCol]
+        #pawn key and masks, most moves dont touch a pawn
+        if pieceMoved[1] == 'p':
+            self.togglePawn(pieceMoved, startRow, startCol)
+            if piecePlaced == pieceMoved:
+                self.togglePawn(pieceMoved, endRow, endCol)
+        if pieceCaptured[1] == 'p':
+            self.togglePawn(pieceCaptured, startRow if isEnpassantMove else endRow, endCol)
         #enpassant
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = '--' #capturing pawn
+        if isEnpassantMove:
+            board[startRow][endCol] = '--' #capturing pawn
+            key ^= ZOBRIST_PIECES[pieceCaptured][startRow][endCol]
         #update of enpassant variable
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2: #2 square pawn advances
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.endCol)
+        if pieceMoved[1] == 'p' and abs(startRow - endRow) == 2: #2 square pawn advances
+            self.enpassantPossible = ((startRow + endRow)//2, endCol)
+            key ^= ZOBRIST_ENPASSANT[endCol]
         else:
             self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(self.enpassantPossible)
         #castling move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2: #kingside
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] #copies rook to new square
-                self.board[move.endRow][move.endCol+1] = '--' #erase old rook
+        if flags == CASTLE_FLAG:
+            if endCol - startCol == 2: #kingside
+                rookFrom, rookTo = endCol + 1, endCol - 1
             else: #queenside
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]  # copies rook to new square
-                self.board[move.endRow][move.endCol - 2] = '--'  # erase old rook
+                rookFrom, rookTo = endCol - 2, endCol + 1
+            rook = board[endRow][rookFrom]
+            board[endRow][rookTo] = rook #copies rook to new square
+            board[endRow][rookFrom] = '--' #erase old rook
+            key ^= ZOBRIST_PIECES[rook][endRow][rookFrom] ^ ZOBRIST_PIECES[rook][endRow][rookTo]
+            position += POSITION_VALUES[rook][endRow][rookTo] - POSITION_VALUES[rook][endRow][rookFrom]
             if not self.whiteToMove:
                 self.whiteKingCastle = True
             else:
                 self.blackKingCastle = True
         #castling rights
-        self.updateCastleRights(move)
+        self.updateCastleRights(pieceMoved, move & 63, pieceCaptured, move >> 6 & 63)
         self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
                                                  self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
-
-        #draw by triplication
-        if move in self.moveLog:
-            for i in range(len(self.boardBackup)):
-                if self.boardBackup[i] == self.board:
-                    self.staleMate = True
-                    #print("Draw by repetition")
-            self.boardBackup.append(self.board)
-
-        #print(move.moveID)
+        key ^= ZOBRIST_CASTLING[self.currentCastlingRight.index()]
+        self.zobristLog.append(key)
+        self.materialScore = material
+        self.positionScore = position
+        #captures and pawn moves cant be undone over the board, they reset the 50 move count
+        self.halfmoveLog.append(0 if pieceCaptured != "--" or pieceMoved[1] == 'p' else self.halfmoveLog[-1] + 1)
+        if pieceCaptured != "--":
+            self.pieceCount -= 1
         self.moveLog.append(move)  # log the move
-
-
-
+        self.capturedLog.append(pieceCaptured)
 
 
     ''' Undo the last move made'''
     def undoMove(self):
         if len(self.moveLog) != 0: #make sure there is a move to undo
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            pieceCaptured = self.capturedLog.pop()
+            board = self.board
+            startRow = move >> 3 & 7
+            startCol = move & 7
+            endRow = move >> 9 & 7
+            endCol = move >> 6 & 7
+            flags = move & FLAG_MASK
+            pieceMoved = board[endRow][endCol]
+            if flags & PROMOTION_FLAG:
+                pieceMoved = pieceMoved[0] + 'p'
+            board[startRow][startCol] = pieceMoved
+            board[endRow][endCol] = pieceCaptured
             self.whiteToMove = not self.whiteToMove
             #update kings locaton
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
+            if pieceMoved == 'wK':
+                self.whiteKingLocation = (startRow, startCol)
+            elif pieceMoved == 'bK':
+                self.blackKingLocation = (startRow, startCol)
             #undo en passant
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = '--' #leave landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
-            #undo a 2 square pawn advance
-            if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
+            if flags == ENPASSANT_FLAG:
+                board[endRow][endCol] = '--' #leave landing square blank
+                board[startRow][endCol] = pieceCaptured
+            self.enpassantPossibleLog.pop()
+            self.enpassantPossible = self.enpassantPossibleLog[-1]
             #undoing castling rights
             self.castleRightsLog.pop()
-            self.currentCastlingRight = self.castleRightsLog[-1] #sets the current castle rights to last in list after the pop+
+            castleRights = self.castleRightsLog[-1] #copy it, makeMove changes the current rights in place
+            self.currentCastlingRight = CastleRights(castleRights.wks, castleRights.bks, castleRights.wqs, castleRights.bqs)
+            self.zobristLog.pop()
+            self.halfmoveLog.pop()
+            if pieceCaptured != "--":
+                self.pieceCount += 1
+            self.materialScore, self.positionScore, self.pawnKey, self.whitePawns, self.blackPawns = self.scoreLog.pop()
             #undo castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: #kingside
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = '--'
+            if flags == CASTLE_FLAG:
+                if endCol - startCol == 2: #kingside
+                    board[endRow][endCol+1] = board[endRow][endCol-1]
+                    board[endRow][endCol-1] = '--'
                 else: #queenside
-                    self.board[move.endRow][move.endCol -2] = self.board[move.endRow][move.endCol +1]
-                    self.board[move.endRow][move.endCol +1] = '--'
+                    board[endRow][endCol -2] = board[endRow][endCol +1]
+                    board[endRow][endCol +1] = '--'
                 if self.whiteToMove:
                     self.whiteKingCastle = False
                 else:
                     self.blackKingCastle = False
 
-            #undo triplication and boardBackup
-            if move in self.moveLog:
-                self.boardBackup.pop()
-                self.staleMate = False
 
 
+    '''
+    Passes the turn, for null move pruning. Only the side to move and the en passant square change. The half move clock
+    starts over, so the repetition check never looks back past a pass, the position before it had the other side to move
+    '''
+    def makeNullMove(self):
+        key = self.zobristLog[-1] ^ ZOBRIST_BLACK_TO_MOVE
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(())
+        self.zobristLog.append(key)
+        self.halfmoveLog.append(0)
+        self.moveLog.append(NULL_MOVE)
+        self.capturedLog.append("--")
+        self.whiteToMove = not self.whiteToMove
+
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.moveLog.pop()
+        self.capturedLog.pop()
+        self.zobristLog.pop()
+        self.halfmoveLog.pop()
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+
+    '''
+    True when the side to move has a piece besides its king and pawns
+    '''
+    def hasPieces(self):
+        color = 'w' if self.whiteToMove else 'b'
+        for row in self.board:
+            for square in row:
+                if square[0] == color and square[1] in 'NBRQ':
+                    return True
+        return False
 
-    def updateCastleRights(self, move): #updates castling rights
-        if move.pieceMoved == 'wK':
+    '''
+    Updates castling rights after a move, start and end are square numbers
+    '''
+    def updateCastleRights(self, pieceMoved, start, pieceCaptured, end):
+        if pieceMoved == 'wK':
             self.currentCastlingRight.wks = False
             self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
+        elif pieceMoved == 'bK':
             self.currentCastlingRight.bks = False
             self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 7: #left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 0:
-                    self.currentCastlingRight.wks = False
-        elif move. pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 7:
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 0:
-                    self.currentCastlingRight.bks = False
+        elif pieceMoved == 'wR':
+            if start == 56: #left rook
+                self.currentCastlingRight.wqs = False
+            elif start == 63:
+                self.currentCastlingRight.wks = False
+        elif pieceMoved == 'bR':
+            if start == 0:
+                self.currentCastlingRight.bqs = False
+            elif start == 7:
+                self.currentCastlingRight.bks = False
+        #a rook captured on its starting square takes the castle with it
+        if pieceCaptured == 'wR':
+            if end == 56:
+                self.currentCastlingRight.wqs = False
+            elif end == 63:
+                self.currentCastlingRight.wks = False
+        elif pieceCaptured == 'bR':
+            if end == 0:
+                self.currentCastlingRight.bqs = False
+            elif end == 7:
+                self.currentCastlingRight.bks = False
 
 
 
@@ -172,26 +934,7 @@ class GameState():
             kingCol = self.blackKingLocation[1]
         if self.inCheck:
             if len(self.checks) == 1: #only one check, block or move
-                moves = self.getAllPossibleMoves()
-                check = self.checks[0] #checks info
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol] #piece causing check
-                validSquares = [] #squares that pieces can move to
-                # if knight, capture knight or move king
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) #check 2 and 3 are the directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: #piece end checks
-                            break
-                #get rid of any moves that dont work
-                for i in range(len(moves) - 1, -1, -1): #go through list backwards
-                    if moves[i].pieceMoved[1] != 'K': #doesnt move king
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: #move doest block check or capture
-                            moves.remove(moves[i])
+                self.getEvasionMoves(kingRow, kingCol, self.checks[0], moves)
             else: #double check, has to move
                 self.getKingMoves(kingRow, kingCol, moves)
 
@@ -206,10 +949,135 @@ class GameState():
             moves = self.getAllPossibleMoves()
             if moves == []: #stalemate detection, no moves but not in check
                 self.staleMate = True
-                print("Stalemate")
+                #print("Stalemate")
         return moves
 
 
+    '''
+    Moves out of a single check, built straight from the squares that block it or take the checking piece instead of
+    generating every move and throwing most away. A pinned piece can never block or take a checker, its pin line and
+    the check line only meet at the king
+    '''
+    def getEvasionMoves(self, kingRow, kingCol, check, moves):
+        self.getKingMoves(kingRow, kingCol, moves)
+        board = self.board
+        checkRow, checkCol = check[0], check[1]
+        pinned = {(pin[0], pin[1]) for pin in self.pins}
+        if board[checkRow][checkCol][1] == 'N': #a knight check cant be blocked
+            targets = ((checkRow, checkCol),)
+        else:
+            ray = RAYS[kingRow][kingCol][DIRECTIONS.index((check[2], check[3]))]
+            targets = ray[:ray.index((checkRow, checkCol)) + 1]
+        for endRow, endCol in targets:
+            self.getMovesTo(endRow, endCol, pinned, moves)
+        #a pawn that just moved two squares and gives check can also be taken en passant
+        if self.enpassantPossible != () and board[checkRow][checkCol][1] == 'p' and checkCol == self.enpassantPossible[1] \
+                and abs(checkRow - self.enpassantPossible[0]) == 1:
+            pawn = board[kingRow][kingCol][0] + 'p'
+            for c in (checkCol - 1, checkCol + 1):
+                if 0 <= c < 8 and board[checkRow][c] == pawn and (checkRow, c) not in pinned and \
+                        self.enpassantIsLegal(checkRow, c, checkCol):
+                    moves.append(checkRow * 8 + c | (self.enpassantPossible[0] * 8 + checkCol) << 6 | ENPASSANT_FLAG)
+
+    '''
+    Adds the moves of the side to move's unpinned pieces (not the king) that land on (endRow, endCol), found by looking
+    outward from that square
+    '''
+    def getMovesTo(self, endRow, endCol, pinned, moves):
+        board = self.board
+        allyColor = "w" if self.whiteToMove else "b"
+        end = endRow * 8 + endCol
+        rays = RAYS[endRow][endCol]
+        for j in range(8):
+            sliders = SLIDING_ATTACKERS[j]
+            for r, c in rays[j]:
+                piece = board[r][c]
+                if piece != "--":
+                    if piece[0] == allyColor and piece[1] in sliders and (r, c) not in pinned:
+                        moves.append(r * 8 + c | end << 6)
+                    break
+        knight = allyColor + 'N'
+        for r, c in KNIGHT_TARGETS[endRow][endCol]:
+            if board[r][c] == knight and (r, c) not in pinned:
+                moves.append(r * 8 + c | end << 6)
+        pawn = allyColor + 'p'
+        back = 1 if self.whiteToMove else -1 #pawns come from the row behind the square
+        r = endRow + back
+        if not 0 <= r < 8:
+            return
+        if board[endRow][endCol] == "--": #pushes, one square or two from the starting row
+            if board[r][endCol] == pawn:
+                if (r, endCol) not in pinned:
+                    self.addPawnMove(r * 8 + endCol, end, moves)
+            elif board[r][endCol] == "--" and endRow == (4 if self.whiteToMove else 3) and \
+                    board[r + back][endCol] == pawn and (r + back, endCol) not in pinned:
+                moves.append((r + back) * 8 + endCol | end << 6)
+        else: #captures
+            for c in (endCol - 1, endCol + 1):
+                if 0 <= c < 8 and board[r][c] == pawn and (r, c) not in pinned:
+                    self.addPawnMove(r * 8 + c, end, moves)
+
+    '''
+    Legal captures and queen promotions only, for the quiescence search. Builds just those moves, the quiet moves never
+    get made. In check every legal move is returned instead, an evasion doesnt have to be a capture (self.inCheck tells
+    the caller which one it got)
+    '''
+    def getCaptureMoves(self):
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return self.getValidMoves()
+        moves = []
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        pinDirections = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                pinDirection = pinDirections.get((r, c))
+                if piece[1] == 'p':
+                    self.getPawnCaptures(r, c, pinDirection, enemyColor, moves)
+                elif piece[1] == 'N':
+                    if pinDirection is None: #a pinned knight can never move
+                        for endRow, endCol in KNIGHT_TARGETS[r][c]:
+                            if self.board[endRow][endCol][0] == enemyColor:
+                                moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                elif piece[1] == 'K':
+                    for endRow, endCol in KING_TARGETS[r][c]:
+                        if self.board[endRow][endCol][0] == enemyColor and not self.SquareUnderAttack(endRow, endCol, True):
+                            moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                else:
+                    rays = RAYS[r][c]
+                    for j in (range(4) if piece[1] == 'R' else range(4, 8) if piece[1] == 'B' else range(8)):
+                        d = DIRECTIONS[j]
+                        if pinDirection is not None and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                            continue
+                        for endRow, endCol in rays[j]: #slide to the first piece, only an enemy one can be taken
+                            endPiece = self.board[endRow][endCol]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColor:
+                                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                                break
+        return moves
+
+    '''
+    Pawn captures, en passant and pushes to the last rank for getCaptureMoves. Promotions are to a queen only
+    '''
+    def getPawnCaptures(self, r, c, pinDirection, enemyColor, moves):
+        forward = -1 if self.whiteToMove else 1
+        endRow = r + forward
+        promotion = PROMOTION_FLAG if endRow == 0 or endRow == 7 else 0
+        if promotion and self.board[endRow][c] == "--":
+            if pinDirection is None or pinDirection[1] == 0:
+                moves.append(r * 8 + c | (endRow * 8 + c) << 6 | promotion)
+        for side in (-1, 1):
+            endCol = c + side
+            if 0 <= endCol < 8 and (pinDirection is None or pinDirection in ((forward, side), (-forward, -side))):
+                if self.board[endRow][endCol][0] == enemyColor:
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6 | promotion)
+                elif (endRow, endCol) == self.enpassantPossible and self.enpassantIsLegal(r, c, endCol):
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6 | ENPASSANT_FLAG)
+
     ''' 
     All moves that can be played, ignoring check 
     '''
@@ -235,43 +1103,70 @@ class GameState():
                 self.pins.remove(self.pins[i])
                 break
 
+        start = r * 8 + c
         if self.whiteToMove: #white pawn moves
             if self.board[r-1][c] == "--": #single square advancement
-                if not piecePinned or pinDirection == (-1, 0):
-                    moves.append(Move((r, c), (r - 1, c), self.board))
+                if not piecePinned or pinDirection in ((-1, 0), (1, 0)):
+                    self.addPawnMove(start, start - 8, moves)
                     if r == 6 and self.board[r-2][c] == "--": #double square starting move
-                        moves.append(Move((r, c), (r - 2, c), self.board))
+                        moves.append(start | (start - 16) << 6)
             if c-1 >= 0:
-                if not piecePinned or pinDirection == (-1, -1):
+                if not piecePinned or pinDirection in ((-1, -1), (1, 1)):
                     if self.board[r-1][c-1][0] == 'b': #enemy piece to capture to the left
-                        moves.append(Move((r, c), (r - 1, c -1), self.board))
-                    elif (r-1, c-1) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r - 1, c - 1), self.board, isEnpassantMove=True))
+                        self.addPawnMove(start, start - 9, moves)
+                    elif (r-1, c-1) == self.enpassantPossible and self.enpassantIsLegal(r, c, c - 1):
+                        moves.append(start | (start - 9) << 6 | ENPASSANT_FLAG)
             if c+1 <= 7:
-                if not piecePinned or pinDirection == (-1, 1):
+                if not piecePinned or pinDirection in ((-1, 1), (1, -1)):
                     if self.board[r-1][c+1][0] == 'b': #enemy piece to capture to the right
-                        moves.append(Move((r, c), (r - 1, c +1), self.board))
-                    elif (r-1, c+1) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r - 1, c + 1), self.board, isEnpassantMove=True))
+                        self.addPawnMove(start, start - 7, moves)
+                    elif (r-1, c+1) == self.enpassantPossible and self.enpassantIsLegal(r, c, c + 1):
+                        moves.append(start | (start - 7) << 6 | ENPASSANT_FLAG)
         else: #Black pawn moves
             if self.board[r + 1][c] == "--":  # single square advancement
-                if not piecePinned or pinDirection == (1, 0):
-                    moves.append(Move((r, c), (r + 1, c), self.board))
+                if not piecePinned or pinDirection in ((1, 0), (-1, 0)):
+                    self.addPawnMove(start, start + 8, moves)
                     if r == 1 and self.board[r + 2][c] == "--":  # double square starting move
-                        moves.append(Move((r, c), (r + 2, c), self.board))
+                        moves.append(start | (start + 16) << 6)
             if c-1 >= 0:      #black diagonal captures
-                if not piecePinned or pinDirection == (1, -1):
+                if not piecePinned or pinDirection in ((1, -1), (-1, 1)):
                     if self.board[r+1][c-1][0] == 'w': #enemy piece to capture to the left
-                        moves.append(Move((r, c), (r + 1, c -1), self.board))
-                    elif (r + 1, c - 1) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board, isEnpassantMove=True))
+                        self.addPawnMove(start, start + 7, moves)
+                    elif (r + 1, c - 1) == self.enpassantPossible and self.enpassantIsLegal(r, c, c - 1):
+                        moves.append(start | (start + 7) << 6 | ENPASSANT_FLAG)
             if c+1 <= 7:
-                if not piecePinned or pinDirection == (1, 1):
+                if not piecePinned or pinDirection in ((1, 1), (-1, -1)):
                     if self.board[r+1][c+1][0] == 'w': #enemy piece to capture to the right
-                        moves.append(Move((r, c), (r + 1, c +1), self.board))
-                    elif (r + 1, c + 1) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board, isEnpassantMove=True))
-        #get pawn premotions later, also en-passant
+                        self.addPawnMove(start, start + 9, moves)
+                    elif (r + 1, c + 1) == self.enpassantPossible and self.enpassantIsLegal(r, c, c + 1):
+                        moves.append(start | (start + 9) << 6 | ENPASSANT_FLAG)
+
+    '''
+    Adds a pawn move, a pawn reaching the last rank adds one move for each piece it can promote to
+    '''
+    def addPawnMove(self, start, end, moves):
+        if end < 8 or end >= 56:
+            for flag in PROMOTION_FLAGS:
+                moves.append(start | end << 6 | flag)
+        else:
+            moves.append(start | end << 6)
+
+    '''
+    En passant takes two pawns off the same rank at once, which can uncover a check the pin search doesnt see.
+    Tries the capture on the board and looks for a check
+    '''
+    def enpassantIsLegal(self, r, c, endCol):
+        endRow = self.enpassantPossible[0]
+        pawn = self.board[r][c]
+        captured = self.board[r][endCol]
+        self.board[r][c] = "--"
+        self.board[r][endCol] = "--"
+        self.board[endRow][endCol] = pawn
+        inCheck = self.checkForPinsAndChecks()[0]
+        self.board[r][c] = pawn
+        self.board[r][endCol] = captured
+        self.board[endRow][endCol] = "--"
+        return not inCheck
 
     '''
     Get all the rook moves for rook at row and col, add to list
@@ -286,29 +1181,22 @@ class GameState():
                 if self.board[r][c][1] != 'Q':
                     self.pins.remove(self.pins[i])
                 break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) #directions of movement
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #checks if on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--": #empty square
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor: #enemy square
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else: #if same color piece break
-                            break
-                else:
+        board = self.board
+        rays = RAYS[r][c]
+        for j in range(4):
+            d = DIRECTIONS[j]
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--": #empty square
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                elif endPiece[0] == enemyColor: #enemy square
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                    break
+                else: #if same color piece break
                     break
-
-
-
-
-
 
     '''
     Get all the knight moves for rook at row and col, add to list
@@ -321,16 +1209,12 @@ class GameState():
                 piecePinned = True
                 self.pins.remove(self.pins[i])
                 break
-        directions = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, 2), (1, -2), (2, -1), (2, 1))
+        if piecePinned:
+            return
         allyColor = "w" if self.whiteToMove else "b"
-        for d in directions:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+        for endRow, endCol in KNIGHT_TARGETS[r][c]:
+            if self.board[endRow][endCol][0] != allyColor:
+                moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
 
     '''
     Get all the bishop moves for rook at row and col, add to list
@@ -344,22 +1228,20 @@ class GameState():
                 pinDirection = (self.pins[i][2], self.pins[i][3])
                 self.pins.remove(self.pins[i])
                 break
-        directions = ((-1, -1), (1, -1), (1, 1), (-1, 1))
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+        board = self.board
+        rays = RAYS[r][c]
+        for j in range(4, 8):
+            d = DIRECTIONS[j]
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                elif endPiece[0] == enemyColor:
+                    moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
+                    break
                 else:
                     break
 
@@ -374,28 +1256,10 @@ class GameState():
     Get all the King moves for rook at row and col, add to list
     '''
     def getKingMoves(self, r, c, moves):
-        rowMoves = (-1,-1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
         allyColor = "w" if self.whiteToMove else "b"
-        mateCounter = 8
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # not an ally piece
-                    # check for checks on square
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+        for endRow, endCol in KING_TARGETS[r][c]:
+            if self.board[endRow][endCol][0] != allyColor and not self.SquareUnderAttack(endRow, endCol, True): #not an ally piece, not attacked
+                moves.append(r * 8 + c | (endRow * 8 + endCol) << 6)
         self.getCastleMoves(r, c, moves)
 
     '''
@@ -412,14 +1276,14 @@ class GameState():
     def getKingsideCastleMoves(self, r, c, moves):
         if self.board[r][c+1] == '--' and self.board[r][c+2] =='--':
             if not self.SquareUnderAttack(r, c+1) and not self.SquareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove=True))
+                moves.append(r * 8 + c | (r * 8 + c + 2) << 6 | CASTLE_FLAG)
 
 
 
     def getQueensideCastleMoves(self, r, c, moves):
         if self.board[r][c-1] == '--' and self.board[r][c-2] =='--' and self.board[r][c-3] == '--':
             if not self.SquareUnderAttack(r, c-1) and not self.SquareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
+                moves.append(r * 8 + c | (r * 8 + c - 2) << 6 | CASTLE_FLAG)
 
 
 
@@ -440,309 +1304,764 @@ class GameState():
             allyColor = "b"
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
-        #check outward for pins and checks
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+        #check outward for pins and checks, the king and pawns only attack from the first square
+        board = self.board
+        rays = RAYS[startRow][startCol]
+        adjacent = ADJACENT_ATTACKERS[enemyColor]
+        for j in range(8):
+            d = DIRECTIONS[j]
             possiblePin = () #reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
+            attackers = adjacent[j]
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece != "--":
                     if endPiece[0] == allyColor and endPiece[1] != 'K':
                         if possiblePin == (): #1st blocking piece, could be pinned
                             possiblePin = (endRow, endCol, d[0], d[1])
                         else: #2nd piece, cant be pinned
                             break
                     elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        #5 possibilities, big ol conditional
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
+                        if endPiece[1] in attackers:
                             if possiblePin == (): #no piece blocking, check
                                 inCheck = True
                                 checks.append((endRow, endCol, d[0], d[1]))
-                                break
                             else: #piece blocked, pin
                                 pins.append(possiblePin)
-                                break
-                        else:
-                            break
-                else:
-                    break #off board
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, 2), (1, -2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N':
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+                        break
+                attackers = SLIDING_ATTACKERS[j]
+        knight = enemyColor + 'N'
+        for endRow, endCol in KNIGHT_TARGETS[startRow][startCol]:
+            if board[endRow][endCol] == knight:
+                inCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
         return inCheck, pins, checks
 
-    def SquareUnderAttack(self, r, c):   #checks to see if any piece is attacking the square at r, c
-        threat = False
-        if self.whiteToMove:
-            enemyColor = "b"
-            allyColor = "w"
-            startRow = r
-            startCol = c
-        else:
-            enemyColor = "w"
-            allyColor = "b"
-            startRow = r
-            startCol = c
-        # check outward for pins and checks
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            possiblePin = ()  # reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':
-                        if possiblePin == ():  # 1st blocking piece, could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else:  # 2nd piece, cant be pinned
-                            break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        # 5 possibilities, big ol conditional
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (
-                                        enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == ():  # no piece blocking, threat
-                                threat = True
-                            else:  # piece blocked, pin
-                                threat = False
-                        else:
-                            break
-                else:
-                    break  # off board
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, 2), (1, -2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N':
-                    threat = True
-        return threat
-
-
-    #chess computer moment
-    def minMax(self, depth, alpha, beta):  # takes in the state being minmaxed, the player of evaluation, and the depth, as well as alpha and beta for minmax pruning
-        if depth == 0 or self.whiteMate or self.blackMate or self.staleMate:  # bottom line eval
-              # evaluates the board
-            Value = self.evaluatePosition()
+    '''
+    True if the other side attacks the square at r, c. With throughKing the side to move's king doesnt block, for
+    checking where the king itself can go (it cant step back along the line of a slider that checks it)
+    '''
+    def SquareUnderAttack(self, r, c, throughKing=False):
+        enemyColor, allyKing = ("b", "wK") if self.whiteToMove else ("w", "bK")
+        board = self.board
+        rays = RAYS[r][c]
+        adjacent = ADJACENT_ATTACKERS[enemyColor]
+        # check outward for attackers, the first piece in each direction is the only one that can attack
+        for j in range(8):
+            attackers = adjacent[j]
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece != "--" and not (throughKing and endPiece == allyKing):
+                    if endPiece[0] == enemyColor and endPiece[1] in attackers:
+                        return True
+                    break
+                attackers = SLIDING_ATTACKERS[j]
+        knight = enemyColor + 'N'
+        for endRow, endCol in KNIGHT_TARGETS[r][c]:
+            if board[endRow][endCol] == knight:
+                return True
+        return False
+
+
+    '''
+    Principal variation search in negamax form: scores are from the side to move's point of view and every child is
+    searched with the window flipped around. The first move gets the full window, the rest a zero window (alpha,
+    alpha + 1) that only asks whether they beat it, and the ones that do get searched again with the full window.
+    Null move pruning and late move reductions cut the tree down further, see their constants at the top
+    '''
+    def negamax(self, depth, alpha, beta, nullAllowed=True):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and self.searchStopped():
+            raise SearchTimeout() #out of time or told to stop, iterativeSearch catches this and cleans up
+        if self.repetitionCount(): #the line went round in a circle, no point searching it again
+            return DRAW_SCORE
+        #a drawn bitbase ending is done, a won one still gets searched so the mate gets closer, quiesce scores its leaves
+        if self.pieceCount == 3 and self.bitbases is not None and self.bitbaseScore() == DRAW_SCORE:
+            return DRAW_SCORE
+        sign = 1 if self.whiteToMove else -1 #evaluatePosition scores from white's side
+        if self.whiteMate or self.blackMate or self.staleMate:  # game over, evaluates the board
+            Value = sign * self.evaluatePosition()
             self.whiteMate = False
             self.blackMate = False
             self.staleMate = False
             return Value
-
-        if self.whiteToMove:
-            maxEval = -100000
-            #moves = self.getValidMoves() #old move gen
-            moves = sorted(self.getValidMoves(), key=operator.attrgetter('moveValue'), reverse=True) #new move gen, sorts list based on potential move value, helps alpha beta
-            for i in range(len(moves)):
-                self.makeMove(moves[i])
-                eval = self.minMax(depth - 1, alpha, beta) #recursion with 1 less depth, heart of minimax alg
-                self.undoMove()
-                maxEval = max(maxEval, eval)
-                alpha = max(alpha, eval)
+        if depth <= 0: #bottom line eval, after the captures have played out
+            return self.quiesce(alpha, beta)
+
+        #transposition table, a deep enough entry can end the search here, otherwise its best move gets searched first
+        key = self.zobristKey
+        hashMove = None
+        entry = self.transpositionTable.probe(key)
+        if entry is not None:
+            hashMove = entry[4]
+            if entry[1] >= depth:
+                score = scoreFromTable(entry[2], len(self.moveLog))
+                if entry[3] == EXACT:
+                    return score
+                elif entry[3] == LOWERBOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
                 if beta <= alpha:
+                    return score
+        alphaStart = alpha
+        betaStart = beta
+
+        inCheck = self.SquareUnderAttack(*(self.whiteKingLocation if self.whiteToMove else self.blackKingLocation))
+        #null move, only on zero window nodes, the principal variation gets searched properly
+        if (nullAllowed and depth >= NULL_MOVE_MIN_DEPTH and beta - alpha == 1 and not inCheck and
+                sign * self.evaluatePosition() >= beta and self.hasPieces()):
+            self.makeNullMove()
+            score = -self.negamax(depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, False)
+            self.undoNullMove()
+            if score >= beta:
+                return beta #not the score itself, a mate found after passing isnt real
+
+        #50 move rule, a mate on the 100th half move still counts. Out of check a side with no moves is stalemated, a draw too
+        if self.halfmoveLog[-1] >= FIFTY_MOVE_PLIES and (not inCheck or self.getValidMoves() != []):
+            return DRAW_SCORE
+        killers = self.killers.get(len(self.moveLog), ())
+        board = self.board
+        bestMove = None
+        bestScore = -INFINITE_SCORE
+        futile = depth == 1 and beta - alpha == 1 and not inCheck and -BITBASE_WIN < alpha < BITBASE_WIN
+        childScores = {} if futile and self.childEvaluator is not None else None #filled in by the picker, one batch for the quiets
+        i = -1
+        for move in self.pickMoves(hashMove, inCheck, childScores):
+            i += 1
+            flags = move & FLAG_MASK
+            quiet = board[move >> 9 & 7][move >> 6 & 7] == "--" and flags != ENPASSANT_FLAG and not flags & PROMOTION_FLAG
+            if futile and i > 0 and quiet and move not in killers:
+                futilityScore = sign * (childScores[move] if childScores is not None else self.childScore(move)) + FUTILITY_MARGIN
+                if futilityScore <= alpha:
+                    bestScore = max(bestScore, futilityScore)
+                    continue
+            reduction = 0
+            if depth >= LMR_MIN_DEPTH and i >= LMR_FIRST_MOVE and not inCheck and quiet and move not in killers:
+                reduction = 2 if i >= LMR_DEEP_MOVE and depth > LMR_MIN_DEPTH else 1
+            self.makeMove(move)
+            if reduction and self.SquareUnderAttack(*(self.whiteKingLocation if self.whiteToMove else self.blackKingLocation)):
+                reduction = 0 #checks dont get reduced
+            if i == 0:
+                score = -self.negamax(depth - 1, -beta, -alpha)
+            else:
+                score = -self.negamax(depth - 1 - reduction, -alpha - 1, -alpha)
+                if reduction and score > alpha: #looked good at the reduced depth, check it at the full depth
+                    score = -self.negamax(depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta: #better than the first move, get its real score
+                    score = -self.negamax(depth - 1, -beta, -alpha)
+            self.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    self.recordCutoff(move, depth, i)
                     break
-            return maxEval
+        if i < 0: #no legal moves, checkmate or stalemate
+            self.whiteMate = False
+            self.blackMate = False
+            self.staleMate = False
+            return -(MATE_SCORE - len(self.moveLog)) if inCheck else DRAW_SCORE
 
+        if bestScore <= alphaStart:
+            bound = UPPERBOUND
+        elif bestScore >= betaStart:
+            bound = LOWERBOUND
         else:
-            minEval = 100000
-            moves = sorted(self.getValidMoves(), key=operator.attrgetter('moveValue'), reverse=True)
-            for i in range(len(moves)):
-                self.makeMove(moves[i])
-                eval = self.minMax(depth - 1, alpha, beta)
-                self.undoMove()
-                minEval = min(minEval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return minEval
+            bound = EXACT
+        self.transpositionTable.store(key, depth, scoreToTable(bestScore, len(self.moveLog)), bound, bestMove)
+        return bestScore
 
-    def evaluatePosition1(self):
-        return 0
-    def evaluatePosition(self): #Placeholder for the positional evaluation
-        materialEvals = {'wK': 10000, 'wQ': 1000, 'wR': 525, 'wB': 350, 'wN': 350, 'wp': 100,
-                         'bK': -10000, 'bQ': -1000, 'bR': -525, 'bB': -350, 'bN': -350, 'bp': -100,
-                         '--': 0}  # used for material evaluation
-        value = 0
-        mobilityValue = 5
-        castleValue = 85
-        if self.staleMate or self.whiteMate or self.blackMate: #gives the end game positions a value, should discourage repetiton
-            value = 10000*(self.blackMate) -10000*(self.whiteMate)
+    '''
+    Quiescence search, plays out captures and promotions past the search depth so a position doesnt get evaluated
+    in the middle of an exchange. Scores from the side to move's point of view like negamax. The side to move can stand
+    pat on the static eval instead of capturing, unless it is in check, then every evasion gets searched. Captures that
+    cant bring the score back up to alpha even with a margin for the positional change are skipped, and so are captures
+    of a defended piece by a more valuable one
+    '''
+    def quiesce(self, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and self.searchStopped():
+            raise SearchTimeout()
+        sign = 1 if self.whiteToMove else -1
+        if self.whiteMate or self.blackMate or self.staleMate:
+            Value = sign * self.evaluatePosition()
+            self.whiteMate = False
+            self.blackMate = False
+            self.staleMate = False
+            return Value
+        moves = self.getCaptureMoves()
+        inCheck = self.inCheck #the searches below overwrite self.inCheck
+        if self.pieceCount == 3 and self.bitbases is not None and (moves != [] or not inCheck): #mates score as mates
+            score = self.bitbaseScore()
+            if score is not None:
+                return sign * score
+        if inCheck:
+            if moves == []: #checkmated
+                Value = sign * self.evaluatePosition()
+                self.whiteMate = False
+                self.blackMate = False
+                return Value
+            standPat = -INFINITE_SCORE
         else:
-            for r in range(0, 8): #evaluates each piece on the board with the weights in the dictionary way above
-                for c in range(0, 8):
-                    value = value + materialEvals[self.board[r][c]]
-                    #print(value)
-            if not self.whiteToMove:
-                value = value - len(self.getValidMoves()) * mobilityValue
-                self.whiteToMove = not self.whiteToMove
-                value = value + len(self.getValidMoves()) * mobilityValue
-                self.whiteToMove = not self.whiteToMove
-                #print(value)
-            else:
-                value = value + len(self.getValidMoves()) * mobilityValue
-                self.whiteToMove = not self.whiteToMove
-                value = value - len(self.getValidMoves()) * mobilityValue
-                self.whiteToMove = not self.whiteToMove
-                #print(value)
-            #(self.whiteKingCastle)
-            #print(self.blackKingCastle)
-            value = value + castleValue * (self.whiteKingCastle) - castleValue * (self.blackKingCastle)
-            #print(value)
-
-        return value
-
-    def computerMove(self, depth): #looks at all possible moves, minimax's each one with depth-1(so depth makes sense), returns best move for each color
-        if len(self.moveLog) <= 7:
-            return self.openingTree(depth)
+            standPat = sign * self.evaluatePosition()
+
+        if standPat >= beta:
+            return standPat
+        bestScore = standPat
+        alpha = max(alpha, standPat)
+        for move in sorted(moves, key=self.captureOrder, reverse=True):
+            if not inCheck and (standPat + self.captureGain(move) + DELTA_MARGIN <= alpha or self.losingCapture(move)):
+                continue #cant catch up to alpha, or gives up more than it takes
+            self.makeMove(move)
+            score = -self.quiesce(-beta, -alpha)
+            self.undoMove()
+            bestScore = max(bestScore, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return bestScore
+
+    '''
+    A capture of a cheaper piece on a square the other side defends, the quiescence search leaves these out.
+    Only looks at the first defender, a defender hiding behind the capturing piece isnt seen so the capture gets searched
+    '''
+    def losingCapture(self, move):
+        if move & PROMOTION_FLAG:
+            return False
+        board = self.board
+        endRow = move >> 9 & 7
+        endCol = move >> 6 & 7
+        if abs(MATERIAL[board[move >> 3 & 7][move & 7]]) <= abs(MATERIAL[board[endRow][endCol]]):
+            return False
+        return self.SquareUnderAttack(endRow, endCol)
+
+    '''
+    Score of a position the bitbases cover, None if they dont. A win gets BITBASE_WIN plus the material and a push
+    towards the mate, otherwise every won position would look the same and the search could shuffle around without
+    ever mating: a pawn up the board, or the losing king to the edge with the winning king next to it. The piece
+    square tables are left out, the king table wants the king at home
+    '''
+    def bitbaseScore(self):
+        result = self.bitbases.probe(self.board, self.whiteToMove)
+        if result is None:
+            return None
+        color, win, piece, square = result
+        if not win:
+            return DRAW_SCORE
+        if color == 'w':
+            winner, loser, sign = self.whiteKingLocation, self.blackKingLocation, 1
         else:
-            return self.generateMove(depth)
+            winner, loser, sign = self.blackKingLocation, self.whiteKingLocation, -1
+        if piece[1] == 'p':
+            rowsToGo = square >> 3 if color == 'w' else 7 - (square >> 3)
+            progress = 50 * (6 - rowsToGo) + 5 * (7 - max(abs(winner[0] - (square >> 3)), abs(winner[1] - (square & 7))))
+        else:
+            edge = max(3 - loser[0], loser[0] - 4) + max(3 - loser[1], loser[1] - 4)
+            progress = 20 * edge + 10 * (7 - max(abs(winner[0] - loser[0]), abs(winner[1] - loser[1])))
+        return sign * (BITBASE_WIN + progress) + self.materialScore
 
     '''
-    Opening tree below, could use alot of work, format so is easier to expand
+    Material a capture or promotion wins, the move hasnt been made yet
     '''
+    def captureGain(self, move):
+        flags = move & FLAG_MASK
+        if flags == ENPASSANT_FLAG:
+            return PIECE_VALUES['p']
+        gain = abs(MATERIAL[self.board[move >> 9 & 7][move >> 6 & 7]])
+        if flags & PROMOTION_FLAG:
+            gain += PIECE_VALUES[PROMOTION_PIECES[flags >> 12 & 3]] - PIECE_VALUES['p']
+        return gain
 
+    '''
+    Sort key for captures, most valuable piece taken first and the cheapest piece taking it breaks ties.
+    Promotions count the piece they make
+    '''
+    def captureOrder(self, move):
+        return self.captureGain(move) * 16 - abs(MATERIAL[self.board[move >> 3 & 7][move & 7]]) // 100
 
-    def betterOpeningTree(self, depth): #will be a revised version of the opening tree, might work better, maybe not.
-        moveIDs = []
-        for i in len(self.moveLog): #makes the moveIDs list into a group
-            moveIDs.append(self.moveLog[i].moveID)
-        pass
+    '''
+    True once the search is past its deadline or has been told to stop, from another thread or another process
+    '''
+    def searchStopped(self):
+        if self.stopSearch or (self.searchDeadline is not None and time.perf_counter() >= self.searchDeadline):
+            return True
+        return self.stopEvent is not None and self.stopEvent.is_set()
 
-    def openingTree(self, depth): #no clue how I'd use a dict here, using a big ol if tree. Should be fine, only one use per click, only in early game
-        if self.whiteToMove:
-            if self.moveLog == []:
-                moves = [Move((6, 4), (4, 4), self.board), Move((6, 3), (4, 3), self.board)] #king and queen pawn openings
-                return random.choice(moves)
-            elif self.moveLog[0].moveID == 6444: #White Kings pawn
-                if len(self.moveLog) == 2: #3rd move responses
-                    if self.moveLog[1].moveID == 1232: #Kings pawn game
-                        return Move((7, 6), (5, 5), self.board) #Kings knight opening
-                    elif self.moveLog[1].moveID == 1434:  # Sicilian
-                        moves = [Move((7, 6), (5, 5), self.board), Move((7, 1), (5, 2), self.board)]  # Main sicilian line and closed sicilian
-                        return random.choice(moves)
-                    elif self.moveLog[1].moveID == 1222:  # Caro-Kahn
-                        return Move((6, 3), (4, 3), self.board) # Main Caro Kahn line
-                    else:
-                        return self.generateMove(depth)
-                elif len(self.moveLog) == 4: #5th move responses
-                    if self.moveLog[2].moveID == 7655 and self.moveLog[1].moveID == 1232:
-                        return Move((7, 5), (4, 2), self.board) #kings pawn to Italian, tree end
-                    elif self.moveLog[2].moveID == 7655:
-                        return Move((6, 3), (4, 3), self.board) #Open Sicilian End
-                    else:
-                        return self.generateMove(depth)
-                else:
-                    return self.generateMove(depth)
-            elif self.moveLog[0].moveID == 6343: #queens pawn responses
-                if len(self.moveLog) == 2: #3rd move
-                    if self.moveLog[1].moveID == 1333 or self.moveLog[1].moveID == 625:
-                        return  Move((6, 2), (4, 2), self.board) #Queens gambit/Indian
-                    else:
-                        return self.generateMove(depth)
-                else:
-                    return self.generateMove(depth)
+    '''
+    Sorts moves best first for alpha beta: the move from the transposition table, captures by the most valuable piece
+    taken, the killer moves of this ply, then the quiet moves that caused the most cutoffs before
+    '''
+    def orderMoves(self, moves, hashMove=None):
+        killers = self.killers.get(len(self.moveLog), ())
+        history = self.history
+        board = self.board
+        captureOrder = self.captureOrder
+        def score(move):
+            if move == hashMove:
+                return HASH_MOVE_SCORE
+            endRow = move >> 9 & 7
+            endCol = move >> 6 & 7
+            flags = move & FLAG_MASK
+            if board[endRow][endCol] != "--" or flags == ENPASSANT_FLAG or flags == PROMOTION_FLAG:
+                return CAPTURE_SCORE + captureOrder(move)
+            if move in killers:
+                return KILLER_SCORES[killers.index(move)]
+            return history[board[move >> 3 & 7][move & 7]][endRow][endCol]
+        return sorted(moves, key=score, reverse=True)
 
+    '''
+    Hands out the moves of a negamax node one at a time, in stages, so a cutoff early on saves generating and sorting
+    the rest. The hash move comes first and only gets checked for legality, nothing is generated for it. Then the
+    captures and queen promotions that dont lose material, best first, then the killers (checked like the hash move),
+    then the losing captures, then every other quiet move by history score, generated only now. In check the evasions
+    are few, they get generated and sorted all at once. Every move handed out is legal. The generator picks up where it
+    left off after the caller has made and undone a move, each stage works out the pins it needs again.
+    With a childScores dict the quiet moves get their static scores put in it by evaluateChildren, all in one go when
+    their stage is reached, for futility pruning with a childEvaluator
+    '''
+    def pickMoves(self, hashMove=None, inCheck=False, childScores=None):
+        if inCheck:
+            yield from self.orderMoves(self.getValidMoves(), hashMove)
+            return
+        if hashMove is not None and self.isLegalMove(hashMove):
+            yield hashMove
+        else:
+            hashMove = None
+        captures = sorted(self.getCaptureMoves(), key=self.captureOrder, reverse=True)
+        losing = []
+        for move in captures:
+            if move == hashMove:
+                continue
+            if self.losingCapture(move):
+                losing.append(move)
             else:
-                return self.generateMove(depth)
+                yield move
+        board = self.board
+        tried = set(captures)
+        tried.add(hashMove)
+        for move in self.killers.get(len(self.moveLog), ()):
+            #a killer is quiet where it was found, here its square could be taken or it could be illegal
+            if move is not None and move not in tried and board[move >> 9 & 7][move >> 6 & 7] == "--" and self.isLegalMove(move):
+                tried.add(move)
+                yield move
+        yield from losing
+        history = self.history
+        quiets = [move for move in self.getValidMoves() if move not in tried]
+        quiets.sort(key=lambda move: history[board[move >> 3 & 7][move & 7]][move >> 9 & 7][move >> 6 & 7], reverse=True)
+        if childScores is not None and quiets:
+            childScores.update(zip(quiets, self.evaluateChildren(quiets)))
+        yield from quiets
 
-        else:
-            if self.moveLog[0].moveID == 6444: #kings pawn response tree
-                if len(self.moveLog) == 1: #second move responses
-                    moves = [Move((1, 2), (3, 2), self.board), Move((1, 4), (3, 4), self.board), Move((1, 2), (2, 2), self.board)] #Kings pawn, sicilian, and Caro-Kahn
-                    return random.choice(moves)
-                elif len(self.moveLog) == 3: #4th move responses
-                    if self.moveLog[2].moveID == 7655 and self.moveLog[1].moveID == 1232:
-                        return Move((0, 1), (2, 2), self.board) #kings pawn cont
-                    elif self.moveLog[2].moveID == 7655:
-                        return Move((1, 3), (2, 3), self.board) #Open Sicilian
-                    elif self.moveLog[2].moveID == 7152:
-                        return Move((0, 1), (2, 2), self.board) #Closed Sicilian end
-                    elif self.moveLog[2].moveID == 6343:
-                        return Move((1, 3), (3, 3), self.board) #Caro Kahn end
-                    else:
-                        return self.generateMove(depth)
-                else:
-                    return self.generateMove(depth)
+    '''
+    True if move is legal in this position. Only the moves of the piece on its start square get generated, for a move
+    that came from somewhere else (the hash table, the killers) and not from this position's move generation
+    '''
+    def isLegalMove(self, move):
+        r = move >> 3 & 7
+        c = move & 7
+        piece = self.board[r][c]
+        if piece[0] != ('w' if self.whiteToMove else 'b'):
+            return False
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return move in self.getValidMoves()
+        moves = []
+        self.moveFunctions[piece[1]](r, c, moves)
+        return move in moves
 
-            elif self.moveLog[0].moveID == 6343: #Queen pawns response tree
-                if len(self.moveLog) == 1:
-                    moves = [Move((0, 6), (2, 5), self.board), Move((1, 3), (3, 3), self.board)]  # Indians and queens' pawn
-                    return random.choice(moves)
-                else:
-                    return self.generateMove(depth)
-            else:
-                return self.generateMove(depth)
+    '''
+    Called when a move causes a beta cutoff. A quiet move becomes a killer move for this ply and gets a history bonus,
+    deeper cutoffs count for more
+    '''
+    def recordCutoff(self, move, depth, moveNumber):
+        self.cutoffs += 1
+        if moveNumber == 0:
+            self.firstMoveCutoffs += 1
+        endRow = move >> 9 & 7
+        endCol = move >> 6 & 7
+        flags = move & FLAG_MASK
+        if self.board[endRow][endCol] != "--" or flags == ENPASSANT_FLAG or flags == PROMOTION_FLAG:
+            return
+        killers = self.killers.setdefault(len(self.moveLog), [None, None])
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        squares = self.history[self.board[move >> 3 & 7][move & 7]][endRow]
+        squares[endCol] += depth * depth
+        if squares[endCol] > HISTORY_LIMIT:
+            for table in self.history.values():
+                for row in table:
+                    for c in range(8):
+                        row[c] //= 2
+
+    '''
+    evaluatePosition of the position after each of moves, as a list. With a childEvaluator set they are all scored in
+    one batch, otherwise one at a time by childScore. No move gets made either way.
+    Static scores only, a child that is mate or stalemate isnt recognised
+    '''
+    def evaluateChildren(self, moves):
+        if self.childEvaluator is not None:
+            return self.childEvaluator(self, moves).tolist()
+        return [self.childScore(move) for move in moves]
+
+    '''
+    evaluatePosition of the position after move, worked out from the current scores and what the move changes
+    '''
+    def childScore(self, move):
+        board = self.board
+        startRow = move >> 3 & 7
+        startCol = move & 7
+        endRow = move >> 9 & 7
+        endCol = move >> 6 & 7
+        flags = move & FLAG_MASK
+        piece = board[startRow][startCol]
+        captured = board[endRow][endCol]
+        placed = piece[0] + PROMOTION_PIECES[flags >> 12 & 3] if flags & PROMOTION_FLAG else piece
+        score = (self.materialScore + self.positionScore + CASTLE_VALUE * (self.whiteKingCastle) - CASTLE_VALUE * (self.blackKingCastle) +
+                 MATERIAL[placed] - MATERIAL[piece] + POSITION_VALUES[placed][endRow][endCol] - POSITION_VALUES[piece][startRow][startCol] +
+                 self.childPawnScore(move))
+        if captured != "--":
+            score -= MATERIAL[captured] + POSITION_VALUES[captured][endRow][endCol]
+        elif flags == ENPASSANT_FLAG:
+            captured = board[startRow][endCol]
+            score -= MATERIAL[captured] + POSITION_VALUES[captured][startRow][endCol]
+        elif flags == CASTLE_FLAG:
+            rookFrom, rookTo = (endCol + 1, endCol - 1) if endCol > startCol else (endCol - 2, endCol + 1)
+            rook = board[startRow][rookFrom]
+            score += POSITION_VALUES[rook][startRow][rookTo] - POSITION_VALUES[rook][startRow][rookFrom]
+            score += CASTLE_VALUE if self.whiteToMove else -CASTLE_VALUE
+        return score
+
+    '''
+    The pawn structure term of the position after move, the pawn key and masks get worked out without making it
+    '''
+    def childPawnScore(self, move):
+        board = self.board
+        startRow = move >> 3 & 7
+        startCol = move & 7
+        endRow = move >> 9 & 7
+        endCol = move >> 6 & 7
+        piece = board[startRow][startCol]
+        captureRow = startRow if move & FLAG_MASK == ENPASSANT_FLAG else endRow
+        captured = board[captureRow][endCol]
+        if piece[1] != 'p' and captured[1] != 'p':
+            return self.pawnEntry(self.pawnKey, self.whitePawns, self.blackPawns)[0]
+        pawns = {'wp': self.whitePawns, 'bp': self.blackPawns}
+        key = self.pawnKey
+        changed = [(captured, captureRow, endCol)] if captured[1] == 'p' else []
+        if piece[1] == 'p':
+            changed.append((piece, startRow, startCol))
+            if not move & PROMOTION_FLAG:
+                changed.append((piece, endRow, endCol))
+        for pawn, r, c in changed:
+            key ^= ZOBRIST_PIECES[pawn][r][c]
+            pawns[pawn] ^= 1 << (r * 8 + c)
+        return self.pawnEntry(key, pawns['wp'], pawns['bp'])[0]
+
+    '''
+    pawnStructure of the pawn masks, from the pawn table when it has them
+    '''
+    def pawnEntry(self, pawnKey, whitePawns, blackPawns):
+        entry = self.pawnTable.probe(pawnKey)
+        if entry is None:
+            entry = pawnStructure(whitePawns, blackPawns)
+            self.pawnTable.store(pawnKey, entry)
+        return entry
+
+    '''
+    Masks of the white and the black passed pawns
+    '''
+    def passedPawns(self):
+        entry = self.pawnEntry(self.pawnKey, self.whitePawns, self.blackPawns)
+        return entry[1], entry[2]
+
+    def evaluatePosition1(self):
+        return 0
+    '''
+    Static evaluation from white's point of view. Material and piece square terms are kept up to date by makeMove and
+    undoMove, so this is constant time instead of a scan of the board and two move generations for mobility. The pawn
+    structure comes from the pawn table, and the whole score goes in the eval cache under the position key (plus who has
+    castled, the key doesnt know that), so the same leaf reached again is one lookup
+    '''
+    def evaluatePosition(self):
+        if self.whiteMate or self.blackMate: #a mate sooner in the game scores higher, so the search goes for the quickest one
+            mateScore = MATE_SCORE - len(self.moveLog)
+            return mateScore if self.blackMate else -mateScore
+        if self.staleMate:
+            return DRAW_SCORE
+        cache = self.evalCache
+        if cache is not None:
+            key = self.zobristLog[-1]
+            if self.whiteKingCastle:
+                key ^= ZOBRIST_CASTLED[0]
+            if self.blackKingCastle:
+                key ^= ZOBRIST_CASTLED[1]
+            index = key % cache.slotCount
+            entry = cache.slots[index] #probe and store by hand, the method calls would cost as much as the evaluation
+            cache.probes += 1
+            if entry is not None and entry[0] == key:
+                cache.hits += 1
+                return entry[1]
+        score = (self.materialScore + self.positionScore + CASTLE_VALUE * (self.whiteKingCastle) - CASTLE_VALUE * (self.blackKingCastle) +
+                 self.pawnEntry(self.pawnKey, self.whitePawns, self.blackPawns)[0])
+        if cache is not None:
+            cache.slots[index] = (key, score)
+        return score
+
+    '''
+    Picks the computer's move, returned as a move code. With a depth it searches to that fixed depth, with time_ms (time
+    left on the clock) and increment_ms it deepens until the time budget for this move runs out
+    '''
+    def computerMove(self, depth=4, time_ms=None, increment_ms=0): #looks at all possible moves, minimax's each one with depth-1(so depth makes sense), returns best move for each color
+        move = self.bookMove()
+        if move is not None:
+            return move
+        if time_ms is not None:
+            return self.timedSearch(time_ms, increment_ms)
+        return self.generateMove(depth)
 
+    '''
+    A move from the opening book for the current position, None without a book or once the game has left it.
+    The book is keyed by zobrist key, so it finds its positions at any move number and after transpositions
+    '''
+    def bookMove(self):
+        if self.openingBook is None:
+            return None
+        move = self.openingBook.chooseMove(self.zobristKey)
+        if move is not None and move in self.getValidMoves(): #guards against a key collision
+            return move
+        return None
 
+    '''
+    Splits the clock into a soft limit (dont start another iteration past it) and a hard limit (the search gets stopped).
+    Positions with lots of moves get more time, being in check or having few moves gets less
+    '''
+    def allocateTime(self, time_ms, increment_ms=0):
+        movesToGo = 30
+        base = time_ms / movesToGo + increment_ms * 0.75
+        moveCount = len(self.getValidMoves())
+        complexity = min(1.6, max(0.6, moveCount / 30))
+        if self.inCheck:
+            complexity *= 0.7
+        softLimit = base * complexity
+        hardLimit = min(softLimit * 3, time_ms * 0.5)
+        margin = min(50, time_ms * 0.1) #time for the move to actually get played
+        hardLimit = max(1, hardLimit - margin)
+        return min(softLimit, hardLimit) / 1000, hardLimit / 1000
 
+    '''
+    Timed search, works out the time budget from the clock and deepens until it is used up
+    '''
+    def timedSearch(self, time_ms, increment_ms=0, maxDepth=64, onProgress=None):
+        softLimit, hardLimit = self.allocateTime(time_ms, increment_ms)
+        return self.iterativeSearch(maxDepth, softLimit, hardLimit, onProgress)
 
-    def generateMove(self, depth):
-        #self.evaluations = 0  # variable that keeps track of each evaluation, mostly so I can debug alpha beta
-        moveMax = -100000
-        moveMin = 100000
+    '''
+    Iterative deepening, searches depth 1, 2, 3... with the best move of each iteration searched first in the next one.
+    Stops at the hard limit (seconds) or when stopSearch gets set, in the middle of an iteration if it has to, and returns
+    the best move of the deepest finished one. onProgress gets a dict of depth, move, score, nodes and seconds after
+    every finished iteration, and the principal variation under 'pv'
+    '''
+    def iterativeSearch(self, maxDepth=64, softLimit=None, hardLimit=None, onProgress=None):
+        if self.searchStats is None:
+            return self.deepen(maxDepth, softLimit, hardLimit, onProgress)
+        self.searchStats.searchStarted(self)
+        try:
+            return self.deepen(maxDepth, softLimit, hardLimit, onProgress)
+        finally:
+            self.searchStats.searchFinished(self)
+
+    def deepen(self, maxDepth, softLimit, hardLimit, onProgress):
+        start = time.perf_counter()
+        startNodes = self.nodes
         moves = self.getValidMoves()
-        #print(moves)
-        bestWhite = (random.choice(moves))
-        bestBlack = (random.choice(moves))
-        for i in range(len(moves)):
-            self.makeMove(moves[i])
-            moveValue = self.minMax(depth - 1, -100000, 100000)
-            if moveValue >= moveMax:
-                moveMax = moveValue
-                bestWhite = moves[i]
-            elif moveValue <= moveMin:
-                moveMin = moveValue
-                bestBlack = moves[i]
+        if moves == []:
+            return None
+        if len(moves) == 1 and softLimit is not None: #nothing to think about
+            return moves[0]
+        rootPly = len(self.moveLog)
+        bestMove = None
+        self.transpositionTable.newSearch() #once for the whole search, entries from the last iteration arent stale
+        for depth in range(1, maxDepth + 1):
+            if hardLimit is not None and depth > 1: #always finish depth 1 so there is a move
+                self.searchDeadline = start + hardLimit
+            try:
+                move = self.generateMove(depth, bestMove, False)
+            except SearchTimeout:
+                while len(self.moveLog) > rootPly: #put the board back the way the search found it
+                    if self.moveLog[-1] == NULL_MOVE:
+                        self.undoNullMove()
+                    else:
+                        self.undoMove()
+                self.whiteMate = False
+                self.blackMate = False
+                self.staleMate = False
+                break
+            finally:
+                self.searchDeadline = None
+            if move is None:
+                break
+            if softLimit is not None and bestMove is not None and move != bestMove: #best move changed, the position is trickier than it looked
+                softLimit = min(hardLimit, softLimit * 1.3)
+            bestMove = move
+            self.lastSearchDepth = depth
+            elapsed = time.perf_counter() - start
+            if onProgress is not None:
+                onProgress({'depth': depth, 'move': move, 'score': self.lastSearchScore, 'nodes': self.nodes - startNodes,
+                            'seconds': elapsed, 'pv': self.principalVariation(depth)})
+            if softLimit is not None and elapsed >= softLimit * 0.5: #the next iteration takes a few times longer, it wont finish
+                break
+        if bestMove is None: #stopped before depth 1 finished
+            bestMove = moves[0]
+        return bestMove
+
+    '''
+    The line the search expects, read back out of the transposition table by following the best move stored for each
+    position. Stops at a missing or illegal move or when the line comes back to a position already in it
+    '''
+    def principalVariation(self, maxLength=64):
+        line = []
+        seen = set()
+        while len(line) < maxLength:
+            key = self.zobristKey
+            entry = self.transpositionTable.probe(key)
+            if entry is None or entry[4] is None or key in seen or entry[4] not in self.getValidMoves():
+                break
+            seen.add(key)
+            line.append(entry[4])
+            self.makeMove(entry[4])
+        for move in line:
             self.undoMove()
-        if not self.whiteMate and not self.blackMate and not self.staleMate:
-            if self.whiteToMove:
-                print(moveMax)
-                return bestWhite
-            else:
-                print(moveMin)
-                return bestBlack
+        self.whiteMate = False #the line can end in a mate, the flags belong to that position not this one
+        self.blackMate = False
+        self.staleMate = False
+        return line
 
+    '''
+    A copy of the game that can be searched on its own, for example in another thread. The transposition table, pawn
+    table, eval cache, killer and history tables are shared, not copied, and so are the opening book, bitbases and
+    search pool
+    '''
+    def clone(self):
+        other = object.__new__(type(self)) #not copy.copy, that goes through __getstate__ and would leave the tables behind
+        other.__dict__.update(self.__dict__)
+        other.board = [row[:] for row in self.board]
+        other.bindMoveFunctions()
+        other.moveLog = self.moveLog[:]
+        other.capturedLog = self.capturedLog[:]
+        other.pins = self.pins[:]
+        other.checks = self.checks[:]
+        other.enpassantPossibleLog = self.enpassantPossibleLog[:]
+        other.currentCastlingRight = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
+                                                  self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
+        other.castleRightsLog = self.castleRightsLog[:] #log entries are never changed in place, sharing them is fine
+        other.zobristLog = self.zobristLog[:]
+        other.halfmoveLog = self.halfmoveLog[:]
+        other.scoreLog = self.scoreLog[:]
+        other.stopSearch = False
+        for name in [name for name in other.__dict__ if hasattr(type(self), name)]: #wrappers a measured search puts on methods
+            del other.__dict__[name]
+        return other
 
+    '''
+    Searches every root move to depth and returns the best one for the side to move, firstMove gets searched first.
+    A new search ages the transposition table entries, the iterations of iterativeSearch are all one search and pass
+    newSearch=False
+    '''
+    def generateMove(self, depth, firstMove=None, newSearch=True):
+        if newSearch:
+            self.transpositionTable.newSearch()
+        if self.searchStats is None:
+            return self.searchRoot(depth, firstMove)
+        self.searchStats.searchStarted(self)
+        try:
+            move = self.searchRoot(depth, firstMove)
+            self.searchStats.iterationFinished(self, depth, move)
+            return move
+        finally:
+            self.searchStats.searchFinished(self)
+
+    def searchRoot(self, depth, firstMove=None):
+        sign = 1 if self.whiteToMove else -1 #the search scores from the side to move, lastSearchScore from white
+        key = self.zobristKey
+        entry = self.transpositionTable.probe(key)
+        moves = self.orderMoves(self.getValidMoves(), entry[4] if entry is not None else None)
+        if firstMove is not None and firstMove in moves: #best move from the last iteration goes first
+            moves.remove(firstMove)
+            moves.insert(0, firstMove)
+        #already searched this deep, no need to do it again. Not when the position came up before, the stored move
+        #could walk straight back into the repetition
+        if entry is not None and entry[1] >= depth and entry[3] == EXACT and moves[0] == entry[4] and not self.repetitionCount():
+            self.lastSearchScore = sign * scoreFromTable(entry[2], len(self.moveLog))
+            return moves[0]
+        if self.searchPool is not None:
+            alpha, bestMove = self.searchRootParallel(moves, depth)
+        else:
+            #alpha carries over from move to move, after the first move the rest only have to show they are better
+            alpha = -INFINITE_SCORE
+            bestMove = moves[0]
+            for i in range(len(moves)):
+                self.makeMove(moves[i])
+                if i == 0:
+                    score = -self.negamax(depth - 1, -INFINITE_SCORE, -alpha)
+                else:
+                    score = -self.negamax(depth - 1, -alpha - 1, -alpha)
+                    if score > alpha:
+                        score = -self.negamax(depth - 1, -INFINITE_SCORE, -alpha)
+                self.undoMove()
+                if score > alpha:
+                    alpha = score
+                    bestMove = moves[i]
+        self.transpositionTable.store(key, depth, scoreToTable(alpha, len(self.moveLog)), EXACT, bestMove)
+        self.lastSearchScore = sign * alpha
+        return bestMove
 
+    '''
+    The root search split over the searchPool. The first move gets searched here on the full window, then the other
+    moves all go to the workers at once on a zero window around its score, and the ones that beat it go out again with
+    the window open above it. Returns the score and the best move
+    '''
+    def searchRootParallel(self, moves, depth):
+        self.makeMove(moves[0])
+        alpha = -self.negamax(depth - 1, -INFINITE_SCORE, INFINITE_SCORE)
+        self.undoMove()
+        bestMove = moves[0]
+        scores = self.searchPool.searchRootMoves(self, moves[1:], depth, alpha, alpha + 1)
+        better = [move for move, score in zip(moves[1:], scores) if score > alpha]
+        if better != []:
+            scores = self.searchPool.searchRootMoves(self, better, depth, alpha, INFINITE_SCORE)
+            for move, score in zip(better, scores):
+                if score > alpha:
+                    alpha = score
+                    bestMove = move
+        return alpha, bestMove
 
 
+'''
+A move as the GUI and notation see it. The engine itself works on the int codes above, Move.fromCode turns one into this.
+Slots keep the objects small since ChessMain makes one for every legal move after each turn
+'''
 class Move():
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'promotionChoice', 'isEnpassantMove', 'isCastleMove', 'moveID', 'code')
     # maps keys to values, key : value
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v: k for k, v in ranksToRows.items()}
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
-    moveEvals = {'p': 7, 'N': 5, 'B': 5, 'Q': 6, 'R': 4,
-                      'K': 6, '-': 0}  # sorting values, should help with efficiency, focused on midgame, might figure out how to switch these values for endgame later
-    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False):
+    promotionIDs = {'Q': 0, 'R': 1, 'B': 2, 'N': 3} #added to the moveID in the ten thousands, so queening keeps the plain id
+    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False, promotionChoice='Q'):
         self.startRow = startSq[0]
         self.startCol = startSq[1]
         self.endRow = endSq[0]
         self.endCol = endSq[1]
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveValue = self.moveEvals[self.pieceMoved[1]] + 4*(self.pieceCaptured != '--') #sets move value to the evals above, and if a piece is captured, value goes up
         #pawn promotion
         self.isPawnPromotion = ((self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7))
+        self.promotionChoice = promotionChoice
         #enpassant
         self.isEnpassantMove = isEnpassantMove
         if self.isEnpassantMove:
@@ -751,17 +2070,44 @@ class Move():
         self.isCastleMove = isCastleMove
 
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        self.code = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.isPawnPromotion:
+            self.moveID += self.promotionIDs[promotionChoice] * 10000
+            self.code |= PROMOTION_FLAGS[self.promotionIDs[promotionChoice]]
+        elif isEnpassantMove:
+            self.code |= ENPASSANT_FLAG
+        elif isCastleMove:
+            self.code |= CASTLE_FLAG
+
     '''
-    Overriding the equals method
+    Builds the Move for a move code, board is the position before the move is made
+    '''
+    @classmethod
+    def fromCode(cls, code, board):
+        start = code & 63
+        end = code >> 6 & 63
+        flags = code & FLAG_MASK
+        promotionChoice = PROMOTION_PIECES[code >> 12 & 3] if flags & PROMOTION_FLAG else 'Q'
+        return cls((start >> 3, start & 7), (end >> 3, end & 7), board, isEnpassantMove=flags == ENPASSANT_FLAG,
+                   isCastleMove=flags == CASTLE_FLAG, promotionChoice=promotionChoice)
+
+    '''
+    Overriding the equals method. Compares start, end and promotion piece only, so a move made from two clicks matches
+    the generated castle or en passant move. Move codes compare the same way
     '''
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
+        if isinstance(other, int):
+            return self.moveID == legacyMoveID(other)
         return False
 
     def getChessNotation(self):
-        #pseudo chess notation
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        #pseudo chess notation, promotions get the piece on the end like e7e8q
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionChoice.lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
@@ -777,6 +2123,12 @@ class CastleRights():
         self.wqs = wqs
         self.bqs = bqs
 
+    '''
+    Packs the four rights into a number from 0 to 15, used for the zobrist castling keys
+    '''
+    def index(self):
+        return self.wks | self.bks << 1 | self.wqs << 2 | self.bqs << 3
+
 
 #psuedo code for computer
 
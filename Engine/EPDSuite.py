@@ -0,0 +1,128 @@
+# Test suite runner, searches every position of an EPD file and checks the move against its bm (best move) or am
+# (avoid move) operation. Positions are spread over a pool of worker processes, so a suite of a few hundred positions
+# gives a quick solve rate, time to solution and nodes per second for comparing search changes.
+# Run from the project folder: python -m Engine.EPDSuite [file.epd] [--depth N | --movetime ms] [--workers N] [--json]
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from Engine.ChessEngine import GameState, moveNotation, parseMove
+
+SUITE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suites')
+DEFAULT_SUITE = os.path.join(SUITE_FOLDER, 'tactics.epd')
+DEFAULT_MOVETIME = 1000
+
+
+'''
+The positions of an EPD file as (line number, EPD) pairs, skipping blank lines and # comments
+'''
+def readSuite(path):
+    with open(path) as f:
+        return [(number + 1, line.strip()) for number, line in enumerate(f) if line.strip() and not line.lstrip().startswith('#')]
+
+
+'''
+Runs in a worker process. Searches one EPD position to a fixed depth or for movetime milliseconds and returns a result
+dict. solvedAt is the time of the iteration from which the best move stayed right, None if it didnt end up right
+'''
+def solvePosition(epd, depth=None, movetime=None, hashSizeMB=16):
+    gs = GameState(hashSizeMB=hashSizeMB)
+    operations = gs.loadEPD(epd)
+    moves = gs.getValidMoves()
+    best = [parseMove(gs, token, moves) for token in operations.get('bm', [])]
+    avoid = [parseMove(gs, token, moves) for token in operations.get('am', [])]
+    result = {'id': " ".join(operations.get('id', [])) or " ".join(epd.split()[:4]),
+              'bm': operations.get('bm', []), 'am': operations.get('am', [])}
+    if (not best and not avoid) or None in best or None in avoid:
+        result['error'] = "no bm or am operation, or one of its moves isnt legal here"
+        return result
+    iterations = []
+    limit = movetime / 1000 if movetime is not None else None
+    start = time.perf_counter()
+    move = gs.iterativeSearch(depth or 64, limit, limit, iterations.append)
+    seconds = time.perf_counter() - start
+
+    def correct(move):
+        return (not best or move in best) and move not in avoid
+
+    solvedAt = None
+    for info in iterations:
+        if not correct(info['move']):
+            solvedAt = None
+        elif solvedAt is None:
+            solvedAt = info['seconds']
+    solved = correct(move) #a forced move is played without searching, so it can be solved with no iterations
+    nodes = iterations[-1]['nodes'] if iterations else 0
+    result.update({'move': moveNotation(move) if move is not None else None, 'solved': solved,
+                   'solvedAt': (solvedAt or 0.0) if solved else None, 'seconds': seconds, 'nodes': nodes,
+                   'depth': iterations[-1]['depth'] if iterations else 0})
+    return result
+
+
+'''
+Solves every position in the suite file, workers at a time. Returns the result dicts in file order and the wall time
+'''
+def runSuite(path=DEFAULT_SUITE, depth=None, movetime=None, workers=None, hashSizeMB=16):
+    positions = readSuite(path)
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(solvePosition, epd, depth, movetime, hashSizeMB) for number, epd in positions]
+        results = [future.result() for future in futures]
+    for (number, epd), result in zip(positions, results):
+        result['line'] = number
+    return results, time.perf_counter() - start
+
+
+'''
+Solve rate, average time to solution over the solved positions, and nodes per second of the search time summed over
+every worker
+'''
+def summarize(results, wallSeconds):
+    searched = [r for r in results if 'error' not in r]
+    solved = [r for r in searched if r['solved']]
+    nodes = sum(r['nodes'] for r in searched)
+    searchSeconds = sum(r['seconds'] for r in searched)
+    return {'positions': len(results), 'searched': len(searched), 'solved': len(solved),
+            'solveRate': len(solved) / len(searched) if searched else 0.0,
+            'timeToSolution': sum(r['solvedAt'] for r in solved) / len(solved) if solved else None,
+            'nodes': nodes, 'nps': nodes / searchSeconds if searchSeconds > 0 else 0.0, 'wallSeconds': wallSeconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve an EPD test suite with bm/am operations")
+    parser.add_argument('suite', nargs='?', default=DEFAULT_SUITE)
+    limits = parser.add_mutually_exclusive_group()
+    limits.add_argument('--depth', type=int, default=None, help="search every position to this depth")
+    limits.add_argument('--movetime', type=int, default=None,
+                        help="milliseconds per position (the default, " + str(DEFAULT_MOVETIME) + ")")
+    parser.add_argument('--workers', type=int, default=None, help="processes to solve positions in, all cores by default")
+    parser.add_argument('--hash', type=int, default=16, help="transposition table size per position in MB")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None:
+        args.movetime = DEFAULT_MOVETIME
+
+    results, wallSeconds = runSuite(args.suite, args.depth, args.movetime, args.workers, args.hash)
+    summary = summarize(results, wallSeconds)
+    if args.json:
+        print(json.dumps({'suite': args.suite, 'depth': args.depth, 'movetime': args.movetime, 'results': results,
+                          'summary': summary}, indent=2))
+    else:
+        for r in results:
+            if 'error' in r:
+                print("{:<24} {}".format(r['id'][:24], r['error']))
+                continue
+            expected = ("bm " + " ".join(r['bm']) + " " if r['bm'] else "") + ("am " + " ".join(r['am']) if r['am'] else "")
+            print("{:<24} {:<18} played {:<6} depth {:>2} {:>8} nodes  {}".format(
+                r['id'][:24], expected.strip(), r['move'], r['depth'], r['nodes'],
+                "solved in " + str(round(r['solvedAt'], 3)) + "s" if r['solved'] else "FAILED"))
+        print("solved", summary['solved'], "of", summary['searched'], "({:.0f}%)".format(100 * summary['solveRate']),
+              " time to solution", "-" if summary['timeToSolution'] is None else str(round(summary['timeToSolution'], 3)) + "s",
+              " {:.0f} nps".format(summary['nps']), " wall time", round(wallSeconds, 2), "s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Fixed size caches for the evaluation, one slot per index and a new entry overwrites whatever was in its slot.
+# GameState keeps two: the pawn table, pawn structure by the zobrist key of the pawns alone (the pawns change on few
+# moves, so nearly every lookup hits), and the eval cache, whole static evaluations by position key, so a leaf the
+# search reaches again through another move order doesnt get evaluated again.
+
+'''
+Rough size of one stored entry in bytes (the tuple, the 64 bit key, the value and the slot in the list), turns a size
+in MB into a slot count the same way the transposition table does
+'''
+ENTRY_BYTES = 120
+
+
+class EvalCache():
+    def __init__(self, sizeMB=1):
+        self.resize(sizeMB)
+
+    '''
+    Throws away everything stored and makes a cache of the new size
+    '''
+    def resize(self, sizeMB):
+        self.sizeMB = sizeMB
+        self.slotCount = max(1, int(sizeMB * 1024 * 1024) // ENTRY_BYTES)
+        self.slots = [None] * self.slotCount #(key, value) tuples
+        self.resetStats()
+
+    def clear(self):
+        self.resize(self.sizeMB)
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+
+    '''
+    The value stored for the key, or None
+    '''
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key % self.slotCount]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def store(self, key, value):
+        self.slots[key % self.slotCount] = (key, value)
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {'sizeMB': self.sizeMB, 'slots': self.slotCount, 'probes': self.probes, 'hits': self.hits,
+                'hitRate': self.hitRate()}
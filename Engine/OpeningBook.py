@@ -0,0 +1,193 @@
+# Binary opening book, laid out like a polyglot book: fixed size records sorted by position key, so a lookup is a binary
+# search straight over the memory mapped file. Keys are our own zobrist keys (not polyglot's), so a book has to be built
+# with this engine. Give a GameState one with gs.openingBook = OpeningBook() and computerMove plays from it whenever the
+# position is in the book, at any point in the game.
+# Build one from PGN files or plain move lists: python -m Engine.OpeningBook build openings.txt -o book.bin
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+from Engine.ChessEngine import GameState, moveNotation, parseMove
+
+'''
+One record: position key, move code, weight, and 4 spare bytes (polyglot keeps learning data there), 16 bytes big endian
+'''
+RECORD = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+RECORD_SIZE = RECORD.size
+MAX_WEIGHT = 65535
+
+BOOK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BOOK = os.path.join(BOOK_FOLDER, 'book.bin')
+DEFAULT_LINES = os.path.join(BOOK_FOLDER, 'openings.txt')
+
+
+class OpeningBook():
+    def __init__(self, path=DEFAULT_BOOK, seed=None):
+        self.path = path
+        self.random = random.Random(seed)
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD_SIZE != 0:
+            self.file.close()
+            raise ValueError(path + " is not an opening book, its size isnt a multiple of " + str(RECORD_SIZE))
+        self.count = size // RECORD_SIZE
+        #an empty file cant be mapped, an empty bytes object reads the same way
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+
+    def __len__(self):
+        return self.count
+
+    '''
+    Index of the first record with this key, or where it would go if there isnt one
+    '''
+    def firstEntry(self, key):
+        data = self.data
+        low = 0
+        high = self.count
+        while low < high:
+            mid = (low + high) >> 1
+            if KEY.unpack_from(data, mid * RECORD_SIZE)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    '''
+    All (move code, weight) pairs stored for a position key, heaviest first
+    '''
+    def probe(self, key):
+        entries = []
+        i = self.firstEntry(key)
+        while i < self.count:
+            entryKey, move, weight, learn = RECORD.unpack_from(self.data, i * RECORD_SIZE)
+            if entryKey != key:
+                break
+            entries.append((move, weight))
+            i += 1
+        return entries
+
+    '''
+    Picks one of the position's book moves at random, each with a chance proportional to its weight. None when the
+    position isnt in the book. Walks the records in place twice (sum the weights, then find the pick) instead of
+    building a list, this gets called on every computer move
+    '''
+    def chooseMove(self, key):
+        data = self.data
+        first = self.firstEntry(key)
+        end = first
+        total = 0
+        while end < self.count:
+            entryKey, move, weight, learn = RECORD.unpack_from(data, end * RECORD_SIZE)
+            if entryKey != key:
+                break
+            total += weight
+            end += 1
+        if total == 0:
+            return None
+        pick = self.random.randrange(total)
+        for i in range(first, end):
+            entryKey, move, weight, learn = RECORD.unpack_from(data, i * RECORD_SIZE)
+            if pick < weight:
+                return move
+            pick -= weight
+        return None
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+The games in a file as lists of move tokens. A PGN file (anything with [tag] lines or a .pgn name) gets its tags,
+comments, variations, move numbers and results stripped, any other file is one game per line with # comments
+'''
+def readGames(path):
+    with open(path) as f:
+        text = f.read()
+    if path.lower().endswith('.pgn') or re.search(r'^\s*\[', text, re.MULTILINE):
+        games = []
+        for game in re.split(r'\n\s*\n(?=\s*\[)', text):
+            game = re.sub(r'^\s*\[.*$', '', game, flags=re.MULTILINE) #tags
+            game = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', game) #comments
+            while re.search(r'\([^()]*\)', game): #variations, innermost first
+                game = re.sub(r'\([^()]*\)', ' ', game)
+            tokens = [token for token in game.split() if not re.fullmatch(r'\d+\.+|\$\d+|1-0|0-1|1/2-1/2|\*', token)]
+            tokens = [re.sub(r'^\d+\.+', '', token) for token in tokens] #move numbers stuck to the move, like 1.e4
+            if tokens:
+                games.append(tokens)
+        return games
+    games = []
+    for line in text.splitlines():
+        line = line.split('#')[0].split()
+        if line:
+            games.append(line)
+    return games
+
+
+'''
+Plays through every game and counts how often each move was played from each position, up to maxPly half moves in.
+Moves seen fewer than minCount times are dropped. Writes the records sorted by key (heaviest move first within a key)
+and returns how many were written
+'''
+def buildBook(paths, outPath, maxPly=24, minCount=1):
+    counts = {}
+    for path in paths:
+        for number, game in enumerate(readGames(path)):
+            gs = GameState(hashSizeMB=0)
+            for token in game[:maxPly]:
+                move = parseMove(gs, token, gs.getValidMoves())
+                if move is None:
+                    print(path + ": game " + str(number + 1) + ", cant play " + token + ", skipping the rest", file=sys.stderr)
+                    break
+                entry = (gs.zobristKey, move)
+                counts[entry] = counts.get(entry, 0) + 1
+                gs.makeMove(move)
+    records = sorted(((key, move, min(count, MAX_WEIGHT)) for (key, move), count in counts.items() if count >= minCount),
+                     key=lambda record: (record[0], -record[2], record[1]))
+    with open(outPath, 'wb') as f:
+        for key, move, weight in records:
+            f.write(RECORD.pack(key, move, weight, 0))
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or look into a binary opening book")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="compile PGN or move list files into a book")
+    build.add_argument('files', nargs='*', default=[DEFAULT_LINES])
+    build.add_argument('-o', '--output', default=DEFAULT_BOOK)
+    build.add_argument('--max-ply', type=int, default=24, help="only book this many half moves of each game")
+    build.add_argument('--min-count', type=int, default=1, help="leave out moves played fewer times than this")
+    probe = commands.add_parser('probe', help="list the book moves for a position")
+    probe.add_argument('--book', default=DEFAULT_BOOK)
+    probe.add_argument('--fen', default=None, help="position to look up, the starting position if not given")
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        count = buildBook(args.files, args.output, args.max_ply, args.min_count)
+        print("wrote " + str(count) + " entries to " + args.output)
+    else:
+        gs = GameState(hashSizeMB=0)
+        if args.fen is not None:
+            gs.loadFEN(args.fen)
+        with OpeningBook(args.book) as book:
+            entries = book.probe(gs.zobristKey)
+            total = sum(weight for move, weight in entries)
+            for move, weight in entries:
+                print(moveNotation(move) + "  " + str(weight) + "  " + str(round(100 * weight / total, 1)) + "%")
+            if not entries:
+                print("position not in the book")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# Root parallel search over a pool of worker processes. Threads cant run the search on more than one core because of
+# the GIL, so generateMove hands its root moves to this pool instead (set gs.searchPool = ParallelSearch(...)).
+# The first root move is searched at home, then every other move is its own task, all searched at once on the same
+# window around the first move's score (see GameState.searchRootParallel).
+# The position goes to the workers as a snapshot (see GameState.snapshot, about a hundred bytes), which each worker
+# loads into a GameState of its own. That game keeps its transposition table, pawn table, eval cache, killers and
+# history between tasks, so later moves and later iterations still get hash hits. The game's settings the search needs
+# (backend, bitbases, childEvaluator) go along pickled, a worker only unpickles them again when they change.
+import concurrent.futures
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from Engine import ChessEngine
+from Engine.ChessEngine import SearchTimeout, scoreToTable, scoreFromTable
+
+'''
+Per process state of a worker, set up once by initWorker. workerState is the game the tasks load their snapshots into,
+workerSettings the pickled settings it was last set up with
+'''
+workerHashSizeMB = None
+workerStopEvent = None
+workerState = None
+workerSettings = None
+
+
+def initWorker(hashSizeMB, stopEvent):
+    global workerHashSizeMB, workerStopEvent
+    workerHashSizeMB = hashSizeMB
+    workerStopEvent = stopEvent
+
+
+'''
+Sets the worker's game up with the pickled (class, bitbases, childEvaluator) of the game being searched. A new class
+means a new game, otherwise the game and its tables are kept
+'''
+def applySettings(settings):
+    global workerState, workerSettings
+    if settings == workerSettings:
+        return
+    cls, bitbases, childEvaluator = pickle.loads(settings)
+    if type(workerState) is not cls:
+        workerState = cls(workerHashSizeMB)
+        workerState.stopEvent = workerStopEvent
+    if workerState.bitbases is not None:
+        workerState.bitbases.close()
+    workerState.bitbases = bitbases
+    workerState.childEvaluator = childEvaluator
+    workerSettings = settings
+
+
+'''
+Runs in a worker process. Searches one root move (a move code) of the position in snapshot to depth - 1 on the window
+(alpha, beta) and returns (score, nodes), the score is from the root side's point of view, None if the search was
+stopped or ran out of time. The worker's move log starts at the snapshot, rootPly moves into the game, so mate scores
+get shifted by rootPly on the way in and out the same way the transposition table shifts them
+'''
+def searchRootMove(snapshot, settings, move, depth, timeLeft, age, alpha, beta, rootPly):
+    applySettings(settings)
+    gs = workerState
+    gs.loadSnapshot(snapshot)
+    gs.transpositionTable.age = age #the home table's age, so the worker's entries age once per search like it does
+    gs.searchDeadline = time.perf_counter() + timeLeft if timeLeft is not None else None
+    startNodes = gs.nodes
+    gs.makeMove(move)
+    try:
+        score = -gs.negamax(depth - 1, -scoreToTable(beta, rootPly), -scoreToTable(alpha, rootPly))
+    except SearchTimeout:
+        return None, gs.nodes - startNodes
+    return scoreFromTable(score, rootPly), gs.nodes - startNodes
+
+
+class ParallelSearch():
+    def __init__(self, workers=None, hashSizeMB=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.hashSizeMB = hashSizeMB
+        self.stopEvent = multiprocessing.Event()
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=initWorker,
+                                                               initargs=(hashSizeMB, self.stopEvent))
+
+    '''
+    Searches every move of gs to depth - 1 on the window (alpha, beta) in the worker processes and returns their scores,
+    in the same order as moves. Watches gs.stopSearch and gs.searchDeadline while it waits and raises SearchTimeout like
+    the search would
+    '''
+    def searchRootMoves(self, gs, moves, depth, alpha, beta):
+        self.stopEvent.clear()
+        snapshot = gs.snapshot()
+        settings = pickle.dumps((type(gs), gs.bitbases, gs.childEvaluator), pickle.HIGHEST_PROTOCOL)
+        timeLeft = None if gs.searchDeadline is None else gs.searchDeadline - time.perf_counter()
+        futures = [self.executor.submit(searchRootMove, snapshot, settings, move, depth, timeLeft, gs.transpositionTable.age,
+                                        alpha, beta, len(gs.moveLog))
+                   for move in moves]
+        pending = futures
+        stopped = False
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=0.01)
+            if not stopped and pending and gs.searchStopped():
+                stopped = True
+                self.stopEvent.set() #running tasks stop at their next node check, waiting ones never start
+                for future in pending:
+                    future.cancel()
+        scores = []
+        for future in futures:
+            if future.cancelled():
+                scores.append(None)
+            else:
+                score, nodes = future.result()
+                gs.nodes += nodes
+                scores.append(score)
+        if None in scores:
+            raise SearchTimeout()
+        return scores
+
+    '''
+    Shuts the worker processes down, the pool cant be used after this
+    '''
+    def close(self):
+        self.stopEvent.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+'''
+(FEN, moves played first, root move). Mates the workers have to score the same as the search at home, also after some
+moves have been played so the game ply isnt 0
+'''
+MATE_CHECKS = [
+    ("7k/6pp/8/1n6/8/8/6PP/R5K1 w - - 0 1", [], "a1a8"),
+    ("7k/6pp/8/1n6/8/8/6PP/R5K1 w - - 0 1", ["g1f1", "b5d4", "f1e1", "d4b5", "e1f1", "b5d4", "f1g1", "d4b5"], "a1a8"),
+    ("6k1/5ppp/8/8/8/8/q4PPP/3R2K1 w - - 0 1", ["g1h1", "a2a1", "h1g1", "a1a2"], "d1d8"),
+]
+
+
+'''
+Searches the root move of every MATE_CHECKS position at home and in the pool and returns one result dict each, passed
+when the scores match. Run it with: python -m Engine.ParallelSearch
+'''
+def checkMateScores(depth=3, workers=2):
+    results = []
+    with ParallelSearch(workers, hashSizeMB=1) as pool:
+        for fen, played, rootMove in MATE_CHECKS:
+            gs = ChessEngine.GameState(hashSizeMB=1)
+            gs.loadFEN(fen)
+            for name in played:
+                gs.makeMove(next(move for move in gs.getValidMoves() if ChessEngine.moveNotation(move) == name))
+            move = next(move for move in gs.getValidMoves() if ChessEngine.moveNotation(move) == rootMove)
+            gs.makeMove(move)
+            home = -gs.negamax(depth - 1, -ChessEngine.INFINITE_SCORE, ChessEngine.INFINITE_SCORE)
+            gs.undoMove()
+            worker = pool.searchRootMoves(gs, [move], depth, -ChessEngine.INFINITE_SCORE, ChessEngine.INFINITE_SCORE)[0]
+            results.append({'fen': fen, 'ply': len(played), 'move': rootMove, 'home': home, 'worker': worker,
+                            'passed': home == worker})
+    return results
+
+
+def main():
+    results = checkMateScores()
+    for r in results:
+        print("{:<40} ply {:>2} {}  home {:>6}  worker {:>6}  {}".format(
+            r['fen'], r['ply'], r['move'], r['home'], r['worker'], 'ok' if r['passed'] else 'DIFFERENT'))
+    failed = [r for r in results if not r['passed']]
+    print(len(results) - len(failed), "of", len(results), "the same")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+# Perft suite, counts the move tree of well known positions and checks them against the published node counts.
+# Catches move generator bugs and doubles as a speed benchmark for getValidMoves/makeMove/undoMove.
+# Run from the project folder: python -m Engine.Perft [--depth N] [--max-nodes N] [--backend bitboard] [--json]
+# --compare walks the same trees on both backends and checks they give the same legal moves in every position.
+import argparse
+import json
+import sys
+import time
+from Engine import ChessEngine, BitboardEngine
+
+'''
+(name, FEN, {depth: nodes}). The first six are the chessprogramming wiki positions, the rest are the
+en passant, castling and promotion edge cases that trip up most move generators
+'''
+POSITIONS = [
+    ("initial", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    ("illegal en passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1134888}),
+    ("illegal en passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {6: 1015133}),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1440467}),
+    ("short castle gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    ("long castle gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    ("castle rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {6: 3821001}),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {5: 1004658}),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {6: 217342}),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {6: 92683}),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {6: 2217}),
+    ("stalemate and checkmate 1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {7: 567584}),
+    ("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+]
+
+BACKENDS = {'mailbox': ChessEngine.GameState, 'bitboard': BitboardEngine.BitboardGameState}
+
+
+'''
+Runs every position at every known depth up to maxDepth whose node count is at most maxNodes.
+Returns one result dict per run
+'''
+def runSuite(backend='mailbox', maxDepth=None, maxNodes=200000, names=None):
+    results = []
+    for name, fen, counts in POSITIONS:
+        if names is not None and name not in names:
+            continue
+        for depth in sorted(counts):
+            if (maxDepth is not None and depth > maxDepth) or (maxNodes is not None and counts[depth] > maxNodes):
+                continue
+            gs = BACKENDS[backend](hashSizeMB=0)
+            gs.loadFEN(fen)
+            start = time.perf_counter()
+            nodes = gs.perft(depth)
+            seconds = time.perf_counter() - start
+            results.append({'name': name, 'fen': fen, 'depth': depth, 'nodes': nodes, 'expected': counts[depth],
+                            'passed': nodes == counts[depth], 'seconds': seconds,
+                            'nps': nodes / seconds if seconds > 0 else 0.0, 'backend': backend})
+    return results
+
+
+'''
+Walks the tree of every position on the 2d board and the bitboards together, to the deepest known depth up to maxDepth
+whose node count is at most maxNodes, and checks both backends give the same legal moves everywhere on the way.
+Returns one result dict per position, difference is None or what BitboardEngine.compareMoveLists found
+'''
+def compareSuite(maxDepth=None, maxNodes=200000, names=None):
+    results = []
+    for name, fen, counts in POSITIONS:
+        if names is not None and name not in names:
+            continue
+        depths = [depth for depth in counts if (maxDepth is None or depth <= maxDepth) and (maxNodes is None or counts[depth] <= maxNodes)]
+        if depths == []:
+            continue
+        results.append(compareFEN(fen, max(depths), name))
+    return results
+
+
+def compareFEN(fen, depth, name=None):
+    mailboxState = ChessEngine.GameState(hashSizeMB=0)
+    mailboxState.loadFEN(fen)
+    bitboardState = BitboardEngine.BitboardGameState(hashSizeMB=0)
+    bitboardState.loadFEN(fen)
+    start = time.perf_counter()
+    difference = BitboardEngine.compareMoveLists(mailboxState, bitboardState, depth)
+    return {'name': name or fen, 'fen': fen, 'depth': depth, 'passed': difference is None,
+            'difference': None if difference is None else {'path': list(difference[0]), 'mailboxOnly': difference[1],
+                                                           'bitboardOnly': difference[2]},
+            'seconds': time.perf_counter() - start}
+
+
+def printComparison(results, asJSON):
+    failed = [r for r in results if not r['passed']]
+    if asJSON:
+        print(json.dumps({'results': results, 'failed': len(failed)}, indent=2))
+        return
+    for r in results:
+        line = "{:<28} depth {} {:>6.2f}s  ".format(r['name'], r['depth'], r['seconds'])
+        if r['passed']:
+            print(line + "same moves")
+        else:
+            d = r['difference']
+            print(line + "DIFFERENT after " + (" ".join(d['path']) or "no moves") + ": only 2d board " + str(d['mailboxOnly']) +
+                  ", only bitboards " + str(d['bitboardOnly']))
+    print(len(results) - len(failed), "of", len(results), "the same on both backends")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft correctness and speed suite")
+    parser.add_argument('--depth', type=int, default=None, help="highest depth to run")
+    parser.add_argument('--max-nodes', type=int, default=200000, help="skip runs with more nodes than this (0 for no limit)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='mailbox')
+    parser.add_argument('--position', action='append', help="only run the named position, can be given more than once")
+    parser.add_argument('--fen', help="run perft on this position instead of the suite")
+    parser.add_argument('--divide', action='store_true', help="with --fen, print the node count under each first move")
+    parser.add_argument('--compare', action='store_true', help="check both backends give the same moves instead of counting nodes")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        if args.fen:
+            results = [compareFEN(args.fen, args.depth or 1)]
+        else:
+            results = compareSuite(args.depth, args.max_nodes or None, args.position)
+        printComparison(results, args.json)
+        return 0 if all(r['passed'] for r in results) else 1
+
+    if args.fen:
+        gs = BACKENDS[args.backend](hashSizeMB=0)
+        gs.loadFEN(args.fen)
+        depth = args.depth or 1
+        start = time.perf_counter()
+        counts = gs.divide(depth) if args.divide else {'total': gs.perft(depth)}
+        seconds = time.perf_counter() - start
+        nodes = sum(counts.values())
+        if args.json:
+            print(json.dumps({'fen': args.fen, 'depth': depth, 'nodes': nodes, 'divide': counts, 'seconds': seconds}))
+        else:
+            for move in sorted(counts):
+                print(move, counts[move])
+            print("nodes", nodes, "time", round(seconds, 3))
+        return 0
+
+    results = runSuite(args.backend, args.depth, args.max_nodes or None, args.position)
+    failed = [r for r in results if not r['passed']]
+    if args.json:
+        totalNodes = sum(r['nodes'] for r in results)
+        totalSeconds = sum(r['seconds'] for r in results)
+        print(json.dumps({'backend': args.backend, 'results': results, 'nodes': totalNodes, 'seconds': totalSeconds,
+                          'nps': totalNodes / totalSeconds if totalSeconds > 0 else 0.0, 'failed': len(failed)}, indent=2))
+    else:
+        for r in results:
+            print("{:<28} depth {} {:>9} nodes {:>8.0f} nps  {}".format(
+                r['name'], r['depth'], r['nodes'], r['nps'], 'ok' if r['passed'] else 'FAILED, expected ' + str(r['expected'])))
+        print(len(results) - len(failed), "of", len(results), "passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# Opt in search statistics. Give a GameState one with gs.searchStats = SearchStats() and every search after that
+# (generateMove or iterativeSearch, so computerMove and the SearchWorker too) gets measured: nodes, leaf evaluations,
+# nodes per second, beta cutoffs by ply and how many of them came from the first move, the effective branching factor,
+# and the time split between move generation, move ordering, make/undo and evaluation.
+# With gs.searchStats = None (the default) nothing is measured and the only cost is one check per search. While a
+# measured search runs, the timed methods are shadowed on that one instance by wrappers, the class is never touched.
+# Hooks hear about every search start, finished iteration and search end, see JSONLog and StackSampler below.
+# With a ParallelSearch pool the root moves are searched in other processes, only the root process gets measured.
+import json
+import sys
+import threading
+import time
+from Engine.ChessEngine import moveNotation
+
+'''
+Method name to the part of the search its time counts under. A call made from inside another timed call counts under
+the outer one (getCaptureMoves calls getValidMoves when in check)
+'''
+TIMED_METHODS = {'getValidMoves': 'moveGeneration', 'getCaptureMoves': 'moveGeneration', 'isLegalMove': 'moveGeneration',
+                 'orderMoves': 'ordering', 'makeMove': 'makeUndo', 'undoMove': 'makeUndo', 'evaluatePosition': 'evaluation'}
+'''
+Every method a measured search shadows. GameState leaves anything that shadows a method out when it gets copied or pickled
+'''
+WRAPPED_METHODS = tuple(TIMED_METHODS) + ('recordCutoff',)
+
+
+class SearchStats():
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or []) #called in order, so a hook that adds to the report goes before one that saves it
+        self.active = 0 #iterativeSearch is one search, the generateMove calls inside it dont start their own
+        self.lastReport = None
+        self.reset()
+
+    def reset(self):
+        self.gs = None
+        self.calls = dict.fromkeys(TIMED_METHODS, 0)
+        self.times = dict.fromkeys(TIMED_METHODS.values(), 0.0)
+        self.cutoffsByPly = [] #beta cutoffs at each ply from the root
+        self.firstMoveCutoffsByPly = []
+        self.iterations = []
+        self.timing = False #a timed call is running, calls inside it arent timed again
+
+    '''
+    Called by the GameState when a search starts, sets up the counters and the wrappers
+    '''
+    def searchStarted(self, gs):
+        self.active += 1
+        if self.active > 1:
+            return
+        self.reset()
+        self.gs = gs
+        self.rootPly = len(gs.moveLog)
+        self.startNodes = gs.nodes
+        self.startTime = time.perf_counter()
+        self.iterationNodes = gs.nodes
+        self.iterationTime = self.startTime
+        for name, part in TIMED_METHODS.items():
+            gs.__dict__[name] = self.timed(getattr(gs, name), name, part)
+        gs.__dict__['recordCutoff'] = self.cutoffCounter(gs.recordCutoff)
+        self.callHooks('searchStarted')
+
+    '''
+    Called by the GameState after every finished depth, iteration is a dict of depth, move, score, nodes (in this
+    iteration), seconds (this iteration) and elapsed (since the search started)
+    '''
+    def iterationFinished(self, gs, depth, move):
+        now = time.perf_counter()
+        iteration = {'depth': depth, 'move': move, 'score': gs.lastSearchScore, 'nodes': gs.nodes - self.iterationNodes,
+                     'seconds': now - self.iterationTime, 'elapsed': now - self.startTime}
+        self.iterationNodes = gs.nodes
+        self.iterationTime = now
+        self.iterations.append(iteration)
+        self.callHooks('iterationFinished', iteration)
+
+    '''
+    Called by the GameState when the search is done or stopped. Takes the wrappers off and returns the report, which
+    is also kept in lastReport
+    '''
+    def searchFinished(self, gs):
+        self.active -= 1
+        if self.active > 0:
+            return None
+        for name in WRAPPED_METHODS:
+            gs.__dict__.pop(name, None)
+        self.lastReport = self.report()
+        self.callHooks('searchFinished', self.lastReport)
+        return self.lastReport
+
+    def callHooks(self, event, *args):
+        for hook in self.hooks:
+            method = getattr(hook, event, None)
+            if method is not None:
+                method(self, *args)
+
+    def timed(self, method, name, part):
+        calls = self.calls
+        times = self.times
+        clock = time.perf_counter
+        def wrapper(*args):
+            calls[name] += 1
+            if self.timing:
+                return method(*args)
+            self.timing = True
+            start = clock()
+            try:
+                return method(*args)
+            finally:
+                times[part] += clock() - start
+                self.timing = False
+        return wrapper
+
+    def cutoffCounter(self, method):
+        gs = self.gs
+        def wrapper(move, depth, moveNumber):
+            ply = len(gs.moveLog) - self.rootPly
+            while len(self.cutoffsByPly) <= ply:
+                self.cutoffsByPly.append(0)
+                self.firstMoveCutoffsByPly.append(0)
+            self.cutoffsByPly[ply] += 1
+            if moveNumber == 0:
+                self.firstMoveCutoffsByPly[ply] += 1
+            return method(move, depth, moveNumber)
+        return wrapper
+
+    '''
+    Effective branching factor: how many times more nodes each iteration took than the one before (the geometric mean),
+    or for a single fixed depth search the number that raised to the depth gives its node count
+    '''
+    def branchingFactor(self):
+        counts = [iteration['nodes'] for iteration in self.iterations if iteration['nodes'] > 0]
+        if len(counts) >= 2:
+            return (counts[-1] / counts[0]) ** (1 / (len(counts) - 1))
+        if counts and self.iterations[-1]['depth'] > 0:
+            return counts[0] ** (1 / self.iterations[-1]['depth'])
+        return 0.0
+
+    '''
+    Everything measured so far as a dict of plain numbers and lists, ready for json.dumps
+    '''
+    def report(self):
+        seconds = time.perf_counter() - self.startTime
+        nodes = self.gs.nodes - self.startNodes
+        cutoffs = sum(self.cutoffsByPly)
+        firstMoveCutoffs = sum(self.firstMoveCutoffsByPly)
+        times = dict(self.times)
+        times['other'] = max(0.0, seconds - sum(self.times.values())) #the search itself, hash probes, bookkeeping
+        return {'depth': self.iterations[-1]['depth'] if self.iterations else 0, 'nodes': nodes,
+                'evaluations': self.calls['evaluatePosition'], 'seconds': seconds,
+                'nps': nodes / seconds if seconds > 0 else 0.0, 'cutoffs': cutoffs,
+                'firstMoveCutoffRate': firstMoveCutoffs / cutoffs if cutoffs else 0.0,
+                'cutoffsByPly': list(self.cutoffsByPly), 'firstMoveCutoffsByPly': list(self.firstMoveCutoffsByPly),
+                'branchingFactor': self.branchingFactor(), 'calls': dict(self.calls), 'times': times,
+                'iterations': [dict(iteration, move=moveNotation(iteration['move']) if iteration['move'] is not None else None)
+                               for iteration in self.iterations]}
+
+
+'''
+Hook that writes every search report as one line of JSON, to a file path (appended to) or an open file
+'''
+class JSONLog():
+    def __init__(self, target=sys.stderr):
+        self.target = target
+
+    def searchFinished(self, stats, report):
+        line = json.dumps(report) + "\n"
+        if isinstance(self.target, str):
+            with open(self.target, 'a') as f:
+                f.write(line)
+        else:
+            self.target.write(line)
+            self.target.flush()
+
+
+'''
+Sampling profiler hook. A background thread looks at the search thread's stack every interval seconds and counts the
+functions it finds, the busiest ones go into the report under 'profile' as [function, samples on top of the stack,
+samples anywhere on it]. The search holds the GIL, so the real interval is closer to sys.getswitchinterval()
+'''
+class StackSampler():
+    def __init__(self, interval=0.001, top=15):
+        self.interval = interval
+        self.top = top
+        self.thread = None
+
+    def searchStarted(self, stats):
+        self.searchThread = threading.get_ident()
+        self.selfSamples = {}
+        self.totalSamples = {}
+        self.samples = 0
+        self.running = threading.Event()
+        self.running.set()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.searchThread)
+            while frame is not None and frame.f_code.co_filename == __file__: #the timing wrappers
+                frame = frame.f_back
+            if frame is not None:
+                self.samples += 1
+                name = frame.f_code.co_name
+                self.selfSamples[name] = self.selfSamples.get(name, 0) + 1
+                seen = set()
+                while frame is not None:
+                    name = frame.f_code.co_name
+                    if name not in seen and frame.f_code.co_filename != __file__: #recursion would count minMax once per ply otherwise
+                        seen.add(name)
+                        self.totalSamples[name] = self.totalSamples.get(name, 0) + 1
+                    frame = frame.f_back
+            time.sleep(self.interval)
+
+    def searchFinished(self, stats, report):
+        self.running.clear()
+        self.thread.join()
+        names = sorted(self.totalSamples, key=lambda name: (self.selfSamples.get(name, 0), self.totalSamples[name]), reverse=True)
+        report['samples'] = self.samples
+        report['profile'] = [[name, self.selfSamples.get(name, 0), self.totalSamples[name]] for name in names[:self.top]]
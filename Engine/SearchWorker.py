@@ -0,0 +1,108 @@
+# Runs the computer's search in a background thread, so whatever is driving the engine (the pygame window, UCI) keeps
+# running while it thinks. The search works on a clone of the GameState, the caller's state is never touched.
+# A thread is enough here: the search holds the GIL, but python hands it back every few milliseconds, which is plenty
+# for a window drawing at 15 fps.
+# A ponder search (start(..., ponder=True)) thinks on the opponent's time about the position after the reply it expects.
+# Its move is held back until ponderhit says the reply was played, from then on it is a normal search.
+import threading
+import time
+
+
+class SearchWorker():
+    def __init__(self):
+        self.thread = None
+        self.state = None
+        self.result = None
+        self.progress = None #latest progress dict from the search, depth/move/score/nodes/seconds
+        self.finished = False
+        self.cancelled = False
+        self.resultTaken = False
+        self.pondering = False #searching on the opponent's time, poll holds the move back until ponderhit
+        self.depthLimit = None #depth a ponder search stops at after a ponder hit
+
+    '''
+    Starts searching a copy of gs. With time_ms it runs a timed search, with movetime_ms it thinks for that long,
+    otherwise it deepens up to depth (or forever with depth=None, until stop is called). A depth given with a time limit
+    stops the search at whichever comes first. onProgress is called from the worker thread after every iteration. With
+    ponder the search runs as a ponder search, see ponderhit
+    '''
+    def start(self, gs, depth=4, time_ms=None, increment_ms=0, onProgress=None, movetime_ms=None, ponder=False):
+        if self.isRunning():
+            raise RuntimeError("a search is already running")
+        self.state = gs.clone()
+        self.result = None
+        self.progress = None
+        self.finished = False
+        self.cancelled = False
+        self.resultTaken = False
+        self.pondering = ponder
+        self.depthLimit = None
+        self.startTime = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, args=(depth, time_ms, increment_ms, onProgress, movetime_ms),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, depth, time_ms, increment_ms, onProgress, movetime_ms=None):
+        def progress(info):
+            self.progress = info
+            if self.depthLimit is not None and info['depth'] >= self.depthLimit:
+                self.state.stopSearch = True
+            if onProgress is not None:
+                onProgress(info)
+        try:
+            if movetime_ms is not None:
+                seconds = movetime_ms / 1000 #the soft limit is checked at half, so this stops deepening half way through
+                self.result = self.state.iterativeSearch(depth if depth is not None else 64, seconds, seconds, progress)
+            elif time_ms is not None:
+                self.result = self.state.timedSearch(time_ms, increment_ms, depth if depth is not None else 64, progress)
+            else:
+                self.result = self.state.iterativeSearch(depth if depth is not None else 64, onProgress=progress)
+        finally:
+            self.finished = True
+
+    def isRunning(self):
+        return self.thread is not None and not self.finished
+
+    '''
+    The reply a ponder search was started for got played. The search keeps everything it found and carries on as the
+    search for this move: it stops once an iteration of depth has finished (straight away if one already has), or runs
+    until stop with depth None
+    '''
+    def ponderhit(self, depth=None):
+        self.depthLimit = depth #set before looking at the progress, the search thread does it the other way round
+        self.pondering = False
+        if depth is not None and self.progress is not None and self.progress['depth'] >= depth:
+            self.stop()
+
+    '''
+    Stops the search early, the result is the best move of the deepest finished iteration
+    '''
+    def stop(self):
+        if self.state is not None:
+            self.state.stopSearch = True
+
+    '''
+    Stops the search and throws the result away
+    '''
+    def cancel(self):
+        self.cancelled = True
+        self.pondering = False
+        self.stop()
+
+    '''
+    Waits for the search thread to end
+    '''
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    '''
+    Call every frame. Returns the move once, when the search has finished, otherwise None. A ponder search's move only
+    comes out after ponderhit
+    '''
+    def poll(self):
+        if self.finished and not self.resultTaken and not self.pondering:
+            self.resultTaken = True
+            if not self.cancelled:
+                return self.result
+        return None
@@ -0,0 +1,96 @@
+# Fixed size transposition table, stores the result of searched positions by zobrist key so transpositions don't get searched twice.
+
+'''
+Bound types, an exact score, or a score that is only a lower/upper limit because alpha beta cut the search off
+'''
+EXACT = 0
+LOWERBOUND = 1
+UPPERBOUND = 2
+
+'''
+Rough size of one stored entry in bytes (the tuple, the 64 bit key and the other ints, plus its slot in the list).
+Python doesnt let us lay out memory ourselves, so the size in MB is turned into a bucket count using this estimate
+'''
+ENTRY_BYTES = 180
+BUCKET_BYTES = 2 * ENTRY_BYTES
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16):
+        self.resize(sizeMB)
+
+    '''
+    Throws away everything stored and makes a table of the new size
+    '''
+    def resize(self, sizeMB):
+        self.sizeMB = sizeMB
+        self.bucketCount = max(1, int(sizeMB * 1024 * 1024) // BUCKET_BYTES)
+        #every bucket has two slots, one that keeps the deepest search, one that always takes the newest store
+        #entries are tuples of (key, depth, score, bound, bestMove, age)
+        self.depthSlots = [None] * self.bucketCount
+        self.alwaysSlots = [None] * self.bucketCount
+        self.age = 0
+        self.resetStats()
+
+    def clear(self):
+        self.resize(self.sizeMB)
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    '''
+    Call once per search, lets old deep entries be replaced by the new search
+    '''
+    def newSearch(self):
+        self.age += 1
+
+    '''
+    Returns the stored entry for the key, or None
+    '''
+    def probe(self, key):
+        self.probes += 1
+        index = key % self.bucketCount
+        entry = self.depthSlots[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.alwaysSlots[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    '''
+    Stores a search result, the depth preferred slot only gets replaced by a search at least as deep or an old entry
+    '''
+    def store(self, key, depth, score, bound, bestMove):
+        self.stores += 1
+        index = key % self.bucketCount
+        entry = (key, depth, score, bound, bestMove, self.age)
+        old = self.depthSlots[index]
+        if old is None or old[0] == key or depth >= old[1] or old[5] != self.age:
+            self.depthSlots[index] = entry
+        else:
+            self.alwaysSlots[index] = entry
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    '''
+    Fraction of slots in use, only samples the first 1000 buckets so it stays cheap on big tables
+    '''
+    def fillLevel(self):
+        sample = min(1000, self.bucketCount)
+        used = 0
+        for i in range(sample):
+            used += (self.depthSlots[i] is not None) + (self.alwaysSlots[i] is not None)
+        return used / (2 * sample)
+
+    def stats(self):
+        return {'sizeMB': self.sizeMB, 'buckets': self.bucketCount, 'probes': self.probes, 'hits': self.hits,
+                'stores': self.stores, 'hitRate': self.hitRate(), 'fillLevel': self.fillLevel()}
+
+    def report(self):
+        return "TT hit rate " + str(round(100 * self.hitRate(), 1)) + "%, fill " + str(round(100 * self.fillLevel(), 1)) + "%"